@@ -0,0 +1,191 @@
+import hashlib
+import marshal
+import os
+import tempfile
+from sys import intern
+from lexer import TokenType
+from parser import BinOp, Bool, Call, Function, If, Lambda, Num, Parser, Program, Return, Sequence, UnaryOp, Var
+from stream_lexer import StreamLexer
+from interpreter import VERSION
+
+MAGIC = b'LAMC'
+FORMAT = 2
+CACHE_DIRNAME = '__lambdacache__'
+
+NUM, BOOL, VAR, BINOP, UNARYOP, IF, FUNCTION, LAMBDA, CALL, RETURN, SEQUENCE, PROGRAM = range(12)
+
+def encode(node):
+    """Flatten an AST into a post-order list of tags and fields.
+
+    Children come before their parent, so decoding is a single loop over a
+    value stack and neither direction recurses on deep left-nested chains.
+    """
+    out = []
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if not expanded:
+            stack.append((node, True))
+            for child in reversed(children(node)):
+                stack.append((child, False))
+            continue
+        if isinstance(node, Sequence):
+            out += (SEQUENCE, len(node.statements))
+        elif isinstance(node, Program):
+            out += (PROGRAM, len(node.statements))
+        elif isinstance(node, Num):
+            out += (NUM, node.value)
+        elif isinstance(node, Bool):
+            out += (BOOL, node.value)
+        elif isinstance(node, Var):
+            out += (VAR, node.value)
+        elif isinstance(node, BinOp):
+            out += (BINOP, node.op.name)
+        elif isinstance(node, UnaryOp):
+            out += (UNARYOP, node.op.name)
+        elif isinstance(node, If):
+            out += (IF, node.else_branch is not None)
+        elif isinstance(node, Function):
+            out += (FUNCTION, node.name, len(node.params), *node.params)
+        elif isinstance(node, Lambda):
+            out += (LAMBDA, len(node.params), *node.params)
+        elif isinstance(node, Call):
+            out += (CALL, len(node.args))
+        elif isinstance(node, Return):
+            out.append(RETURN)
+        else:
+            raise Exception(f'Cannot encode {type(node).__name__}')
+    return out
+
+def children(node):
+    if isinstance(node, (Sequence, Program)):
+        return node.statements
+    if isinstance(node, BinOp):
+        return [node.left, node.right]
+    if isinstance(node, UnaryOp):
+        return [node.expr]
+    if isinstance(node, If):
+        if node.else_branch is None:
+            return [node.condition, node.then_branch]
+        return [node.condition, node.then_branch, node.else_branch]
+    if isinstance(node, (Function, Lambda)):
+        return [node.body]
+    if isinstance(node, Call):
+        return [node.func] + node.args
+    if isinstance(node, Return):
+        return [node.value]
+    return []
+
+def decode(data, nodes=None):
+    """Rebuild the AST encode() flattened; nodes, if given, collects every node in post-order."""
+    stack = []
+    index = 0
+    while index < len(data):
+        tag = data[index]
+        if tag == NUM:
+            stack.append(Num(data[index + 1]))
+            index += 2
+        elif tag == VAR:
+            stack.append(Var(data[index + 1]))
+            index += 2
+        elif tag == BINOP:
+            right = stack.pop()
+            stack[-1] = BinOp(stack[-1], TokenType[data[index + 1]], right)
+            index += 2
+        elif tag == CALL:
+            count = data[index + 1]
+            args = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack[-1] = Call(stack[-1], args)
+            index += 2
+        elif tag == BOOL:
+            stack.append(Bool(data[index + 1]))
+            index += 2
+        elif tag == UNARYOP:
+            stack[-1] = UnaryOp(TokenType[data[index + 1]], stack[-1])
+            index += 2
+        elif tag == IF:
+            else_branch = stack.pop() if data[index + 1] else None
+            then_branch = stack.pop()
+            stack[-1] = If(stack[-1], then_branch, else_branch)
+            index += 2
+        elif tag == RETURN:
+            stack[-1] = Return(stack[-1])
+            index += 1
+        elif tag == FUNCTION:
+            count = data[index + 2]
+            params = [intern(param) for param in data[index + 3:index + 3 + count]]
+            stack[-1] = Function(intern(data[index + 1]), params, stack[-1])
+            index += 3 + count
+        elif tag == LAMBDA:
+            count = data[index + 1]
+            params = [intern(param) for param in data[index + 2:index + 2 + count]]
+            stack[-1] = Lambda(params, stack[-1])
+            index += 2 + count
+        elif tag == SEQUENCE or tag == PROGRAM:
+            count = data[index + 1]
+            statements = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            stack.append(Sequence(statements) if tag == SEQUENCE else Program(statements))
+            index += 2
+        else:
+            raise Exception(f'Corrupt AST cache entry: unknown tag {tag}')
+        if nodes is not None:
+            nodes.append(stack[-1])
+    if len(stack) != 1:
+        raise Exception('Corrupt AST cache entry')
+    return stack[0]
+
+def source_key(source):
+    """Hash the source together with everything that decides how it parses."""
+    digest = hashlib.sha256()
+    digest.update(f'{VERSION}:{FORMAT}:'.encode())
+    digest.update(source)
+    return digest.digest()
+
+def cache_path(filename, cache_dir=None):
+    filename = os.path.abspath(filename)
+    if cache_dir is None:
+        return os.path.join(os.path.dirname(filename), CACHE_DIRNAME, os.path.basename(filename) + 'c')
+    # A shared directory holds files from many places, so tell same-named ones apart.
+    tag = hashlib.sha1(filename.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{os.path.basename(filename)}.{tag}c')
+
+def load(path, key):
+    """Return the cached AST stored at path for key, or None on any kind of miss."""
+    try:
+        with open(path, 'rb') as file:
+            magic, stored_key, data = marshal.load(file)
+        if magic != MAGIC or stored_key != key:
+            return None
+        return decode(data)
+    except Exception:
+        return None
+
+def store(path, key, ast):
+    """Write an entry atomically; readers see either the old file or the new one."""
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                marshal.dump((MAGIC, key, encode(ast)), file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        # A read-only tree just runs uncached, like Python without __pycache__.
+        pass
+
+def load_or_parse(filename, cache_dir=None):
+    with open(filename, 'rb') as file:
+        source = file.read()
+    key = source_key(source)
+    path = cache_path(filename, cache_dir)
+    ast = load(path, key)
+    if ast is None:
+        ast = Parser(StreamLexer(source.decode())).parse()
+        store(path, key, ast)
+    return ast
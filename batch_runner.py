@@ -0,0 +1,181 @@
+import glob
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from parser import Parser
+from stream_lexer import StreamLexer
+from resolver import Resolver
+from optimizer import Optimizer
+import ast_cache
+import image
+import typecheck
+from budget import Budget
+from closure_compiler import ClosureCompiler
+
+class TaskTimeout(BaseException):
+    # Like KeyboardInterrupt, so the except Exception handlers a task runs
+    # through, such as ast_cache.load's, cannot swallow the one-shot alarm.
+    pass
+
+def collect_paths(targets):
+    """Expand directories, glob patterns and manifest files into .lambda paths.
+
+    A directory contributes every .lambda file below it, in sorted order. Any
+    other target that is not a .lambda file is read as a manifest: one path or
+    pattern per line, relative to the manifest, with blank lines and lines
+    starting with # skipped. A path listed twice is run twice.
+    """
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            paths += sorted(glob.glob(os.path.join(target, '**', '*.lambda'), recursive=True))
+        elif glob.has_magic(target):
+            paths += sorted(glob.glob(target, recursive=True))
+        elif target.endswith('.lambda'):
+            paths.append(target)
+        else:
+            base = os.path.dirname(target)
+            with open(target, 'r') as manifest:
+                lines = [line.strip() for line in manifest]
+            entries = [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+            paths += collect_paths(entries)
+    return paths
+
+def json_value(value):
+    if value is None or type(value) in (int, bool):
+        return value
+    return str(value)
+
+class Worker:
+    """Per-process state: one warm interpreter reused for every task the process runs.
+
+    Each task starts from an empty global environment, or from a fresh copy of
+    the globals in image_path, so definitions made by one file are never
+    visible to the next one.
+    """
+
+    def __init__(self, backend='tree', optimize=False, memoize=False, memo_size=1024, use_cache=True,
+                 cache_dir=None, timeout=None, lazy=False, limits=None, check_types=False, image_path=None):
+        from main import make_interpreter
+        self.interpreter = make_interpreter(backend, memoize, memo_size, lazy)
+        # Read once; every task restores its own copy of the preloaded globals.
+        self.image = image.read(image_path) if image_path is not None else None
+        self.budget = None
+        if limits:
+            # Unlike timeout this needs no signals, and also bounds steps and depth.
+            self.budget = Budget(**limits)
+            self.budget.attach(self.interpreter)
+        self.backend = backend
+        self.check_types = check_types
+        self.optimize = optimize
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.timeout = timeout if hasattr(signal, 'setitimer') else None
+
+    def parse(self, path):
+        if self.use_cache:
+            ast = ast_cache.load_or_parse(path, self.cache_dir)
+        else:
+            with open(path, 'r') as file:
+                ast = Parser(StreamLexer(file)).parse()
+        if self.optimize:
+            ast = Optimizer().optimize(ast)
+        return Resolver().resolve(ast)
+
+    def evaluate(self, path):
+        interpreter = self.interpreter
+        if self.image is not None:
+            image.preload(interpreter, self.image)
+        else:
+            interpreter.global_env = interpreter.new_globals()
+        if getattr(interpreter, 'memo', None) is not None:
+            interpreter.memo.invalidate()
+        if self.budget is not None:
+            self.budget.reset()
+        try:
+            ast = self.parse(path)
+            if self.check_types:
+                types = typecheck.check(ast, interpreter.global_env.variables if self.image is not None else ())
+                if self.backend == 'closure':
+                    interpreter.compiler = ClosureCompiler(types)
+            return interpreter.eval(ast)
+        finally:
+            compiler = getattr(interpreter, 'compiler', None)
+            if compiler is not None and hasattr(compiler, 'codes'):
+                # Compiled closures are keyed by AST node; this file's tree is dead now.
+                compiler.codes.clear()
+
+    def run(self, path):
+        record = {'file': path, 'pid': os.getpid()}
+        start = time.perf_counter()
+        if self.timeout:
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            result = self.evaluate(path)
+            record.update(status='ok', result=json_value(result))
+        except TaskTimeout:
+            record.update(status='timeout', error=f'timed out after {self.timeout}s')
+        except RecursionError:
+            record.update(status='error', error='maximum recursion depth exceeded')
+        except Exception as e:
+            record.update(status='error', error=f'{type(e).__name__}: {e}')
+        finally:
+            if self.timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        return record
+
+worker = None
+
+def raise_timeout(signum, frame):
+    raise TaskTimeout()
+
+def init_worker(options):
+    global worker
+    worker = Worker(**options)
+    if worker.timeout:
+        signal.signal(signal.SIGALRM, raise_timeout)
+
+def run_task(path):
+    return worker.run(path)
+
+def run_batch(paths, jobs=None, report=None, **options):
+    """Evaluate every path in a pool of worker processes and yield one record per file.
+
+    Records arrive in completion order and are also written to report, a file
+    object, as JSON lines. options are passed on to Worker; timeout is in
+    seconds and only enforced where signal.setitimer exists.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    # A few chunks per worker keeps the pipe traffic low and the tail short.
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with multiprocessing.Pool(jobs, init_worker, (options,)) as pool:
+        for record in pool.imap_unordered(run_task, paths, chunksize):
+            if report is not None:
+                report.write(json.dumps(record) + '\n')
+            yield record
+
+def summarize(records, elapsed):
+    counts = {'ok': 0, 'error': 0, 'timeout': 0}
+    busy = 0.0
+    for record in records:
+        counts[record['status']] += 1
+        busy += record['seconds']
+    total = sum(counts.values())
+    return (f'{total} files in {elapsed:.2f}s: {counts["ok"]} ok, {counts["error"]} errors, '
+            f'{counts["timeout"]} timeouts; {busy:.2f}s of evaluation')
+
+def batch(targets, jobs=None, report_path=None, **options):
+    paths = collect_paths(targets)
+    report = open(report_path, 'w') if report_path else sys.stdout
+    start = time.perf_counter()
+    try:
+        records = list(run_batch(paths, jobs, report, **options))
+    finally:
+        if report is not sys.stdout:
+            report.close()
+    print(summarize(records, time.perf_counter() - start), file=sys.stderr)
+    return records
@@ -0,0 +1,45 @@
+import sys
+import timeit
+from lexer import Lexer, TokenType
+from parser import Parser
+from interpreter import Interpreter
+
+# The factorial program from test_interpreter.py, with the argument left open.
+FACTORIAL_SOURCE = """
+defun factorial(n) {
+  if (n == 0) {
+    return 1;
+  } else {
+    return n * factorial(n - 1);
+  }
+}
+factorial(%d)
+"""
+
+def parse_program(source):
+    parser = Parser(Lexer(source))
+    statements = []
+    while parser.current_token.type != TokenType.EOF:
+        statements.append(parser.parse())
+    return statements
+
+def run_program(interpreter, statements):
+    result = None
+    for statement in statements:
+        result = interpreter.eval(statement)
+    return result
+
+def bench(backend, statements, number):
+    interpreter = Interpreter(backend)
+    return min(timeit.repeat(lambda: run_program(interpreter, statements), number=number, repeat=5))
+
+def main(n=5, number=2000):
+    statements = parse_program(FACTORIAL_SOURCE % n)
+    tree = bench('tree', statements, number)
+    closure = bench('closure', statements, number)
+    print(f'factorial({n}) x {number}')
+    print(f'  tree walker:      {tree:.4f}s')
+    print(f'  closure compiler: {closure:.4f}s  ({tree / closure:.2f}x)')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
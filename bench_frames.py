@@ -0,0 +1,97 @@
+import gc
+import sys
+import time
+import environment
+import interpreter
+from lexer import Lexer
+from parser import Parser
+from resolver import Resolver
+from interpreter import Interpreter
+from budget import Budget
+
+PROGRAMS = {
+    'fibonacci': """
+defun fib(n) { if (n < 2) { return n; } else { return fib(n - 1) + fib(n - 2); } }
+fib(18)
+""",
+    'deep recursion': """
+defun sum(n) { if (n == 0) { return 0; } return n + sum(n - 1); }
+defun repeat(i, acc) { if (i == 0) { return acc; } return repeat(i - 1, acc + sum(60)); }
+repeat(600, 0)
+""",
+    'closures': """
+defun adder(n) { return lambda x -> x + n; }
+defun apply(f, x) { return f(x); }
+defun loop(i, acc) { if (i == 0) { return acc; } return loop(i - 1, acc + apply(adder(i), 1)); }
+loop(3000, 0)
+""",
+}
+
+class CountingFrame(environment.Frame):
+    __slots__ = ()
+    made = 0
+
+    def __init__(self, parent, slots):
+        CountingFrame.made += 1
+        environment.Frame.__init__(self, parent, slots)
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+def new_interpreter(pooled):
+    runner = Interpreter()
+    if not pooled:
+        runner.frame_pool_size = 0
+    return runner
+
+def count(ast, pooled):
+    """Calls made and Frame objects allocated by one run."""
+    runner = new_interpreter(pooled)
+    budget = Budget()
+    budget.attach(runner)
+    CountingFrame.made = 0
+    interpreter.Frame = CountingFrame
+    try:
+        runner.eval(ast)
+    finally:
+        interpreter.Frame = environment.Frame
+    return budget.steps, CountingFrame.made
+
+def collections(ast, pooled):
+    """Garbage collections per generation during one run."""
+    counts = [0, 0, 0]
+
+    def callback(phase, info):
+        if phase == 'start':
+            counts[info['generation']] += 1
+    gc.collect()
+    gc.callbacks.append(callback)
+    try:
+        new_interpreter(pooled).eval(ast)
+    finally:
+        gc.callbacks.remove(callback)
+    return counts
+
+def timing(ast, pooled, repeat=5):
+    best = None
+    for _ in range(repeat):
+        runner = new_interpreter(pooled)
+        start = time.perf_counter()
+        runner.eval(ast)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(repeat=5):
+    print(f'{"program":<16} {"frames":>7} {"calls":>8} {"new frames/call":>16} {"gc gen0/1/2":>14} {"time":>9}')
+    for name, source in PROGRAMS.items():
+        ast = parse(source)
+        for pooled in (False, True):
+            calls, made = count(ast, pooled)
+            gen0, gen1, gen2 = collections(ast, pooled)
+            elapsed = timing(ast, pooled, repeat)
+            print(f'{name:<16} {"pooled" if pooled else "fresh":>7} {calls:>8} {made / calls:>16.3f}'
+                  f' {f"{gen0}/{gen1}/{gen2}":>14} {elapsed * 1000:>7.1f}ms')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
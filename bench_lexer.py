@@ -0,0 +1,49 @@
+import io
+import sys
+import time
+from lexer import Lexer, TokenType
+from stream_lexer import tokenize
+
+UNIT = """# generated
+defun f_%d(a, b) { if (a >= b && !(a == 0)) { return a * 31 + b %% 7; } else { return f_%d(b, a - 1); } }
+f_%d(123456, lambda x -> x // 2 <= 10 || false)
+"""
+
+def generate(size):
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        part = UNIT % (index, index, index)
+        parts.append(part)
+        total += len(part)
+        index += 1
+    return ''.join(parts)
+
+def run_lexer(source):
+    lexer = Lexer(source)
+    count = 0
+    while lexer.get_next_token().type != TokenType.EOF:
+        count += 1
+    return count
+
+def run_stream(source):
+    return sum(1 for _ in tokenize(source)) - 1
+
+def measure(name, func, source, megabytes):
+    start = time.perf_counter()
+    count = func(source)
+    elapsed = time.perf_counter() - start
+    print(f'  {name:<22} {count:>9} tokens  {elapsed:7.3f}s  {megabytes / elapsed:7.2f} MB/s')
+    return count
+
+def main(size_mb=2):
+    source = generate(int(size_mb * 1024 * 1024))
+    megabytes = len(source) / (1024 * 1024)
+    print(f'lexing {megabytes:.2f} MB')
+    expected = measure('Lexer', run_lexer, source, megabytes)
+    assert measure('StreamLexer (str)', run_stream, source, megabytes) == expected
+    assert measure('StreamLexer (file)', lambda s: run_stream(io.StringIO(s)), source, megabytes) == expected
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:2]))
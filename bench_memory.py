@@ -0,0 +1,57 @@
+import gc
+import sys
+import tracemalloc
+from lexer import Lexer
+from parser import HashConser, Parser
+from optimizer import count_nodes
+from flat_ast import flatten
+
+UNIT = """
+defun f_%d(a, b) { if (a >= b && !(a == 0)) { return a * 31 + b %% 7; } else { return f_%d(b, a - 1); } }
+f_%d(123456, (lambda x -> x / 2 <= 10 || false)) + -f_%d(1, 2) * (3 - 4)
+"""
+
+def generate(size):
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        part = UNIT % (index, index, index, index)
+        parts.append(part)
+        total += len(part)
+        index += 1
+    return ''.join(parts)
+
+def retained(build):
+    """Bytes still allocated after build() returns, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, result
+
+def main(size_kb=512):
+    source = generate(int(size_kb * 1024))
+    size, ast = retained(lambda: Parser(Lexer(source)).parse())
+    nodes = count_nodes(ast)
+    print(f'{len(source) / 1024:.0f} KB of source, {nodes} nodes')
+    print(f'  AST objects      {size / 1024:10.1f} KB  {size / nodes:6.1f} bytes/node')
+
+    def hash_consed():
+        # Only the DAG and the stats outlive the conser and its tables.
+        conser = HashConser()
+        return conser.intern(Parser(Lexer(source)).parse()), conser.stats()
+    size, (_, sharing) = retained(hash_consed)
+    print(f'  hash-consed      {size / 1024:10.1f} KB  {size / nodes:6.1f} bytes/node'
+          f'  ({sharing["unique_ratio"]:.0%} of the nodes are unique)')
+    size, flat = retained(lambda: flatten(ast))
+    print(f'  flattened        {size / 1024:10.1f} KB  {size / nodes:6.1f} bytes/node'
+          f'  ({flat.nbytes() / nodes:.1f} in arrays)')
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:2]))
@@ -0,0 +1,67 @@
+import random
+import sys
+import time
+from lexer import Lexer, TokenType
+from parser import Parser
+
+ARITHMETIC = ('+', '-', '*', '/', '%')
+COMPARISONS = ('==', '!=', '<', '>', '<=', '>=')
+
+def arithmetic(rng, depth):
+    """A random arithmetic expression: literals, variables, calls, unary minus and parentheses."""
+    if depth == 0 or rng.random() < 0.3:
+        choice = rng.random() if depth else rng.random() * 0.9
+        if choice < 0.4:
+            return str(rng.randrange(1000))
+        if choice < 0.8:
+            return f'x_{rng.randrange(50)}'
+        if choice < 0.9:
+            return f'-{rng.randrange(1000)}'
+        return f'f_{rng.randrange(10)}({arithmetic(rng, depth - 1)}, {arithmetic(rng, depth - 1)})'
+    left, right = arithmetic(rng, depth - 1), arithmetic(rng, depth - 1)
+    text = f'{left} {rng.choice(ARITHMETIC)} {right}'
+    return f'({text})' if rng.random() < 0.5 else text
+
+def generate(tokens, seed=0):
+    """One expression of roughly the given number of tokens: comparisons joined by && and ||."""
+    rng = random.Random(seed)
+    parts = []
+    # Tokens per part are counted roughly from the characters; count_tokens gives the real number.
+    budget = tokens * 5 // 2
+    while budget > 0:
+        part = f'{arithmetic(rng, 4)} {rng.choice(COMPARISONS)} {arithmetic(rng, 4)}'
+        parts.append(part)
+        parts.append(rng.choice(('&&', '||')))
+        budget -= len(part) + 4
+    return ' '.join(parts[:-1])
+
+def nested(depth):
+    return '(' * depth + '-x' + ' + 1)' * depth
+
+def count_tokens(source):
+    lexer = Lexer(source)
+    count = 0
+    while lexer.get_next_token().type != TokenType.EOF:
+        count += 1
+    return count
+
+def measure(name, source):
+    tokens = count_tokens(source)
+    start = time.perf_counter()
+    lex_start = start
+    count_tokens(source)
+    lexing = time.perf_counter() - lex_start
+    start = time.perf_counter()
+    Parser(Lexer(source)).parse()
+    elapsed = time.perf_counter() - start
+    print(f'  {name:<18} {tokens:>9} tokens  {elapsed:7.3f}s  {tokens / elapsed / 1e3:8.1f}k tokens/s'
+          f'  ({lexing / elapsed:.0%} lexing)')
+
+def main(tokens=1000000):
+    print('parsing machine-generated expressions')
+    measure('wide', generate(tokens))
+    measure('long chain', ' + '.join(f'x_{index % 50}' for index in range(tokens // 2)))
+    measure('deep parentheses', nested(tokens // 4))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,255 @@
+import argparse
+import json
+import platform
+import sys
+import timeit
+from functools import reduce
+from lexer import Lexer, TokenType
+from parser import HashConser, Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from transpiler import PythonBackend
+from lazy import LazyInterpreter
+from closure_compiler import ClosureCompiler
+from typecheck import check
+from cse import SubexpressionCache
+from bench_lexer import generate
+
+FORMAT = 1
+DEFAULT_THRESHOLD = 0.15
+
+FACTORIAL = """
+defun factorial(n) { if (n == 0) { return 1; } else { return n * factorial(n - 1); } }
+factorial(60)
+"""
+
+FIBONACCI = """
+defun fib(n) { if (n < 2) { return n; } else { return fib(n - 1) + fib(n - 2); } }
+fib(15)
+"""
+
+CLOSURES = """
+defun compose(f, g) { return lambda x -> f(g(x)); }
+defun make_adder(n) { return lambda x -> x + n; }
+defun build(n, f) { if (n == 0) { return f; } else { return build(n - 1, compose(make_adder(n), f)); } }
+defun apply(f, x) { return f(x); }
+apply(build(40, lambda x -> x), 0)
+"""
+
+# Lambda-language versions of the partB_* reduce/map/filter scripts; the
+# python.* benchmarks below run the originals on the same inputs, except
+# python.fibonacci_reduce (see python_fibonacci).
+SUM_EVEN_SQUARES = """
+defun sum_even_squares(n, acc) {
+  if (n == 0) { return acc; }
+  else { if (n % 2 == 0) { return sum_even_squares(n - 1, acc + n * n); } else { return sum_even_squares(n - 1, acc); } }
+}
+sum_even_squares(2000, 0)
+"""
+
+# Only one of the two expensive arguments is ever used.
+UNUSED_ARGUMENTS = """
+defun fib(n) { if (n < 2) { return n; } else { return fib(n - 1) + fib(n - 2); } }
+defun pick(first, a, b) { if (first) { return a; } else { return b; } }
+defun run(n, acc) { if (n == 0) { return acc; } else { return run(n - 1, acc + pick((n % 2 == 0), fib(12), fib(13))); } }
+run(10, 0)
+"""
+
+PRODUCT = """
+defun product(low, high, acc) { if (low > high) { return acc; } else { return product(low + 1, high, acc * low); } }
+product(1, 300, 1)
+"""
+
+# The same partB pipelines written with the sequence builtins.
+SEQUENCE_SUM_EVEN_SQUARES = """
+reduce(lambda x, y -> x + y, map(lambda x -> x * x, filter(lambda x -> (x % 2 == 0), range(1, 2001))), 0)
+"""
+
+SEQUENCE_PRODUCT = """
+reduce(lambda x, y -> x * y, range(1, 301), 1)
+"""
+
+REPEATED_SUBEXPRESSIONS = """
+defun poly(x, y) {
+  return ((x * x + y * y) * (x * x + y * y) - (x * y + 1) * (x * y + 1))
+    + ((x * x + y * y) - (x * y + 1)) * ((x * x + y * y) + (x * y + 1));
+}
+defun loop(i, acc) { if (i == 0) { return acc; } else { return loop(i - 1, acc + poly(i % 4, i % 3)); } }
+loop(400, 0)
+"""
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+def lex_all(source):
+    lexer = Lexer(source)
+    while lexer.get_next_token().type != TokenType.EOF:
+        pass
+
+def lexer_tokens():
+    source = generate(256 * 1024)
+    return lambda: lex_all(source)
+
+def parser_nested(depth):
+    def setup():
+        source = '(' * depth + '1' + ' + 1)' * depth
+        return lambda: Parser(Lexer(source)).parse()
+    return setup
+
+def parser_wide():
+    source = ' + '.join(f'({index} * x_{index} - 3)' for index in range(3000))
+    return lambda: Parser(Lexer(source)).parse()
+
+def program(source, backend='tree'):
+    def setup():
+        ast = parse(source)
+        if backend == 'python':
+            interpreter = PythonBackend()
+        elif backend == 'lazy':
+            interpreter = LazyInterpreter()
+        elif backend == 'typed':
+            interpreter = Interpreter('closure')
+            interpreter.compiler = ClosureCompiler(check(ast))
+        elif backend == 'cse':
+            ast = Resolver().resolve(HashConser().intern(Parser(Lexer(source)).parse()))
+            interpreter = Interpreter()
+            subexpressions = SubexpressionCache()
+            subexpressions.attach(interpreter)
+            # Start every run with an empty cache.
+            return lambda: (subexpressions.results.clear(), interpreter.eval(ast))[1]
+        else:
+            interpreter = Interpreter(backend)
+        return lambda: interpreter.eval(ast)
+    return setup
+
+def python_fibonacci():
+    # partB_1_fibonacci.py builds the list of the first 300 numbers, a
+    # different algorithm from FIBONACCI; python.fibonacci_recursive is
+    # the one to compare the interpreters with.
+    fibonacci = lambda n: reduce(lambda x, _: x + [x[-1] + x[-2]], range(n - 2), [0, 1])[:n]
+    return lambda: fibonacci(300)
+
+def python_fibonacci_recursive():
+    # FIBONACCI in Python: the same recursion on the same input.
+    def fib(n):
+        if n < 2:
+            return n
+        return fib(n - 1) + fib(n - 2)
+    return lambda: fib(15)
+
+def python_sum_even_squares():
+    # partB_5.py
+    numbers = range(1, 2001)
+    return lambda: reduce(lambda x, y: x + y, map(lambda x: x ** 2, filter(lambda x: x % 2 == 0, numbers)))
+
+def python_product():
+    # partB_4.py
+    cumulative_operation = lambda operation: lambda sequence: reduce(operation, sequence)
+    factorial = cumulative_operation(lambda x, y: x * y)
+    return lambda: factorial(range(1, 301))
+
+BENCHMARKS = {
+    'lexer.tokens_256k': lexer_tokens,
+    'parser.nested_120': parser_nested(120),
+    'parser.nested_5000': parser_nested(5000),
+    'parser.wide_3000': parser_wide,
+    'interpreter.factorial': program(FACTORIAL),
+    'interpreter.fibonacci': program(FIBONACCI),
+    'interpreter.closures': program(CLOSURES),
+    'interpreter.sum_even_squares': program(SUM_EVEN_SQUARES),
+    'interpreter.product': program(PRODUCT),
+    'interpreter.unused_arguments': program(UNUSED_ARGUMENTS),
+    'interpreter.repeated_subexpressions': program(REPEATED_SUBEXPRESSIONS),
+    'cse.repeated_subexpressions': program(REPEATED_SUBEXPRESSIONS, 'cse'),
+    'cse.fibonacci': program(FIBONACCI, 'cse'),
+    'lazy.unused_arguments': program(UNUSED_ARGUMENTS, 'lazy'),
+    'lazy.fibonacci': program(FIBONACCI, 'lazy'),
+    'lazy.sum_even_squares': program(SUM_EVEN_SQUARES, 'lazy'),
+    'sequence.sum_even_squares': program(SEQUENCE_SUM_EVEN_SQUARES),
+    'sequence.product': program(SEQUENCE_PRODUCT),
+    'closure.fibonacci': program(FIBONACCI, 'closure'),
+    'closure.closures': program(CLOSURES, 'closure'),
+    'closure.factorial': program(FACTORIAL, 'closure'),
+    'typed.fibonacci': program(FIBONACCI, 'typed'),
+    'typed.closures': program(CLOSURES, 'typed'),
+    'typed.factorial': program(FACTORIAL, 'typed'),
+    'transpiled.factorial': program(FACTORIAL, 'python'),
+    'transpiled.fibonacci': program(FIBONACCI, 'python'),
+    'transpiled.closures': program(CLOSURES, 'python'),
+    'transpiled.sum_even_squares': program(SUM_EVEN_SQUARES, 'python'),
+    'python.fibonacci_reduce': python_fibonacci,
+    'python.fibonacci_recursive': python_fibonacci_recursive,
+    'python.sum_even_squares': python_sum_even_squares,
+    'python.product_reduce': python_product,
+}
+
+def measure(setup, repeat=5, min_time=0.2):
+    """Best time of one call to the workload setup() returns, in seconds."""
+    func = setup()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat, number)) / number
+
+def run(names=None, repeat=5, min_time=0.2, log=None):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = measure(setup, repeat, min_time)
+        if log is not None:
+            print(f'{name:<32} {results[name] * 1e3:10.3f} ms', file=log)
+    return {
+        'format': FORMAT,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'benchmarks': results,
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (name, baseline seconds, new seconds) for every benchmark more than threshold slower."""
+    regressions = []
+    old = baseline.get('benchmarks', {})
+    for name, seconds in results['benchmarks'].items():
+        if name in old and seconds > old[name] * (1 + threshold):
+            regressions.append((name, old[name], seconds))
+    return regressions
+
+def load(path):
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if data.get('format') != FORMAT:
+        raise Exception(f'{path}: unsupported benchmark format {data.get("format")}')
+    return data
+
+def save(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark the lexer, parser and interpreter.')
+    arg_parser.add_argument('names', nargs='*', help='only run benchmarks whose name contains one of these')
+    arg_parser.add_argument('--output', help='write the results to this JSON file')
+    arg_parser.add_argument('--baseline', help='compare against results saved earlier with --output')
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help=f'allowed slowdown before a benchmark counts as regressed (default: {DEFAULT_THRESHOLD})')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing runs per benchmark; the fastest counts')
+    arg_parser.add_argument('--min-time', type=float, default=0.2, help='seconds each timing run should last')
+    args = arg_parser.parse_args(argv)
+    results = run(args.names, args.repeat, args.min_time, sys.stdout)
+    if args.output:
+        save(args.output, results)
+    if args.baseline:
+        baseline = load(args.baseline)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms ({after / before - 1:+.0%})')
+        if regressions:
+            return 1
+        print(f'no regressions beyond {args.threshold:.0%}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import sys
+import time
+from interpreter import Interpreter
+
+class BudgetExceeded(Exception):
+    """Raised when a program goes over one of the limits of its Budget.
+
+    limit names the limit ('steps', 'depth', 'environments', 'seconds' or
+    'python stack'), value is the configured maximum and stack lists the
+    names of the active functions, outermost first.
+    """
+
+    def __init__(self, limit, value, stack):
+        self.limit = limit
+        self.value = value
+        self.stack = stack
+        names = [name or '<lambda>' for name in reversed(stack)] + ['<program>']
+        if len(names) > 6:
+            names[5:-1] = [f'... {len(names) - 6} more']
+        super().__init__(f'{limit} limit of {value} exceeded in {" <- ".join(names)}')
+
+class Budget:
+    """Limits on one evaluation of the tree-walking Interpreter.
+
+    Only function activations are counted, since the language has no other
+    way to repeat work: steps counts every call including tail calls (the
+    trampoline's back-edges), depth the nesting of calls that still hold
+    Python stack, environments the Environment or Frame objects handed to
+    calls, recycled frames included, and seconds the wall-clock time since
+    reset(), checked every CHECK_INTERVAL steps. None means unlimited.
+
+    Like Profiler, attach() shadows call and make_frame on the instance, so
+    an interpreter without a budget runs the unchanged class methods. A
+    RecursionError raised under a budget is turned into BudgetExceeded too.
+    """
+
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, steps=None, depth=None, environments=None, seconds=None, clock=time.monotonic):
+        self.max_steps = steps
+        self.max_depth = depth
+        self.max_environments = environments
+        self.max_seconds = seconds
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        """Start counting afresh, for example before each program a worker runs."""
+        self.steps = 0
+        self.environments = 0
+        self.stack = []
+        self.deadline = None if self.max_seconds is None else self.clock() + self.max_seconds
+
+    def usage(self):
+        return {'steps': self.steps, 'environments': self.environments, 'depth': len(self.stack)}
+
+    def attach(self, interpreter):
+        if not isinstance(interpreter, Interpreter) or interpreter.backend != 'tree':
+            raise Exception('Budgets need the tree backend')
+        interpreter.call = self.wrap_call(interpreter.call)
+        interpreter.make_frame = self.wrap_make_frame(interpreter.make_frame)
+        self.reset()
+        return interpreter
+
+    def detach(self, interpreter):
+        for name in ('call', 'make_frame'):
+            interpreter.__dict__.pop(name, None)
+
+    def wrap_call(self, call):
+        stack = self.stack
+        max_depth = self.max_depth
+
+        def budgeted_call(func, args):
+            if max_depth is not None and len(stack) >= max_depth:
+                raise BudgetExceeded('depth', max_depth, list(stack) + [getattr(func, 'name', None)])
+            stack.append(getattr(func, 'name', None))
+            try:
+                return call(func, args)
+            except RecursionError:
+                raise BudgetExceeded('python stack', sys.getrecursionlimit(), list(stack)) from None
+            finally:
+                stack.pop()
+        return budgeted_call
+
+    def wrap_make_frame(self, make_frame):
+        stack = self.stack
+        max_steps = self.max_steps
+        max_environments = self.max_environments
+        interval = self.CHECK_INTERVAL - 1
+
+        def budgeted_make_frame(func, args):
+            frame = make_frame(func, args)
+            # A tail call replaces the activation on top of the stack.
+            if stack:
+                stack[-1] = func.name
+            steps = self.steps = self.steps + 1
+            self.environments += 1
+            if max_steps is not None and steps > max_steps:
+                raise BudgetExceeded('steps', max_steps, list(stack))
+            if max_environments is not None and self.environments > max_environments:
+                raise BudgetExceeded('environments', max_environments, list(stack))
+            if not steps & interval and self.deadline is not None and self.clock() > self.deadline:
+                raise BudgetExceeded('seconds', self.max_seconds, list(stack))
+            return frame
+        return budgeted_make_frame
+
+def add_arguments(arg_parser):
+    """Add the --max-* command line options shared by main.py and server.py."""
+    arg_parser.add_argument('--max-steps', type=int, help='stop after this many function calls, tail calls included')
+    arg_parser.add_argument('--max-depth', type=int, help='stop when calls nest deeper than this')
+    arg_parser.add_argument('--max-envs', type=int, help='stop after allocating this many call environments')
+    arg_parser.add_argument('--max-seconds', type=float, help='stop after this much wall-clock time')
+
+def limits(args):
+    """The Budget keyword arguments given by add_arguments options, or None when there are none."""
+    values = {'steps': args.max_steps, 'depth': args.max_depth, 'environments': args.max_envs,
+              'seconds': args.max_seconds}
+    values = {name: value for name, value in values.items() if value is not None}
+    return values or None
@@ -0,0 +1,213 @@
+from array import array
+from lexer import TokenType
+
+LOAD_CONST = 0
+LOAD_NAME = 1
+BINARY_ADD = 2
+BINARY_SUBTRACT = 3
+BINARY_MULTIPLY = 4
+BINARY_FLOOR_DIVIDE = 5
+BINARY_MODULO = 6
+COMPARE_EQUAL = 7
+COMPARE_NOT_EQUAL = 8
+COMPARE_GREATER = 9
+COMPARE_LESS = 10
+COMPARE_GREATER_EQUAL = 11
+COMPARE_LESS_EQUAL = 12
+UNARY_POSITIVE = 13
+UNARY_NEGATIVE = 14
+UNARY_NOT = 15
+JUMP = 16
+JUMP_IF_FALSE = 17
+JUMP_IF_FALSE_OR_POP = 18
+JUMP_IF_TRUE_OR_POP = 19
+MAKE_FUNCTION = 20
+DEFINE_FUNCTION = 21
+CALL = 22
+RETURN_VALUE = 23
+POP_TOP = 24
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_NAME', 'BINARY_ADD', 'BINARY_SUBTRACT', 'BINARY_MULTIPLY',
+    'BINARY_FLOOR_DIVIDE', 'BINARY_MODULO', 'COMPARE_EQUAL', 'COMPARE_NOT_EQUAL',
+    'COMPARE_GREATER', 'COMPARE_LESS', 'COMPARE_GREATER_EQUAL', 'COMPARE_LESS_EQUAL',
+    'UNARY_POSITIVE', 'UNARY_NEGATIVE', 'UNARY_NOT', 'JUMP', 'JUMP_IF_FALSE',
+    'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP', 'MAKE_FUNCTION', 'DEFINE_FUNCTION',
+    'CALL', 'RETURN_VALUE', 'POP_TOP',
+]
+
+HAS_ARG = frozenset([
+    LOAD_CONST, LOAD_NAME, JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP,
+    JUMP_IF_TRUE_OR_POP, MAKE_FUNCTION, DEFINE_FUNCTION, CALL,
+])
+
+HAS_JUMP = frozenset([JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP])
+
+BINARY_OPCODES = {
+    TokenType.PLUS: BINARY_ADD,
+    TokenType.MINUS: BINARY_SUBTRACT,
+    TokenType.MULTIPLY: BINARY_MULTIPLY,
+    TokenType.DIVIDE: BINARY_FLOOR_DIVIDE,
+    TokenType.MODULO: BINARY_MODULO,
+    TokenType.EQUAL: COMPARE_EQUAL,
+    TokenType.NOT_EQUAL: COMPARE_NOT_EQUAL,
+    TokenType.GREATER: COMPARE_GREATER,
+    TokenType.LESS: COMPARE_LESS,
+    TokenType.GREATER_EQUAL: COMPARE_GREATER_EQUAL,
+    TokenType.LESS_EQUAL: COMPARE_LESS_EQUAL,
+}
+
+UNARY_OPCODES = {
+    TokenType.PLUS: UNARY_POSITIVE,
+    TokenType.MINUS: UNARY_NEGATIVE,
+    TokenType.NOT: UNARY_NOT,
+}
+
+class CodeObject:
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.code = array('i')
+        self.constants = []
+        self.constant_index = {}
+
+    def add_constant(self, value):
+        """Return the pool index of a constant, adding it on first use."""
+        if isinstance(value, CodeObject):
+            key = ('code', id(value))
+        else:
+            # Key on the type too, so that True and 1 get separate entries.
+            key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constant_index[key] = index
+        return index
+
+    def emit(self, opcode, arg=None):
+        """Append an instruction and return its offset."""
+        offset = len(self.code)
+        self.code.append(opcode)
+        if opcode in HAS_ARG:
+            self.code.append(0 if arg is None else arg)
+        return offset
+
+    def patch(self, offset, target):
+        """Point the jump instruction at offset to target."""
+        self.code[offset + 1] = target
+
+class BytecodeCompiler:
+    def compile(self, node, name='<module>'):
+        code = CodeObject(name, [])
+        self.emit_node(node, code)
+        code.emit(RETURN_VALUE)
+        return code
+
+    def emit_node(self, node, code):
+        method_name = f'emit_{type(node).__name__}'
+        emitter = getattr(self, method_name, self.generic_emit)
+        emitter(node, code)
+
+    def generic_emit(self, node, code):
+        raise Exception(f'No emit_{type(node).__name__} method')
+
+    def emit_Sequence(self, node, code):
+        if not node.statements:
+            code.emit(LOAD_CONST, code.add_constant(None))
+            return
+        for index, statement in enumerate(node.statements):
+            if index:
+                code.emit(POP_TOP)
+            self.emit_node(statement, code)
+
+    def emit_Program(self, node, code):
+        self.emit_Sequence(node, code)
+
+    def emit_BinOp(self, node, code):
+        self.emit_node(node.left, code)
+        if node.op in (TokenType.AND, TokenType.OR):
+            opcode = JUMP_IF_FALSE_OR_POP if node.op == TokenType.AND else JUMP_IF_TRUE_OR_POP
+            jump = code.emit(opcode)
+            self.emit_node(node.right, code)
+            code.patch(jump, len(code.code))
+            return
+        self.emit_node(node.right, code)
+        code.emit(BINARY_OPCODES[node.op])
+
+    def emit_UnaryOp(self, node, code):
+        self.emit_node(node.expr, code)
+        code.emit(UNARY_OPCODES[node.op])
+
+    def emit_Num(self, node, code):
+        code.emit(LOAD_CONST, code.add_constant(node.value))
+
+    def emit_Bool(self, node, code):
+        code.emit(LOAD_CONST, code.add_constant(node.value))
+
+    def emit_Var(self, node, code):
+        code.emit(LOAD_NAME, code.add_constant(node.value))
+
+    def emit_Function(self, node, code):
+        body = self.compile_body(node.name, node.params, node.body)
+        code.emit(DEFINE_FUNCTION, code.add_constant(body))
+
+    def emit_Lambda(self, node, code):
+        body = self.compile_body('<lambda>', node.params, node.body)
+        code.emit(MAKE_FUNCTION, code.add_constant(body))
+
+    def compile_body(self, name, params, body):
+        code = CodeObject(name, params)
+        self.emit_node(body, code)
+        code.emit(RETURN_VALUE)
+        return code
+
+    def emit_Call(self, node, code):
+        self.emit_node(node.func, code)
+        for arg in node.args:
+            self.emit_node(arg, code)
+        code.emit(CALL, len(node.args))
+
+    def emit_If(self, node, code):
+        self.emit_node(node.condition, code)
+        jump_to_else = code.emit(JUMP_IF_FALSE)
+        self.emit_node(node.then_branch, code)
+        jump_to_end = code.emit(JUMP)
+        code.patch(jump_to_else, len(code.code))
+        if node.else_branch:
+            self.emit_node(node.else_branch, code)
+        else:
+            code.emit(LOAD_CONST, code.add_constant(None))
+        code.patch(jump_to_end, len(code.code))
+
+    def emit_Return(self, node, code):
+        self.emit_node(node.value, code)
+        code.emit(RETURN_VALUE)
+
+def disassemble(code):
+    """Return a human readable listing of a code object and the code objects it contains."""
+    lines = [f'Disassembly of {code.name}({", ".join(code.params)}):']
+    nested = []
+    instructions = code.code
+    offset = 0
+    while offset < len(instructions):
+        opcode = instructions[offset]
+        line = f'{offset:6} {OPNAMES[opcode]:<22}'
+        if opcode in HAS_ARG:
+            arg = instructions[offset + 1]
+            line += f'{arg:>4}'
+            if opcode in HAS_JUMP:
+                line += f' (to {arg})'
+            elif opcode in (MAKE_FUNCTION, DEFINE_FUNCTION):
+                nested.append(code.constants[arg])
+                line += f' (<code {code.constants[arg].name}>)'
+            elif opcode != CALL:
+                line += f' ({code.constants[arg]!r})'
+            offset += 2
+        else:
+            offset += 1
+        lines.append(line.rstrip())
+    for child in nested:
+        lines.append('')
+        lines.append(disassemble(child))
+    return '\n'.join(lines)
@@ -0,0 +1,284 @@
+from environment import Environment, Frame, UNDEFINED
+from lexer import TokenType
+from parser import Function, Num, Return, Var
+from typecheck import BOOL, INT, FunctionType
+from sequences import BUILTINS, Builtin
+
+PYTHON_OPERATORS = {
+    TokenType.PLUS: '+', TokenType.MINUS: '-', TokenType.MULTIPLY: '*', TokenType.DIVIDE: '//',
+    TokenType.MODULO: '%', TokenType.AND: 'and', TokenType.OR: 'or', TokenType.EQUAL: '==',
+    TokenType.NOT_EQUAL: '!=', TokenType.GREATER: '>', TokenType.LESS: '<',
+    TokenType.GREATER_EQUAL: '>=', TokenType.LESS_EQUAL: '<=',
+}
+
+def fused_operators():
+    """Closure factories for a binary operator whose operands are parameters or constants.
+
+    An operand is a parameter slot ('slot'), a constant ('const') or any
+    other compiled code ('code'); reading a slot or constant inline saves the
+    closure call and the UNDEFINED check of a separate load. The factories
+    are generated because each operator needs its own Python expression.
+    """
+    shapes = {
+        ('slot', 'const'): 'env.slots[a] {} b',
+        ('slot', 'slot'): 'env.slots[a] {} env.slots[b]',
+        ('slot', 'code'): 'env.slots[a] {} b(env)',
+        ('code', 'slot'): 'a(env) {} env.slots[b]',
+        ('code', 'const'): 'a(env) {} b',
+        ('const', 'slot'): 'a {} env.slots[b]',
+        ('const', 'code'): 'a {} b(env)',
+    }
+    factories = {}
+    for op, symbol in PYTHON_OPERATORS.items():
+        for shape, template in shapes.items():
+            namespace = {}
+            exec(f'def factory(a, b):\n    return lambda env: {template.format(symbol)}\n', namespace)
+            factories[op, shape] = namespace['factory']
+    return factories
+
+FUSED = fused_operators()
+
+class ClosureCompiler:
+    """Compile an AST once into a tree of Python closures taking an environment.
+
+    Given the types typecheck.check() inferred for the same tree, it emits
+    specialized closures: int and bool parameters are read from their slot
+    without checking for UNDEFINED, operators on them and on constants are
+    fused into one closure, and calls to a callee whose function type is
+    known skip the function and argument count checks.
+    """
+
+    def __init__(self, types=None):
+        self.codes = {}
+        self.types = types
+
+    def compile(self, node):
+        code = self.codes.get(node)
+        if code is None:
+            method_name = f'compile_{type(node).__name__}'
+            compiler = getattr(self, method_name, self.generic_compile)
+            code = compiler(node)
+            self.codes[node] = code
+        return code
+
+    def generic_compile(self, node):
+        raise Exception(f'No compile_{type(node).__name__} method')
+
+    def value_slot(self, node):
+        """The slot of node if it is a local int or bool, which is always a bound parameter."""
+        if self.types is not None and type(node) is Var and node.depth == 0 \
+                and self.types.get(node) in (INT, BOOL):
+            return node.slot
+        return None
+
+    def operand(self, node):
+        slot = self.value_slot(node)
+        if slot is not None:
+            return 'slot', slot
+        if type(node) is Num:
+            return 'const', node.value
+        return 'code', self.compile(node)
+
+    def compile_BinOp(self, node):
+        if self.types is not None:
+            left_kind, left = self.operand(node.left)
+            right_kind, right = self.operand(node.right)
+            factory = FUSED.get((node.op, (left_kind, right_kind)))
+            if factory is not None:
+                return factory(left, right)
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        op = node.op
+        if op == TokenType.PLUS:
+            return lambda env: left(env) + right(env)
+        elif op == TokenType.MINUS:
+            return lambda env: left(env) - right(env)
+        elif op == TokenType.MULTIPLY:
+            return lambda env: left(env) * right(env)
+        elif op == TokenType.DIVIDE:
+            return lambda env: left(env) // right(env)
+        elif op == TokenType.MODULO:
+            return lambda env: left(env) % right(env)
+        elif op == TokenType.AND:
+            return lambda env: left(env) and right(env)
+        elif op == TokenType.OR:
+            return lambda env: left(env) or right(env)
+        elif op == TokenType.EQUAL:
+            return lambda env: left(env) == right(env)
+        elif op == TokenType.NOT_EQUAL:
+            return lambda env: left(env) != right(env)
+        elif op == TokenType.GREATER:
+            return lambda env: left(env) > right(env)
+        elif op == TokenType.LESS:
+            return lambda env: left(env) < right(env)
+        elif op == TokenType.GREATER_EQUAL:
+            return lambda env: left(env) >= right(env)
+        elif op == TokenType.LESS_EQUAL:
+            return lambda env: left(env) <= right(env)
+        return lambda env: None
+
+    def compile_UnaryOp(self, node):
+        expr = self.compile(node.expr)
+        op = node.op
+        if op == TokenType.PLUS:
+            return lambda env: +expr(env)
+        elif op == TokenType.MINUS:
+            return lambda env: -expr(env)
+        elif op == TokenType.NOT:
+            return lambda env: not expr(env)
+        return lambda env: None
+
+    def compile_Num(self, node):
+        value = node.value
+        return lambda env: value
+
+    def compile_Bool(self, node):
+        value = node.value
+        return lambda env: value
+
+    def compile_Var(self, node):
+        name, depth, slot = node.value, node.depth, node.slot
+        if self.value_slot(node) is not None:
+            return lambda env: env.slots[slot]
+        if depth is None:
+            return lambda env: env.get(name)
+        if depth == 0:
+            def load_local(env):
+                value = env.slots[slot]
+                if value is UNDEFINED:
+                    raise Exception(f'Undefined variable: {name}')
+                return value
+            return load_local
+        return lambda env: env.lookup(depth, slot, name)
+
+    def compile_Function(self, node):
+        self.compile(node.body)
+        name, params, body, frame_size, slot = node.name, node.params, node.body, node.frame_size, node.slot
+        captures = node.captures
+
+        def define(env):
+            func = Function(name, params, body, env, frame_size, captures)
+            if slot is None:
+                env.set(name, func)
+            else:
+                env.slots[slot] = func
+            return func
+        return define
+
+    def compile_Lambda(self, node):
+        self.compile(node.body)
+        params, body, frame_size, captures = node.params, node.body, node.frame_size, node.captures
+        return lambda env: Function(None, params, body, env, frame_size, captures)
+
+    def compile_Call(self, node):
+        func_code = self.compile(node.func)
+        arg_codes = [self.compile(arg) for arg in node.args]
+        arg_count = len(arg_codes)
+        compile = self.compile
+        compiler = self
+        if self.types is not None and type(self.types.get(node.func)) is FunctionType \
+                and not (type(node.func) is Var and node.func.depth is None and node.func.value in BUILTINS):
+            return self.compile_typed_call(func_code, arg_codes)
+
+        def call(env):
+            func = func_code(env)
+            if not isinstance(func, Function):
+                if type(func) is Builtin:
+                    return func.apply(compiler, [arg(env) for arg in arg_codes])
+                raise Exception(f'{func} is not a function')
+            if len(func.params) != arg_count:
+                raise Exception('Argument count mismatch')
+            if func.frame_size is None:
+                new_env = Environment(func.env)
+                variables = new_env.variables
+                for param, arg in zip(func.params, arg_codes):
+                    variables[param] = arg(env)
+            else:
+                slots = [arg(env) for arg in arg_codes]
+                if func.frame_size > arg_count:
+                    slots.extend([UNDEFINED] * (func.frame_size - arg_count))
+                new_env = Frame(func.env, slots)
+            result = compile(func.body)(new_env)
+            if isinstance(result, Return):
+                return result.value
+            return result
+        return call
+
+    def compile_typed_call(self, func_code, arg_codes):
+        arg_count = len(arg_codes)
+        compile = self.compile
+
+        compiler = self
+
+        def call(env):
+            # The type checker proved func is a Function taking arg_count
+            # arguments, or a builtin passed around as a value.
+            func = func_code(env)
+            if type(func) is Builtin:
+                return func.apply(compiler, [arg(env) for arg in arg_codes])
+            frame_size = func.frame_size
+            if frame_size is None:
+                # An unresolved function needs an Environment; call() makes one.
+                return compiler.call(func, [arg(env) for arg in arg_codes])
+            slots = [arg(env) for arg in arg_codes]
+            if frame_size > arg_count:
+                slots.extend([UNDEFINED] * (frame_size - arg_count))
+            result = compile(func.body)(Frame(func.env, slots))
+            if isinstance(result, Return):
+                return result.value
+            return result
+        return call
+
+    def call(self, func, args):
+        """Apply a function value to evaluated arguments, as builtins do with their callbacks."""
+        if type(func) is Builtin:
+            return func.apply(self, args)
+        if not isinstance(func, Function):
+            raise Exception(f'{func} is not a function')
+        if len(func.params) != len(args):
+            raise Exception('Argument count mismatch')
+        if func.frame_size is None:
+            env = Environment(func.env)
+            env.variables.update(zip(func.params, args))
+        else:
+            env = Frame(func.env, args + [UNDEFINED] * (func.frame_size - len(args)))
+        result = self.compile(func.body)(env)
+        if isinstance(result, Return):
+            return result.value
+        return result
+
+    def compile_If(self, node):
+        condition = self.compile(node.condition)
+        then_branch = self.compile(node.then_branch)
+        if not node.else_branch:
+            return lambda env: then_branch(env) if condition(env) else None
+        else_branch = self.compile(node.else_branch)
+        return lambda env: then_branch(env) if condition(env) else else_branch(env)
+
+    def compile_Return(self, node):
+        value = self.compile(node.value)
+        return lambda env: Return(value(env))
+
+    def compile_Sequence(self, node):
+        statements = [self.compile(statement) for statement in node.statements]
+
+        def sequence(env):
+            result = None
+            for statement in statements:
+                result = statement(env)
+                if isinstance(result, Return):
+                    break
+            return result
+        return sequence
+
+    def compile_Program(self, node):
+        statements = [self.compile(statement) for statement in node.statements]
+
+        def program(env):
+            result = None
+            for statement in statements:
+                result = statement(env)
+                if isinstance(result, Return):
+                    return result.value
+            return result
+        return program
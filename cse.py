@@ -0,0 +1,112 @@
+from lexer import TokenType
+from parser import BinOp, Bool, Num, UnaryOp, Var
+from interpreter import Interpreter
+from memo import LRUCache, memo_key
+
+MISSING = object()
+
+def pure_inputs(node):
+    """The Vars node reads and its size in nodes, or None if it is not a pure expression.
+
+    Pure here means operators, literals and variables only. && and || are
+    left out because they may skip an operand, and the cache reads every
+    input before deciding whether to evaluate.
+    """
+    inputs = {}
+    size = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        size += 1
+        node_type = type(node)
+        if node_type is BinOp:
+            if node.op == TokenType.AND or node.op == TokenType.OR:
+                return None
+            stack += (node.left, node.right)
+        elif node_type is UnaryOp:
+            stack.append(node.expr)
+        elif node_type is Var:
+            inputs.setdefault((node.value, node.depth, node.slot), node)
+        elif node_type is not Num and node_type is not Bool:
+            return None
+    return list(inputs.values()), size
+
+class SubexpressionCache:
+    """Evaluate each pure subexpression once for every combination of inputs.
+
+    attach() shadows visit_BinOp and visit_UnaryOp on a tree-backend
+    interpreter, like Profiler and Budget do. A pure subexpression (see
+    pure_inputs) of at least min_nodes nodes first reads the variables it
+    uses; the node and their values key an LRU cache of results. The values
+    stand in for the environment: a hit means the same expression was
+    already evaluated with the same bindings. On a hash-consed AST (see
+    parser.HashConser) every occurrence of a repeated subexpression in a
+    function is the same node, so they all share one entry.
+
+    Inputs that are not ints or bools, and lookups that fail, fall back to
+    plain evaluation, which raises the usual error. The decision for each
+    node is kept in a second LRU cache of max_candidates entries, so neither
+    cache grows with the length of a long-running program.
+    """
+
+    def __init__(self, maxsize=4096, min_nodes=5, max_candidates=16384):
+        self.min_nodes = min_nodes
+        self.results = LRUCache(maxsize)
+        self.candidates = LRUCache(max_candidates)
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    def attach(self, interpreter):
+        if not isinstance(interpreter, Interpreter) or interpreter.backend != 'tree':
+            raise Exception('The subexpression cache needs the tree backend')
+        interpreter.visit_BinOp = self.wrap(interpreter, interpreter.visit_BinOp)
+        interpreter.visit_UnaryOp = self.wrap(interpreter, interpreter.visit_UnaryOp)
+        return interpreter
+
+    def detach(self, interpreter):
+        for name in ('visit_BinOp', 'visit_UnaryOp'):
+            interpreter.__dict__.pop(name, None)
+
+    def candidate(self, node):
+        """(inputs, size) if node is worth caching, else None."""
+        candidate = self.candidates.get(node, MISSING)
+        if candidate is MISSING:
+            candidate = pure_inputs(node)
+            if candidate is not None and candidate[1] < self.min_nodes:
+                candidate = None
+            self.candidates.put(node, candidate)
+        return candidate
+
+    def wrap(self, interpreter, visit_node):
+        results = self.results
+
+        def cached_visit(node, env):
+            candidate = self.candidate(node)
+            if candidate is None:
+                return visit_node(node, env)
+            inputs, size = candidate
+            try:
+                values = [interpreter.visit_Var(var, env) for var in inputs]
+            except Exception:
+                return visit_node(node, env)
+            key = memo_key(values)
+            if key is None:
+                return visit_node(node, env)
+            key = (node, key)
+            result = results.get(key, MISSING)
+            if result is not MISSING:
+                self.hits += 1
+                self.saved += size
+                return result
+            self.misses += 1
+            result = visit_node(node, env)
+            results.put(key, result)
+            return result
+        return cached_visit
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evaluations_saved': self.saved, 'entries': len(self.results)}
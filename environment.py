@@ -2,6 +2,8 @@ class Environment:
     def __init__(self, parent=None):
         self.parent = parent
         self.variables = {}
+        # Bumped by every set, so a cached lookup can tell it is still current.
+        self.version = 0
 
     def get(self, name):
         if name in self.variables:
@@ -13,3 +15,37 @@ class Environment:
 
     def set(self, name, value):
         self.variables[name] = value
+        self.version += 1
+
+UNDEFINED = object()
+
+class Frame:
+    """Activation record for a resolved function body.
+
+    Parameters and local defuns live in a fixed list of slots, so a Var that the
+    Resolver annotated with (depth, slot) is found by indexing instead of by
+    hashing its name at every level of the parent chain.
+    """
+    __slots__ = ('parent', 'slots')
+
+    def __init__(self, parent, slots):
+        self.parent = parent
+        self.slots = slots
+
+    def lookup(self, depth, slot, name):
+        frame = self
+        while depth:
+            frame = frame.parent
+            depth -= 1
+        value = frame.slots[slot]
+        if value is UNDEFINED:
+            raise Exception(f'Undefined variable: {name}')
+        return value
+
+    def get(self, name):
+        # Names that reach a frame by name were not bound in any enclosing
+        # function, so they can only live in the dynamic global scope.
+        return self.parent.get(name)
+
+    def set(self, name, value):
+        raise Exception(f'Cannot bind {name} by name in a resolved frame')
@@ -0,0 +1,183 @@
+from array import array
+from sys import intern
+from lexer import TokenType
+from parser import BinOp, Bool, Call, Function, If, Lambda, Num, Program, Return, Sequence, UnaryOp, Var
+from ast_cache import children
+
+NUM, BOOL, VAR, BINOP, UNARYOP, IF, FUNCTION, LAMBDA, CALL, RETURN, SEQUENCE, PROGRAM = range(12)
+
+class FlatAST:
+    """A whole tree packed into a handful of typed arrays, one row per node.
+
+    Rows are in post-order, so every child comes before its parent and a
+    subtree is the contiguous run of rows from start[i] to i. The meaning of
+    the a, b and c columns depends on the tag:
+
+        NUM, BOOL, VAR    a = index into constants / the bool / index into names
+        BINOP, UNARYOP    a, b = operand rows, c = TokenType value of the operator
+        IF                a, b, c = condition, then and else rows (else -1)
+        FUNCTION, LAMBDA  a = name index (-1 for lambdas), b = body row,
+                          c = offset in extra of the parameter name indexes
+        CALL              a = callee row, c = offset in extra of the argument rows
+        RETURN            a = value row
+        SEQUENCE, PROGRAM c = offset in extra of the statement rows
+
+    extra holds count-prefixed runs of row or name indexes. Resolver
+    annotations are not kept; resolve the expanded tree as usual.
+    """
+
+    def __init__(self):
+        self.tags = array('B')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.start = array('i')
+        self.extra = array('i')
+        self.constants = []
+        self.names = []
+        self.constant_index = {}
+        self.name_index = {}
+
+    def __len__(self):
+        return len(self.tags)
+
+    def nbytes(self):
+        columns = (self.tags, self.a, self.b, self.c, self.start, self.extra)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def constant(self, value):
+        # True == 1, so key on the type as well as the value.
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def name(self, name):
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.names)
+            self.names.append(intern(name))
+        return index
+
+    def run(self, values):
+        offset = len(self.extra)
+        self.extra.append(len(values))
+        self.extra.extend(values)
+        return offset
+
+    def read_run(self, offset):
+        count = self.extra[offset]
+        return self.extra[offset + 1:offset + 1 + count]
+
+    def add(self, tag, start, a=-1, b=-1, c=-1):
+        self.tags.append(tag)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.start.append(start)
+        return len(self.tags) - 1
+
+    @property
+    def root(self):
+        return len(self.tags) - 1
+
+    def top_level(self):
+        """Row indexes of the top-level statements."""
+        if self.tags[self.root] == PROGRAM:
+            return list(self.read_run(self.c[self.root]))
+        return [self.root]
+
+    def statements(self):
+        """Expand the top-level statements one at a time, so only one is ever materialized."""
+        for index in self.top_level():
+            yield self.expand(index)
+
+    def expand(self, index=None):
+        """Rebuild the node at row index (the root by default) and everything below it."""
+        if index is None:
+            index = self.root
+        tags, a, b, c, names = self.tags, self.a, self.b, self.c, self.names
+        built = {}
+        for row in range(self.start[index], index + 1):
+            tag = tags[row]
+            if tag == NUM:
+                node = Num(self.constants[a[row]])
+            elif tag == VAR:
+                node = Var(names[a[row]])
+            elif tag == BINOP:
+                node = BinOp(built.pop(a[row]), TokenType(c[row]), built.pop(b[row]))
+            elif tag == CALL:
+                node = Call(built.pop(a[row]), [built.pop(arg) for arg in self.read_run(c[row])])
+            elif tag == BOOL:
+                node = Bool(bool(a[row]))
+            elif tag == UNARYOP:
+                node = UnaryOp(TokenType(c[row]), built.pop(a[row]))
+            elif tag == IF:
+                else_branch = built.pop(c[row]) if c[row] >= 0 else None
+                node = If(built.pop(a[row]), built.pop(b[row]), else_branch)
+            elif tag == RETURN:
+                node = Return(built.pop(a[row]))
+            elif tag == FUNCTION:
+                params = [names[param] for param in self.read_run(c[row])]
+                node = Function(names[a[row]], params, built.pop(b[row]))
+            elif tag == LAMBDA:
+                params = [names[param] for param in self.read_run(c[row])]
+                node = Lambda(params, built.pop(b[row]))
+            elif tag == SEQUENCE:
+                node = Sequence([built.pop(statement) for statement in self.read_run(c[row])])
+            elif tag == PROGRAM:
+                node = Program([built.pop(statement) for statement in self.read_run(c[row])])
+            else:
+                raise Exception(f'Corrupt flat AST: unknown tag {tag}')
+            built[row] = node
+        return built[index]
+
+def flatten(node):
+    """Pack a tree into a FlatAST without recursing, however deep it is."""
+    flat = FlatAST()
+    rows = []
+    stack = [(node, False, 0)]
+    while stack:
+        node, expanded, start = stack.pop()
+        if not expanded:
+            stack.append((node, True, len(flat)))
+            for child in reversed(children(node)):
+                stack.append((child, False, 0))
+            continue
+        # Rows of this node's children were pushed last, in order.
+        count = len(children(node))
+        child_rows = rows[len(rows) - count:]
+        del rows[len(rows) - count:]
+        if isinstance(node, Num):
+            row = flat.add(NUM, start, flat.constant(node.value))
+        elif isinstance(node, Bool):
+            row = flat.add(BOOL, start, int(node.value))
+        elif isinstance(node, Var):
+            row = flat.add(VAR, start, flat.name(node.value))
+        elif isinstance(node, BinOp):
+            row = flat.add(BINOP, start, child_rows[0], child_rows[1], node.op.value)
+        elif isinstance(node, UnaryOp):
+            row = flat.add(UNARYOP, start, child_rows[0], c=node.op.value)
+        elif isinstance(node, If):
+            else_row = child_rows[2] if node.else_branch is not None else -1
+            row = flat.add(IF, start, child_rows[0], child_rows[1], else_row)
+        elif isinstance(node, Function):
+            params = flat.run([flat.name(param) for param in node.params])
+            row = flat.add(FUNCTION, start, flat.name(node.name), child_rows[0], params)
+        elif isinstance(node, Lambda):
+            params = flat.run([flat.name(param) for param in node.params])
+            row = flat.add(LAMBDA, start, -1, child_rows[0], params)
+        elif isinstance(node, Call):
+            row = flat.add(CALL, start, child_rows[0], c=flat.run(child_rows[1:]))
+        elif isinstance(node, Return):
+            row = flat.add(RETURN, start, child_rows[0])
+        elif isinstance(node, Sequence):
+            row = flat.add(SEQUENCE, start, c=flat.run(child_rows))
+        elif isinstance(node, Program):
+            row = flat.add(PROGRAM, start, c=flat.run(child_rows))
+        else:
+            raise Exception(f'Cannot flatten {type(node).__name__}')
+        rows.append(row)
+    return flat
@@ -0,0 +1,279 @@
+import marshal
+import os
+import tempfile
+from sys import intern
+from environment import Environment, Frame, UNDEFINED
+from parser import Function, Lambda, Var
+from ast_cache import children, decode, encode
+from interpreter import Interpreter, VERSION
+from lazy import Thunk, UNFORCED
+from sequences import BUILTINS, Builtin, Seq
+
+MAGIC = b'LAMI'
+FORMAT = 2
+
+# Value tags.
+CONSTANT, OBJECT, BUILTIN, SEQ, UNDEFINED_VALUE, UNFORCED_VALUE = range(6)
+# Object record tags.
+ENVIRONMENT, FRAME, FUNCTION, THUNK = range(4)
+
+def postorder(node):
+    """Every node under node in the order ast_cache.encode writes them."""
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            stack.append((child, False))
+
+def annotations(root):
+    """The Resolver's slots and frame sizes under root, which ast_cache.encode leaves out."""
+    out = []
+    for node in postorder(root):
+        if isinstance(node, Var):
+            out += (node.depth, node.slot)
+        elif isinstance(node, Function):
+            out += (node.frame_size, node.slot, node.captures)
+        elif isinstance(node, Lambda):
+            out += (node.frame_size, node.captures)
+    return out
+
+def annotate(nodes, data):
+    index = 0
+    for node in nodes:
+        kind = type(node)
+        if kind is Var:
+            node.depth, node.slot = data[index], data[index + 1]
+            index += 2
+        elif kind is Function:
+            node.frame_size, node.slot, node.captures = data[index:index + 3]
+            index += 3
+        elif kind is Lambda:
+            node.frame_size, node.captures = data[index], data[index + 1]
+            index += 2
+
+class ImageWriter:
+    """Flatten everything reachable from a global environment into marshal-able lists.
+
+    Environments, frames, closures and thunks become numbered records that
+    refer to each other by index, so cycles (a recursive defun stored in
+    the environment it closes over) and long chains need no recursion. The
+    AST bodies they share are written once: a body nested in another
+    body is stored as a position in its enclosing tree, which keeps every
+    closure made from one defun pointing at the same nodes after loading.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.objects = {}
+        self.pending = []
+        self.nodes = []
+        self.node_indexes = {}
+
+    def write(self, env):
+        root = self.value(env)
+        while self.pending:
+            index, obj = self.pending.pop()
+            self.records[index] = self.record(obj)
+        trees, locations = self.trees()
+        return (MAGIC, FORMAT, VERSION, root, self.records, trees, locations)
+
+    def value(self, value):
+        if value is None or type(value) in (int, bool):
+            return (CONSTANT, value)
+        if type(value) in (Environment, Frame, Function, ImageFunction, Thunk):
+            index = self.objects.get(id(value))
+            if index is None:
+                index = self.objects[id(value)] = len(self.records)
+                self.records.append(None)
+                self.pending.append((index, value))
+            return (OBJECT, index)
+        if value is UNDEFINED:
+            return (UNDEFINED_VALUE,)
+        if value is UNFORCED:
+            return (UNFORCED_VALUE,)
+        if type(value) is Builtin:
+            return (BUILTIN, value.name)
+        if type(value) is Seq:
+            # A sequence is a pipeline of Python iterators; keep its elements instead.
+            return (SEQ, [self.value(element) for element in value])
+        raise Exception(f'Cannot write {type(value).__name__} values to an image')
+
+    def node(self, node):
+        if node is None:
+            return None
+        index = self.node_indexes.get(id(node))
+        if index is None:
+            index = self.node_indexes[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+        return index
+
+    def record(self, obj):
+        if type(obj) is Environment:
+            names = list(obj.variables)
+            return (ENVIRONMENT, self.value(obj.parent), names,
+                    [self.value(value) for value in obj.variables.values()])
+        if type(obj) is Frame:
+            return (FRAME, self.value(obj.parent), [self.value(value) for value in obj.slots])
+        if isinstance(obj, Function):
+            return (FUNCTION, obj.name, obj.params, self.node(obj.body), self.value(obj.env),
+                    obj.frame_size, obj.slot, obj.captures)
+        return (THUNK, self.node(obj.node), self.value(obj.env), self.value(obj.value))
+
+    def trees(self):
+        inside = set()
+        for node in self.nodes:
+            stack = list(children(node))
+            while stack:
+                child = stack.pop()
+                if id(child) not in inside:
+                    inside.add(id(child))
+                    stack.extend(children(child))
+        trees = []
+        positions = {}
+        for node in self.nodes:
+            if id(node) in inside:
+                continue
+            for position, child in enumerate(postorder(node)):
+                positions.setdefault(id(child), (len(trees), position))
+            trees.append((encode(node), annotations(node)))
+        return trees, [positions[id(node)] for node in self.nodes]
+
+def snapshot(env):
+    """An image of env and everything reachable from it, as plain marshal-able data."""
+    return ImageWriter().write(env)
+
+BODY = Function.body
+
+class Trees:
+    """The AST trees of an image, each decoded the first time one of its nodes is needed."""
+
+    def __init__(self, trees, locations):
+        self.trees = trees
+        self.locations = locations
+        self.decoded = [None] * len(trees)
+
+    def node(self, index):
+        tree, position = self.locations[index]
+        nodes = self.decoded[tree]
+        if nodes is None:
+            encoded, annotation = self.trees[tree]
+            nodes = self.decoded[tree] = []
+            decode(encoded, nodes)
+            annotate(nodes, annotation)
+        return nodes[position]
+
+class ImageFunction(Function):
+    """A Function from an image whose body has not been decoded yet.
+
+    The body slot holds (trees, index) until it is first read; then the
+    tree is decoded and the object turns into a plain Function, so loading
+    a large prelude only pays for the functions a program actually uses.
+    """
+    __slots__ = ()
+
+    @property
+    def body(self):
+        trees, index = BODY.__get__(self)
+        body = trees.node(index)
+        BODY.__set__(self, body)
+        self.__class__ = Function
+        return body
+
+    @body.setter
+    def body(self, body):
+        BODY.__set__(self, body)
+        self.__class__ = Function
+
+def restore(data):
+    """A new global environment rebuilt from an image; each call returns an independent copy."""
+    _, _, _, root, records, trees, locations = data
+    trees = Trees(trees, locations)
+    objects = []
+    for record in records:
+        tag = record[0]
+        if tag == ENVIRONMENT:
+            objects.append(Environment())
+        elif tag == FRAME:
+            objects.append(Frame(None, None))
+        elif tag == FUNCTION:
+            func = Function(record[1] and intern(record[1]), [intern(param) for param in record[2]],
+                            (trees, record[3]), None, record[5], record[7])
+            func.slot = record[6]
+            func.__class__ = ImageFunction
+            objects.append(func)
+        elif tag == THUNK:
+            objects.append(Thunk(None if record[1] is None else trees.node(record[1]), None))
+        else:
+            raise Exception(f'Corrupt image: unknown record {tag}')
+
+    def value(encoded):
+        tag = encoded[0]
+        if tag == CONSTANT:
+            return encoded[1]
+        if tag == OBJECT:
+            return objects[encoded[1]]
+        if tag == BUILTIN:
+            return BUILTINS[encoded[1]]
+        if tag == SEQ:
+            return Seq([value(element) for element in encoded[1]].__iter__)
+        if tag == UNDEFINED_VALUE:
+            return UNDEFINED
+        if tag == UNFORCED_VALUE:
+            return UNFORCED
+        raise Exception(f'Corrupt image: unknown value {tag}')
+
+    for obj, record in zip(objects, records):
+        tag = record[0]
+        if tag == ENVIRONMENT:
+            obj.parent = value(record[1])
+            obj.variables = {intern(name): value(item) for name, item in zip(record[2], record[3])}
+        elif tag == FRAME:
+            obj.parent = value(record[1])
+            obj.slots = [value(item) for item in record[2]]
+        elif tag == FUNCTION:
+            obj.env = value(record[4])
+        else:
+            obj.env = value(record[2])
+            obj.value = value(record[3])
+    return value(root)
+
+def preload(interpreter, data):
+    """Give interpreter a fresh copy of the image's globals as its global environment."""
+    if not isinstance(interpreter, Interpreter):
+        # The vm and python backends keep compiled code, not AST bodies, in their functions.
+        raise Exception('Images need the tree or closure backend')
+    interpreter.global_env = restore(data)
+
+def save(env, path):
+    """Write an image of env to path atomically."""
+    data = snapshot(env)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            marshal.dump(data, file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def read(path):
+    """The image stored at path, ready for restore()."""
+    try:
+        with open(path, 'rb') as file:
+            # marshal.load on a file object reads it in small pieces; one read is far faster.
+            data = marshal.loads(file.read())
+    except (EOFError, ValueError, TypeError):
+        raise Exception(f'{path} is not an image')
+    if type(data) is not tuple or len(data) != 7 or data[0] != MAGIC:
+        raise Exception(f'{path} is not an image')
+    if data[1] != FORMAT or data[2] != VERSION:
+        raise Exception(f'{path} was written by a different version; rebuild it')
+    return data
+
+def load(path):
+    return restore(read(path))
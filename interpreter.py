@@ -1,10 +1,39 @@
-from environment import Environment
+from environment import Environment, Frame, UNDEFINED
 from lexer import TokenType
-from parser import Function, Return
+from parser import AST, Call, Function, If, Return, Sequence, Var
+from closure_compiler import ClosureCompiler
+from memo import Memoizer
+from vectorize import BatchEvaluator
+from sequences import Builtin, install
+
+VERSION = '1.0'
+
+class TailCall:
+    """A call found in tail position, left for the caller's trampoline to run."""
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
 
 class Interpreter:
-    def __init__(self):
-        self.global_env = Environment()
+    def __init__(self, backend='tree', memoize=False, memo_size=1024, memo_policy='lru'):
+        if backend not in ('tree', 'closure'):
+            raise Exception(f'Unknown backend: {backend}')
+        self.global_env = self.new_globals()
+        self.backend = backend
+        self.compiler = ClosureCompiler()
+        self.memo = Memoizer(memo_size, memo_policy) if memoize else None
+        self.batch = BatchEvaluator()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Frames of returned calls whose bodies make no closures, see call().
+        self.frame_pool = []
+        self.frame_pool_size = 1024
+
+    def new_globals(self):
+        """An empty global environment holding only the builtins."""
+        return install(Environment())
 
     def visit(self, node, env):
         method_name = f'visit_{type(node).__name__}'
@@ -15,39 +44,39 @@ class Interpreter:
         raise Exception(f'No visit_{type(node).__name__} method')
 
     def visit_BinOp(self, node, env):
-        if node.op.type == TokenType.PLUS:
+        if node.op == TokenType.PLUS:
             return self.visit(node.left, env) + self.visit(node.right, env)
-        elif node.op.type == TokenType.MINUS:
+        elif node.op == TokenType.MINUS:
             return self.visit(node.left, env) - self.visit(node.right, env)
-        elif node.op.type == TokenType.MULTIPLY:
+        elif node.op == TokenType.MULTIPLY:
             return self.visit(node.left, env) * self.visit(node.right, env)
-        elif node.op.type == TokenType.DIVIDE:
+        elif node.op == TokenType.DIVIDE:
             return self.visit(node.left, env) // self.visit(node.right, env)
-        elif node.op.type == TokenType.MODULO:
+        elif node.op == TokenType.MODULO:
             return self.visit(node.left, env) % self.visit(node.right, env)
-        elif node.op.type == TokenType.AND:
+        elif node.op == TokenType.AND:
             return self.visit(node.left, env) and self.visit(node.right, env)
-        elif node.op.type == TokenType.OR:
+        elif node.op == TokenType.OR:
             return self.visit(node.left, env) or self.visit(node.right, env)
-        elif node.op.type == TokenType.EQUAL:
+        elif node.op == TokenType.EQUAL:
             return self.visit(node.left, env) == self.visit(node.right, env)
-        elif node.op.type == TokenType.NOT_EQUAL:
+        elif node.op == TokenType.NOT_EQUAL:
             return self.visit(node.left, env) != self.visit(node.right, env)
-        elif node.op.type == TokenType.GREATER:
+        elif node.op == TokenType.GREATER:
             return self.visit(node.left, env) > self.visit(node.right, env)
-        elif node.op.type == TokenType.LESS:
+        elif node.op == TokenType.LESS:
             return self.visit(node.left, env) < self.visit(node.right, env)
-        elif node.op.type == TokenType.GREATER_EQUAL:
+        elif node.op == TokenType.GREATER_EQUAL:
             return self.visit(node.left, env) >= self.visit(node.right, env)
-        elif node.op.type == TokenType.LESS_EQUAL:
+        elif node.op == TokenType.LESS_EQUAL:
             return self.visit(node.left, env) <= self.visit(node.right, env)
 
     def visit_UnaryOp(self, node, env):
-        if node.op.type == TokenType.PLUS:
+        if node.op == TokenType.PLUS:
             return +self.visit(node.expr, env)
-        elif node.op.type == TokenType.MINUS:
+        elif node.op == TokenType.MINUS:
             return -self.visit(node.expr, env)
-        elif node.op.type == TokenType.NOT:
+        elif node.op == TokenType.NOT:
             return not self.visit(node.expr, env)
 
     def visit_Num(self, node, env):
@@ -57,30 +86,128 @@ class Interpreter:
         return node.value
 
     def visit_Var(self, node, env):
-        return env.get(node.value)
+        if node.depth is None:
+            return env.get(node.value)
+        return env.lookup(node.depth, node.slot, node.value)
 
     def visit_Function(self, node, env):
-        func = Function(node.name, node.params, node.body, env)
-        env.set(node.name, func)
+        func = Function(node.name, node.params, node.body, env, node.frame_size, node.captures)
+        if node.slot is None:
+            if self.memo is not None and node.name in env.variables:
+                self.memo.invalidate()
+            env.set(node.name, func)
+        else:
+            if self.memo is not None and env.slots[node.slot] is not UNDEFINED:
+                self.memo.invalidate()
+            env.slots[node.slot] = func
         return func
 
     def visit_Lambda(self, node, env):
-        return Function(None, node.params, node.body, env)
+        return Function(None, node.params, node.body, env, node.frame_size, node.captures)
+
+    def callee(self, node, env):
+        """Evaluate the function expression of a Call.
+
+        A callee named by a global (unresolved) Var goes through a monomorphic
+        inline cache on the Call node: the Function it found, the Environment
+        it was found in and that environment's version. The cache is used
+        while the lookup would start from the same environment, directly or
+        through resolved Frames, and no set has happened there since, so
+        a defun that rebinds the name invalidates it.
+        """
+        func_node = node.func
+        if type(func_node) is not Var or func_node.depth is not None:
+            return self.visit(func_node, env)
+        root = env
+        while type(root) is Frame:
+            root = root.parent
+        cache = node.cache
+        if cache is not None and cache[0] is root and cache[1] == root.version:
+            self.cache_hits += 1
+            return cache[2]
+        self.cache_misses += 1
+        func = env.get(func_node.value)
+        # Only a binding in root itself is cached: in an unresolved
+        # Environment chain it could also come from a parent that changes.
+        if type(func) is Function and len(func.params) == len(node.args) \
+                and func_node.value in root.variables:
+            node.cache = (root, root.version, func)
+        return func
 
     def visit_Call(self, node, env):
-        func = self.visit(node.func, env)
-        if not isinstance(func, Function):
-            raise Exception(f'{func} is not a function')
-        if len(func.params) != len(node.args):
-            raise Exception('Argument count mismatch')
-        new_env = Environment(func.env)
-        for param, arg in zip(func.params, node.args):
-            new_env.set(param, self.visit(arg, env))
-        result = self.visit(func.body, new_env)
+        func = self.callee(node, env)
+        args = [self.visit(arg, env) for arg in node.args]
+        if self.memo is not None:
+            return self.memo.call(self, func, args)
+        return self.call(func, args)
+
+    def call(self, func, args):
+        # Tail calls in the body come back as TailCall values and are run by
+        # this loop, so a tail-recursive defun uses constant Python stack.
+        if type(func) is Builtin:
+            return func.apply(self, args)
+        pool = self.frame_pool
+        pool_size = self.frame_pool_size
+        while True:
+            frame = self.make_frame(func, args)
+            result = self.visit_tail(func.body, frame)
+            # A frame no closure can have captured is dead once the body has
+            # returned, also when it returned a TailCall, whose arguments
+            # are already evaluated. make_frame hands it out again.
+            if not func.captures and type(frame) is Frame and len(pool) < pool_size:
+                frame.parent = None
+                frame.slots.clear()
+                pool.append(frame)
+            if type(result) is not TailCall:
+                break
+            func, args = result.func, result.args
+            if type(func) is Builtin:
+                return func.apply(self, args)
         if isinstance(result, Return):
             return result.value
         return result
 
+    def make_frame(self, func, args):
+        if not isinstance(func, Function):
+            raise Exception(f'{func} is not a function')
+        if len(func.params) != len(args):
+            raise Exception('Argument count mismatch')
+        if func.frame_size is None:
+            new_env = Environment(func.env)
+            new_env.variables.update(zip(func.params, args))
+            return new_env
+        if func.frame_size > len(args):
+            args.extend([UNDEFINED] * (func.frame_size - len(args)))
+        if self.frame_pool:
+            # Reusing the frame and its slot list leaves args garbage right
+            # away, so deep recursion that runs again adds nothing for the GC.
+            frame = self.frame_pool.pop()
+            frame.parent = func.env
+            frame.slots += args
+            return frame
+        return Frame(func.env, args)
+
+    def visit_tail(self, node, env):
+        """Evaluate a function body node that is in tail position."""
+        node_type = type(node)
+        if node_type is Call:
+            return TailCall(self.callee(node, env), [self.visit(arg, env) for arg in node.args])
+        if node_type is Return:
+            return self.visit_tail(node.value, env)
+        if node_type is If:
+            if self.visit(node.condition, env):
+                return self.visit_tail(node.then_branch, env)
+            elif node.else_branch:
+                return self.visit_tail(node.else_branch, env)
+            return None
+        if node_type is Sequence:
+            for statement in node.statements[:-1]:
+                result = self.visit(statement, env)
+                if isinstance(result, Return):
+                    return result
+            return self.visit_tail(node.statements[-1], env)
+        return self.visit(node, env)
+
     def visit_If(self, node, env):
         condition = self.visit(node.condition, env)
         if condition:
@@ -92,7 +219,51 @@ class Interpreter:
     def visit_Return(self, node, env):
         return Return(self.visit(node.value, env))
 
+    def visit_Sequence(self, node, env):
+        result = None
+        for statement in node.statements:
+            result = self.visit(statement, env)
+            if isinstance(result, Return):
+                break
+        return result
+
+    def visit_Program(self, node, env):
+        result = None
+        for statement in node.statements:
+            result = self.visit(statement, env)
+            if isinstance(result, Return):
+                return result.value
+        return result
+
+    def compile(self, node):
+        return self.compiler.compile(node)
+
+    def map_batch(self, func, *columns):
+        """Apply func to every row of the given equal-length columns.
+
+        Branch-free arithmetic and comparison bodies run as numpy array
+        operations; anything else, including int64 overflow, is evaluated
+        row by row with the usual Python int semantics.
+        """
+        return self.batch.map(self, func, columns)
+
+    def stats(self):
+        stats = {}
+        if self.memo is not None:
+            stats['memo'] = self.memo.stats()
+        if self.batch.vectorized or self.batch.fallbacks:
+            stats['batch'] = self.batch.stats()
+        lookups = self.cache_hits + self.cache_misses
+        if lookups:
+            stats['inline_cache'] = {'hits': self.cache_hits, 'misses': self.cache_misses,
+                                     'hit_rate': round(self.cache_hits / lookups, 4)}
+        return stats
+
     def eval(self, node, env=None):
         if env is None:
             env = self.global_env
+        if not isinstance(node, AST):
+            return node(env)
+        if self.backend == 'closure':
+            return self.compile(node)(env)
         return self.visit(node, env)
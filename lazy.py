@@ -0,0 +1,153 @@
+from lexer import TokenType
+from parser import BinOp, Bool, Call, Function, If, Lambda, Num, Return, Sequence, UnaryOp, Var
+from interpreter import Interpreter, TailCall
+
+UNFORCED = object()
+
+class Thunk:
+    """A suspended argument: evaluated on first use, then remembered."""
+    __slots__ = ('node', 'env', 'value')
+
+    def __init__(self, node, env):
+        self.node = node
+        self.env = env
+        self.value = UNFORCED
+
+    def force(self, interpreter):
+        if self.value is UNFORCED:
+            self.value = interpreter.visit(self.node, self.env)
+            # Let the environment go once nothing can need it again.
+            self.node = self.env = None
+        return self.value
+
+def may_return(node):
+    if isinstance(node, Return):
+        return True
+    if isinstance(node, If):
+        return may_return(node.then_branch) or (node.else_branch is not None and may_return(node.else_branch))
+    if isinstance(node, Sequence):
+        return any(may_return(statement) for statement in node.statements)
+    return False
+
+def forces(node, param, name, strict):
+    """True when evaluating node is certain to evaluate the parameter param.
+
+    name is the function's own name and strict the set of parameter positions
+    currently assumed strict, used for direct recursive calls.
+    """
+    if isinstance(node, Var):
+        return node.value == param
+    if isinstance(node, BinOp):
+        if node.op in (TokenType.AND, TokenType.OR):
+            # The right operand is skipped when the left one decides.
+            return forces(node.left, param, name, strict)
+        return forces(node.left, param, name, strict) or forces(node.right, param, name, strict)
+    if isinstance(node, UnaryOp):
+        return forces(node.expr, param, name, strict)
+    if isinstance(node, Return):
+        return forces(node.value, param, name, strict)
+    if isinstance(node, If):
+        if forces(node.condition, param, name, strict):
+            return True
+        return node.else_branch is not None and forces(node.then_branch, param, name, strict) \
+            and forces(node.else_branch, param, name, strict)
+    if isinstance(node, Sequence):
+        for statement in node.statements:
+            if forces(statement, param, name, strict):
+                return True
+            if may_return(statement):
+                return False
+        return False
+    if isinstance(node, Call):
+        if forces(node.func, param, name, strict):
+            return True
+        if name is not None and isinstance(node.func, Var) and node.func.value == name:
+            return any(forces(arg, param, name, strict) for index, arg in enumerate(node.args) if index in strict)
+        return False
+    # Num, Bool and definitions: a Lambda or defun body is not run here.
+    return False
+
+def strict_parameters(name, params, body):
+    """Positions of the parameters a function always evaluates.
+
+    Starts by assuming every parameter strict and drops the ones that some
+    path does not force until nothing changes, so a parameter that is only
+    passed on to the same position of a recursive call (an accumulator)
+    stays strict instead of building a chain of thunks.
+    """
+    strict = set(range(len(params)))
+    while True:
+        narrowed = {index for index in strict if forces(body, params[index], name, strict)}
+        if narrowed == strict:
+            return frozenset(strict)
+        strict = narrowed
+
+class LazyInterpreter(Interpreter):
+    """Tree-walking interpreter with call-by-need arguments.
+
+    An argument the callee is not known to use is bound as a Thunk and only
+    evaluated on its first Var lookup; later lookups reuse the value. Strict
+    parameters, found by strict_parameters, and arguments that are cheap to
+    evaluate (literals, lambdas and plain variables, which are passed on
+    unforced) skip the thunk. Unused arguments are never evaluated, so an
+    error or endless loop in one no longer stops the program.
+    """
+
+    def __init__(self, backend='tree', memoize=False, memo_size=1024, memo_policy='lru'):
+        if backend != 'tree':
+            raise Exception('Lazy evaluation needs the tree backend')
+        super().__init__(backend, memoize, memo_size, memo_policy)
+        # A Thunk for an argument holds the frame of the call it was made in, so no frame is recycled.
+        self.frame_pool_size = 0
+        self.strictness = {}
+        self.thunks = 0
+        self.forced = 0
+
+    def visit_Var(self, node, env):
+        if node.depth is None:
+            value = env.get(node.value)
+        else:
+            value = env.lookup(node.depth, node.slot, node.value)
+        if type(value) is Thunk:
+            if value.value is UNFORCED:
+                self.forced += 1
+            return value.force(self)
+        return value
+
+    def strict_for(self, func):
+        strict = self.strictness.get(func.body)
+        if strict is None:
+            strict = self.strictness[func.body] = strict_parameters(func.name, func.params, func.body)
+        return strict
+
+    def arguments(self, func, nodes, env):
+        strict = self.strict_for(func) if isinstance(func, Function) else None
+        args = []
+        for index, node in enumerate(nodes):
+            node_type = type(node)
+            if strict is None or index in strict or node_type is Num or node_type is Bool or node_type is Lambda:
+                args.append(self.visit(node, env))
+            elif node_type is Var:
+                args.append(Interpreter.visit_Var(self, node, env))
+            else:
+                self.thunks += 1
+                args.append(Thunk(node, env))
+        return args
+
+    def visit_Call(self, node, env):
+        func = self.callee(node, env)
+        args = self.arguments(func, node.args, env)
+        if self.memo is not None:
+            return self.memo.call(self, func, args)
+        return self.call(func, args)
+
+    def visit_tail(self, node, env):
+        if type(node) is Call:
+            func = self.callee(node, env)
+            return TailCall(func, self.arguments(func, node.args, env))
+        return Interpreter.visit_tail(self, node, env)
+
+    def stats(self):
+        stats = super().stats()
+        stats['lazy'] = {'thunks': self.thunks, 'forced': self.forced}
+        return stats
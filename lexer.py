@@ -30,6 +30,7 @@ class TokenType(Enum):
     EOF = auto()
     ARROW = auto()
     RETURN = auto()
+    SEMICOLON = auto()
 
 class Token:
     def __init__(self, type, value=None):
@@ -86,6 +87,10 @@ class Lexer:
             return Token(TokenType.LAMBDA, result)
         elif result == 'return':
             return Token(TokenType.RETURN, result)
+        elif result == 'if':
+            return Token(TokenType.IF, result)
+        elif result == 'else':
+            return Token(TokenType.ELSE, result)
         else:
             return Token(TokenType.IDENTIFIER, result)
 
@@ -128,6 +133,10 @@ class Lexer:
                 self.advance()
                 self.advance()
                 return Token(TokenType.OR)
+            if self.current_char == '!' and self.peek() == '=':
+                self.advance()
+                self.advance()
+                return Token(TokenType.NOT_EQUAL)
             if self.current_char == '!':
                 self.advance()
                 return Token(TokenType.NOT)
@@ -135,10 +144,6 @@ class Lexer:
                 self.advance()
                 self.advance()
                 return Token(TokenType.EQUAL)
-            if self.current_char == '!' and self.peek() == '=':
-                self.advance()
-                self.advance()
-                return Token(TokenType.NOT_EQUAL)
             if self.current_char == '>':
                 self.advance()
                 if self.current_char == '=':
@@ -166,6 +171,9 @@ class Lexer:
             if self.current_char == ',':
                 self.advance()
                 return Token(TokenType.COMMA)
+            if self.current_char == ';':
+                self.advance()
+                return Token(TokenType.SEMICOLON)
 
             raise Exception(f'Invalid character: {self.current_char}')
 
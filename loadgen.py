@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from server import percentile
+
+DEFAULT_SOURCE = ('defun fact(n) { if (n == 0) { return 1; } else { return n * fact(n - 1); } } '
+                  'fact(20)')
+
+async def client(open_connection, source, requests, latencies, errors):
+    reader, writer = await open_connection()
+    try:
+        for index in range(requests):
+            start = time.perf_counter()
+            writer.write(json.dumps({'id': index, 'op': 'eval', 'source': source}).encode() + b'\n')
+            await writer.drain()
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if not reply.get('ok'):
+                errors.append(reply.get('error'))
+    finally:
+        writer.close()
+
+async def server_stats(open_connection):
+    reader, writer = await open_connection()
+    try:
+        writer.write(b'{"op": "stats"}\n')
+        await writer.drain()
+        return json.loads(await reader.readline())['result']
+    finally:
+        writer.close()
+
+async def run(open_connection, source, connections, requests):
+    """Drive the server from several connections at once and summarize client-side timings."""
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(open_connection, source, requests, latencies, errors)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1e3, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+        'server': await server_stats(open_connection),
+    }
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Load generator for server.py.')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--unix', metavar='PATH', help='connect to a Unix socket instead of TCP')
+    arg_parser.add_argument('-c', '--connections', type=int, default=16, help='concurrent clients (default: 16)')
+    arg_parser.add_argument('-n', '--requests', type=int, default=200, help='requests per client (default: 200)')
+    arg_parser.add_argument('--source', default=DEFAULT_SOURCE, help='program every request evaluates')
+    args = arg_parser.parse_args(argv)
+    if args.unix:
+        open_connection = lambda: asyncio.open_unix_connection(args.unix)
+    else:
+        open_connection = lambda: asyncio.open_connection(args.host, args.port)
+    summary = asyncio.run(run(open_connection, args.source, args.connections, args.requests))
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,184 @@
+import argparse
 import sys
 from lexer import Lexer
-from parser import Parser
+from stream_lexer import StreamLexer
+from parser import Function, HashConser, Parser, Return
 from interpreter import Interpreter
+from bytecode import BytecodeCompiler, disassemble
+from vm import VM
+from resolver import Resolver
+from optimizer import Optimizer
+import ast_cache
+import batch_runner
+from profiler import Profiler
+from transpiler import PythonBackend
+from lazy import LazyInterpreter
+import budget
+import image
+import typecheck
+from closure_compiler import ClosureCompiler
+from cse import SubexpressionCache
 
-def run_file(filename):
+def make_interpreter(backend='tree', memoize=False, memo_size=1024, lazy=False):
+    if memoize and backend != 'tree':
+        # The other backends run calls without going through Interpreter.visit_Call.
+        raise Exception('Memoization needs the tree backend')
+    if lazy:
+        return LazyInterpreter(backend, memoize=memoize, memo_size=memo_size)
+    if backend == 'vm':
+        return VM()
+    if backend == 'python':
+        return PythonBackend()
+    return Interpreter(backend, memoize=memoize, memo_size=memo_size)
+
+def print_stats(interpreter, optimizer=None, conser=None, cse=None):
+    if optimizer is not None:
+        print(f'optimizer: {optimizer.report()}', file=sys.stderr)
+    if conser is not None:
+        print(f'hash_cons: {conser.stats()}', file=sys.stderr)
+    if isinstance(interpreter, (Interpreter, PythonBackend)):
+        for name, values in interpreter.stats().items():
+            print(f'{name}: {values}', file=sys.stderr)
+    if cse is not None:
+        print(f'cse: {cse.stats()}', file=sys.stderr)
+
+def write_profile(profiler, format='text', path=None):
+    output = profiler.export(format)
+    if path is None:
+        print(output, file=sys.stderr)
+    else:
+        with open(path, 'w') as file:
+            file.write(output + '\n')
+
+def run_file(filename, backend='tree', dis=False, optimize=False, stats=False, memoize=False, memo_size=1024,
+             use_cache=True, cache_dir=None, profile=None, profile_out=None, emit_python=False, lazy=False,
+             limits=None, check_types=False, image_path=None, save_image=None, hash_cons=False, cse=False):
     if not filename.endswith('.lambda'):
         raise Exception('File must have a .lambda suffix')
-    with open(filename, 'r') as file:
-        source_code = file.read()
-    lexer = Lexer(source_code)
-    parser = Parser(lexer)
-    ast = parser.parse()
-    interpreter = Interpreter()
+    if use_cache:
+        ast = ast_cache.load_or_parse(filename, cache_dir)
+    else:
+        with open(filename, 'r') as file:
+            parser = Parser(StreamLexer(file))
+            ast = parser.parse()
+    optimizer = Optimizer() if optimize else None
+    if optimizer is not None:
+        ast = optimizer.optimize(ast)
+    # After the optimizer, which rewrites nodes in place.
+    conser = HashConser() if hash_cons else None
+    if conser is not None:
+        ast = conser.intern(ast)
+    ast = Resolver().resolve(ast)
+    if dis:
+        print(disassemble(BytecodeCompiler().compile(ast)))
+    if emit_python:
+        print(PythonBackend().source(ast))
+    interpreter = make_interpreter(backend, memoize, memo_size, lazy)
+    if image_path is not None:
+        image.preload(interpreter, image.read(image_path))
+    if check_types:
+        types = typecheck.check(ast, interpreter.global_env.variables if image_path is not None else ())
+        if backend == 'closure':
+            interpreter.compiler = ClosureCompiler(types)
+    if limits:
+        budget.Budget(**limits).attach(interpreter)
+    subexpressions = SubexpressionCache() if cse else None
+    if subexpressions is not None:
+        subexpressions.attach(interpreter)
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.attach(interpreter)
     result = interpreter.eval(ast)
     print(result)
+    if save_image is not None:
+        image.save(interpreter.global_env, save_image)
+    if stats:
+        print_stats(interpreter, optimizer, conser, subexpressions)
+    if profiler is not None:
+        write_profile(profiler, profile, profile_out)
+
+def transient_nodes(statement):
+    """The nodes of a top-level statement that are garbage once it has run.
+
+    Only a defun binds a name that outlives its statement, so everything
+    outside the defuns, lambdas included, is unreachable afterwards.
+    """
+    nodes = []
+    stack = [statement]
+    while stack:
+        node = stack.pop()
+        if type(node) is not Function:
+            nodes.append(node)
+            stack += ast_cache.children(node)
+    return nodes
 
-def repl():
+def forget(interpreter, statement):
+    """Drop what the interpreter's per-node caches hold for a statement that has run."""
+    tables = (getattr(getattr(interpreter, 'compiler', None), 'codes', None),
+              getattr(getattr(interpreter, 'memo', None), 'purity', None),
+              getattr(interpreter, 'strictness', None))
+    tables = [table for table in tables if type(table) is dict]
+    if tables:
+        for node in transient_nodes(statement):
+            for table in tables:
+                table.pop(node, None)
+
+def run_stream(file, interpreter, optimizer=None, conser=None):
+    """Parse and evaluate a program one top-level statement at a time.
+
+    Yields the result of every statement other than a defun as soon as it has
+    run. After each statement the per-node caches forget its nodes outside
+    defuns (see forget), so memory grows with the defuns in the program, not
+    with its length.
+    """
+    parser = Parser(StreamLexer(file))
+    for statement in parser.statements():
+        if optimizer is not None:
+            statement = optimizer.optimize(statement)
+        if conser is not None:
+            statement = conser.intern(statement)
+        result = interpreter.eval(Resolver().resolve(statement))
+        forget(interpreter, statement)
+        if isinstance(result, Return):
+            yield result.value
+            return
+        if not isinstance(statement, Function):
+            yield result
+
+def stream_file(filename, backend='tree', optimize=False, stats=False, memoize=False, memo_size=1024,
+                profile=None, profile_out=None, lazy=False, limits=None, image_path=None, save_image=None,
+                hash_cons=False, cse=False):
+    if not filename.endswith('.lambda'):
+        raise Exception('File must have a .lambda suffix')
+    interpreter = make_interpreter(backend, memoize, memo_size, lazy)
+    if image_path is not None:
+        image.preload(interpreter, image.read(image_path))
+    optimizer = Optimizer() if optimize else None
+    conser = HashConser() if hash_cons else None
+    if limits:
+        # One budget for the whole file, not one per statement.
+        budget.Budget(**limits).attach(interpreter)
+    subexpressions = SubexpressionCache() if cse else None
+    if subexpressions is not None:
+        subexpressions.attach(interpreter)
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.attach(interpreter)
+    with open(filename, 'r') as file:
+        for result in run_stream(file, interpreter, optimizer, conser):
+            print(result, flush=True)
+    if save_image is not None:
+        image.save(interpreter.global_env, save_image)
+    if stats:
+        print_stats(interpreter, optimizer, conser, subexpressions)
+    if profiler is not None:
+        write_profile(profiler, profile, profile_out)
+
+def repl(backend='tree', lazy=False, image_path=None):
     print("Lambda Interpreter REPL. Type 'exit' to quit.")
-    interpreter = Interpreter()
+    interpreter = make_interpreter(backend, lazy=lazy)
+    if image_path is not None:
+        image.preload(interpreter, image.read(image_path))
     env = interpreter.global_env
     while True:
         try:
@@ -26,14 +187,72 @@ def repl():
                 break
             lexer = Lexer(line)
             parser = Parser(lexer)
-            ast = parser.parse()
+            ast = Resolver().resolve(parser.parse())
             result = interpreter.eval(ast, env)
             print(result)
         except Exception as e:
             print(e)
 
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Lambda language interpreter.')
+    arg_parser.add_argument('file', nargs='?', help='a .lambda file to run; starts the REPL when omitted')
+    arg_parser.add_argument('--backend', choices=('tree', 'closure', 'vm', 'python'), default='tree',
+                            help='execution engine (default: tree)')
+    arg_parser.add_argument('--vm', dest='backend', action='store_const', const='vm',
+                            help='shorthand for --backend vm')
+    arg_parser.add_argument('--dis', action='store_true', help='print the bytecode before running the file')
+    arg_parser.add_argument('--emit-python', action='store_true',
+                            help='print the Python source the python backend generates before running the file')
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='fold constants, simplify identities and prune dead branches before running')
+    arg_parser.add_argument('--lazy', action='store_true',
+                            help='pass arguments by need: evaluate each one only when the callee first uses it')
+    arg_parser.add_argument('--typecheck', action='store_true',
+                            help='infer types and report type errors before running; the closure backend '
+                                 'then uses the types to specialize operators and calls')
+    arg_parser.add_argument('--hash-cons', action='store_true',
+                            help='share repeated identical subexpressions in the AST; --stats reports the unique-node ratio')
+    arg_parser.add_argument('--cse', action='store_true',
+                            help='evaluate each pure arithmetic subexpression once per set of input values (tree backend)')
+    arg_parser.add_argument('--memoize', action='store_true', help='cache results of pure functions')
+    arg_parser.add_argument('--memo-size', type=int, default=1024, help='LRU entries kept per function (default: 1024)')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='run top-level statements as they are parsed and print each result')
+    arg_parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                            help='always re-parse instead of using the on-disk AST cache')
+    arg_parser.add_argument('--cache-dir', help=f'where to keep cached ASTs (default: {ast_cache.CACHE_DIRNAME}/ next to the file)')
+    arg_parser.add_argument('--stats', action='store_true', help='print pass and runtime statistics to stderr')
+    arg_parser.add_argument('--profile', nargs='?', const='text', choices=('text', 'collapsed', 'chrome'),
+                            help='profile the tree backend and print a text summary, folded stacks for '
+                                 'flamegraphs or a Chrome trace (default: text)')
+    arg_parser.add_argument('--profile-out', metavar='PATH', help='write the --profile output here instead of stderr')
+    arg_parser.add_argument('--image', metavar='PATH',
+                            help='start from the global environment saved in this image instead of an empty one')
+    arg_parser.add_argument('--save-image', metavar='PATH',
+                            help='after running the file, save its global environment as an image for --image')
+    budget.add_arguments(arg_parser)
+    arg_parser.add_argument('--batch', action='append', metavar='TARGET',
+                            help='run every .lambda file in a directory, glob or manifest on a process pool; repeatable')
+    arg_parser.add_argument('-j', '--jobs', type=int, help='worker processes for --batch (default: one per core)')
+    arg_parser.add_argument('--timeout', type=float, help='seconds each --batch file may run before it is stopped')
+    arg_parser.add_argument('--report', help='write the --batch JSON-lines report here instead of stdout')
+    return arg_parser.parse_args(argv)
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        run_file(sys.argv[1])
+    args = parse_args()
+    if args.batch:
+        batch_runner.batch(args.batch, args.jobs, args.report, backend=args.backend, optimize=args.optimize,
+                           memoize=args.memoize, memo_size=args.memo_size, use_cache=args.use_cache,
+                           cache_dir=args.cache_dir, timeout=args.timeout, lazy=args.lazy,
+                           limits=budget.limits(args), check_types=args.typecheck, image_path=args.image)
+    elif args.file and args.stream:
+        stream_file(args.file, args.backend, args.optimize, args.stats, args.memoize, args.memo_size,
+                    args.profile, args.profile_out, lazy=args.lazy, limits=budget.limits(args),
+                    image_path=args.image, save_image=args.save_image, hash_cons=args.hash_cons, cse=args.cse)
+    elif args.file:
+        run_file(args.file, args.backend, args.dis, args.optimize, args.stats, args.memoize, args.memo_size,
+                 args.use_cache, args.cache_dir, args.profile, args.profile_out, args.emit_python, lazy=args.lazy,
+                 limits=budget.limits(args), check_types=args.typecheck, image_path=args.image,
+                 save_image=args.save_image, hash_cons=args.hash_cons, cse=args.cse)
     else:
-        repl()
+        repl(args.backend, args.lazy, args.image)
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from parser import Function, If, Sequence
+
+POLICIES = ('lru', 'fifo')
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry, or the oldest one with policy='fifo'."""
+
+    def __init__(self, maxsize=1024, policy='lru'):
+        if policy not in POLICIES:
+            raise Exception(f'Unknown eviction policy: {policy}')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entries = self.entries
+        if key not in entries:
+            return default
+        if self.policy == 'lru':
+            entries.move_to_end(key)
+        return entries[key]
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+def memo_key(args):
+    """Build a cache key for an argument list, or None when it can't be cached.
+
+    Only ints and bools are accepted. true == 1 in Python, so when a bool is
+    present the types become part of the key to keep f(true) and f(1) apart.
+    """
+    has_bool = False
+    for arg in args:
+        arg_type = type(arg)
+        if arg_type is bool:
+            has_bool = True
+        elif arg_type is not int:
+            return None
+    if has_bool:
+        return tuple((type(arg), arg) for arg in args)
+    return tuple(args)
+
+def defines_functions(node):
+    if isinstance(node, Function):
+        return True
+    if isinstance(node, Sequence):
+        return any(defines_functions(statement) for statement in node.statements)
+    if isinstance(node, If):
+        return defines_functions(node.then_branch) or defines_functions(node.else_branch)
+    return False
+
+def is_pure(func):
+    """Decide whether calls to a function may be answered from a cache.
+
+    The only state a program can change is a name binding made by defun. A
+    function whose body runs no defun of its own therefore computes the same
+    result for the same arguments as long as the names it reads freely keep
+    their bindings, and Memoizer.invalidate covers the case where they don't.
+    Functions without parameters are left alone since there is nothing to key on.
+    """
+    return bool(func.params) and not defines_functions(func.body)
+
+class Memoizer:
+    def __init__(self, maxsize=1024, policy='lru'):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.caches = WeakKeyDictionary()
+        self.purity = {}
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def cache_for(self, func):
+        if not isinstance(func, Function):
+            return None
+        cache = self.caches.get(func)
+        if cache is None:
+            pure = self.purity.get(func.body)
+            if pure is None:
+                pure = self.purity[func.body] = is_pure(func)
+            if pure:
+                cache = self.caches[func] = LRUCache(self.maxsize, self.policy)
+        return cache
+
+    def call(self, interpreter, func, args):
+        cache = self.cache_for(func)
+        key = None if cache is None else memo_key(args)
+        if key is None:
+            self.uncacheable += 1
+            return interpreter.call(func, args)
+        result = cache.get(key, cache)
+        if result is not cache:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = interpreter.call(func, args)
+        cache.put(key, result)
+        return result
+
+    def invalidate(self):
+        """Drop every cached result after a name a cached function could read was rebound."""
+        for cache in self.caches.values():
+            cache.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'uncacheable': self.uncacheable,
+            'evictions': sum(cache.evictions for cache in self.caches.values()),
+            'entries': sum(len(cache) for cache in self.caches.values()),
+        }
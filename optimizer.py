@@ -0,0 +1,233 @@
+from lexer import TokenType
+from parser import AST, BinOp, Bool, Call, Function, If, Lambda, Num, Program, Return, Sequence, UnaryOp
+
+ARITHMETIC = {
+    TokenType.PLUS: lambda a, b: a + b,
+    TokenType.MINUS: lambda a, b: a - b,
+    TokenType.MULTIPLY: lambda a, b: a * b,
+    TokenType.DIVIDE: lambda a, b: a // b,
+    TokenType.MODULO: lambda a, b: a % b,
+}
+
+COMPARISONS = {
+    TokenType.EQUAL: lambda a, b: a == b,
+    TokenType.NOT_EQUAL: lambda a, b: a != b,
+    TokenType.GREATER: lambda a, b: a > b,
+    TokenType.LESS: lambda a, b: a < b,
+    TokenType.GREATER_EQUAL: lambda a, b: a >= b,
+    TokenType.LESS_EQUAL: lambda a, b: a <= b,
+}
+
+UNARY = {
+    TokenType.PLUS: lambda a: +a,
+    TokenType.MINUS: lambda a: -a,
+    TokenType.NOT: lambda a: not a,
+}
+
+RULES = ('fold_constants', 'simplify_identities', 'prune_branches', 'short_circuit')
+
+def is_constant(node):
+    return isinstance(node, (Num, Bool))
+
+def constant(value):
+    if isinstance(value, bool):
+        return Bool(value)
+    return Num(value)
+
+def is_int(node):
+    """True when node always evaluates to an int (never a bool or function)."""
+    if isinstance(node, Num):
+        return True
+    if isinstance(node, UnaryOp):
+        return node.op in (TokenType.PLUS, TokenType.MINUS)
+    if isinstance(node, BinOp):
+        return node.op in ARITHMETIC
+    return False
+
+def is_bool(node):
+    """True when node always evaluates to a bool."""
+    if isinstance(node, Bool):
+        return True
+    if isinstance(node, UnaryOp):
+        return node.op == TokenType.NOT
+    if isinstance(node, BinOp):
+        return node.op in COMPARISONS
+    return False
+
+def count_nodes(node):
+    if not isinstance(node, AST):
+        return 0
+    if isinstance(node, (Sequence, Program)):
+        return 1 + sum(count_nodes(statement) for statement in node.statements)
+    if isinstance(node, BinOp):
+        return 1 + count_nodes(node.left) + count_nodes(node.right)
+    if isinstance(node, UnaryOp):
+        return 1 + count_nodes(node.expr)
+    if isinstance(node, If):
+        return 1 + count_nodes(node.condition) + count_nodes(node.then_branch) + count_nodes(node.else_branch)
+    if isinstance(node, (Function, Lambda)):
+        return 1 + count_nodes(node.body)
+    if isinstance(node, Call):
+        return 1 + count_nodes(node.func) + sum(count_nodes(arg) for arg in node.args)
+    if isinstance(node, Return):
+        return 1 + count_nodes(node.value)
+    return 1
+
+class Optimizer:
+    """AST to AST pass run between Parser.parse and Interpreter.eval.
+
+    Every rule can be switched off with the matching keyword argument. The
+    rewrites keep the value a program computes: identities are only applied
+    when the operand is known to be an int (x * 1 would turn true into 1),
+    and !!x is only dropped when x is already a bool or the result is only
+    used as an If condition.
+    """
+
+    def __init__(self, fold_constants=True, simplify_identities=True, prune_branches=True, short_circuit=True):
+        self.fold_constants = fold_constants
+        self.simplify_identities = simplify_identities
+        self.prune_branches = prune_branches
+        self.short_circuit = short_circuit
+        self.stats = dict.fromkeys(RULES + ('nodes_before', 'nodes_after', 'nodes_removed'), 0)
+
+    def optimize(self, node):
+        before = count_nodes(node)
+        node = self.visit(node)
+        after = count_nodes(node)
+        self.stats['nodes_before'] += before
+        self.stats['nodes_after'] += after
+        self.stats['nodes_removed'] += before - after
+        return node
+
+    def report(self):
+        return ', '.join(f'{name}={value}' for name, value in self.stats.items())
+
+    def visit(self, node, condition=False):
+        method_name = f'optimize_{type(node).__name__}'
+        optimizer = getattr(self, method_name, None)
+        if optimizer is None:
+            return node
+        return optimizer(node, condition)
+
+    def optimize_statements(self, statements):
+        optimized = []
+        for index, statement in enumerate(statements):
+            statement = self.visit(statement)
+            last = index == len(statements) - 1
+            if (self.prune_branches and not last and isinstance(statement, If)
+                    and is_constant(statement.condition) and not statement.condition.value
+                    and statement.else_branch is None):
+                self.stats['prune_branches'] += 1
+                continue
+            if isinstance(statement, Sequence):
+                optimized.extend(statement.statements)
+            else:
+                optimized.append(statement)
+        return optimized
+
+    def optimize_Sequence(self, node, condition):
+        node.statements = self.optimize_statements(node.statements)
+        if len(node.statements) == 1:
+            return node.statements[0]
+        return node
+
+    def optimize_Program(self, node, condition):
+        node.statements = self.optimize_statements(node.statements)
+        return node
+
+    def optimize_BinOp(self, node, condition):
+        op = node.op
+        if op in (TokenType.AND, TokenType.OR):
+            # Either operand can end up as the result, so both keep the
+            # truthiness-only context of the whole expression.
+            node.left = self.visit(node.left, condition)
+            if self.short_circuit and is_constant(node.left):
+                self.stats['short_circuit'] += 1
+                # Python's and/or pick the operand that decides the result.
+                if bool(node.left.value) == (op == TokenType.AND):
+                    return self.visit(node.right, condition)
+                return node.left
+            node.right = self.visit(node.right, condition)
+            return node
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if self.fold_constants and is_constant(node.left) and is_constant(node.right):
+            if not (op in (TokenType.DIVIDE, TokenType.MODULO) and node.right.value == 0):
+                apply = ARITHMETIC.get(op) or COMPARISONS[op]
+                self.stats['fold_constants'] += 1
+                return constant(apply(node.left.value, node.right.value))
+        if self.simplify_identities:
+            simplified = self.simplify_binop(node)
+            if simplified is not node:
+                self.stats['simplify_identities'] += 1
+                return simplified
+        return node
+
+    def simplify_binop(self, node):
+        op, left, right = node.op, node.left, node.right
+
+        def value_is(side, number):
+            return isinstance(side, Num) and side.value == number
+
+        if op == TokenType.PLUS:
+            if value_is(right, 0) and is_int(left):
+                return left
+            if value_is(left, 0) and is_int(right):
+                return right
+        elif op == TokenType.MINUS:
+            if value_is(right, 0) and is_int(left):
+                return left
+        elif op == TokenType.MULTIPLY:
+            if value_is(right, 1) and is_int(left):
+                return left
+            if value_is(left, 1) and is_int(right):
+                return right
+        elif op == TokenType.DIVIDE:
+            if value_is(right, 1) and is_int(left):
+                return left
+        return node
+
+    def optimize_UnaryOp(self, node, condition):
+        is_not = node.op == TokenType.NOT
+        node.expr = self.visit(node.expr, is_not)
+        if self.fold_constants and is_constant(node.expr):
+            self.stats['fold_constants'] += 1
+            return constant(UNARY[node.op](node.expr.value))
+        if self.simplify_identities and is_not and isinstance(node.expr, UnaryOp) \
+                and node.expr.op == TokenType.NOT:
+            inner = node.expr.expr
+            if condition or is_bool(inner):
+                self.stats['simplify_identities'] += 1
+                return inner
+        return node
+
+    def optimize_If(self, node, condition):
+        node.condition = self.visit(node.condition, True)
+        node.then_branch = self.visit(node.then_branch)
+        if node.else_branch is not None:
+            node.else_branch = self.visit(node.else_branch)
+        if self.prune_branches and is_constant(node.condition):
+            if node.condition.value:
+                self.stats['prune_branches'] += 1
+                return node.then_branch
+            if node.else_branch is not None:
+                self.stats['prune_branches'] += 1
+                return node.else_branch
+        return node
+
+    def optimize_Function(self, node, condition):
+        node.body = self.visit(node.body)
+        return node
+
+    def optimize_Lambda(self, node, condition):
+        node.body = self.visit(node.body)
+        return node
+
+    def optimize_Call(self, node, condition):
+        node.func = self.visit(node.func)
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def optimize_Return(self, node, condition):
+        node.value = self.visit(node.value)
+        return node
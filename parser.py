@@ -1,61 +1,227 @@
+from sys import intern
 from lexer import TokenType
 
 class AST:
-    pass
+    __slots__ = ()
 
 class UnaryOp(AST):
+    __slots__ = ('op', 'expr')
+
     def __init__(self, op, expr):
-        self.token = self.op = op
+        self.op = op
         self.expr = expr
 
 class BinOp(AST):
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
 
 class Num(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
 
 class Bool(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
 
 class Var(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
+    __slots__ = ('value', 'depth', 'slot')
+
+    def __init__(self, name):
+        self.value = intern(name)
+        self.depth = None
+        self.slot = None
 
 class If(AST):
+    __slots__ = ('condition', 'then_branch', 'else_branch')
+
     def __init__(self, condition, then_branch, else_branch=None):
         self.condition = condition
         self.then_branch = then_branch
         self.else_branch = else_branch
 
 class Function(AST):
-    def __init__(self, name, params, body, env=None):
+    # Function doubles as the runtime closure value, which Memoizer keys weakly.
+    # captures is False once the resolver has found that body makes no closures, see Interpreter.call.
+    __slots__ = ('name', 'params', 'body', 'env', 'frame_size', 'slot', 'captures', '__weakref__')
+
+    def __init__(self, name, params, body, env=None, frame_size=None, captures=True):
         self.name = name
         self.params = params
         self.body = body
         self.env = env
+        self.frame_size = frame_size
+        self.slot = None
+        self.captures = captures
 
 class Lambda(AST):
+    __slots__ = ('params', 'body', 'frame_size', 'captures')
+
     def __init__(self, params, body):
         self.params = params
         self.body = body
+        self.frame_size = None
+        self.captures = True
 
 class Call(AST):
+    # cache is the interpreter's inline cache for the callee, see Interpreter.callee.
+    __slots__ = ('func', 'args', 'cache')
+
     def __init__(self, func, args):
         self.func = func
         self.args = args
+        self.cache = None
 
 class Return(AST):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
+class Sequence(AST):
+    __slots__ = ('statements',)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+class Program(AST):
+    __slots__ = ('statements',)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+# Binding powers: an operator binds its operands more tightly the higher its
+# power. A primary, a call, a lambda and a prefix operator's result sit at ATOM.
+LOGIC, COMPARE, SUM, PRODUCT, ATOM = range(1, 6)
+
+BINDING_POWER = {
+    TokenType.AND: LOGIC,
+    TokenType.OR: LOGIC,
+    TokenType.EQUAL: COMPARE,
+    TokenType.NOT_EQUAL: COMPARE,
+    TokenType.GREATER: COMPARE,
+    TokenType.LESS: COMPARE,
+    TokenType.GREATER_EQUAL: COMPARE,
+    TokenType.LESS_EQUAL: COMPARE,
+    TokenType.PLUS: SUM,
+    TokenType.MINUS: SUM,
+    TokenType.MULTIPLY: PRODUCT,
+    TokenType.DIVIDE: PRODUCT,
+    TokenType.MODULO: PRODUCT,
+}
+
+PREFIX_OPERATORS = frozenset((TokenType.PLUS, TokenType.MINUS, TokenType.NOT))
+
+# Kinds of pending work on Parser.expression's stack.
+BINARY, GROUP, CALL, LAMBDA_BODY, PREFIX = range(5)
+
+class HashConser:
+    """Share structurally identical expression nodes, turning a tree into a DAG.
+
+    Num, Bool, Var, UnaryOp, BinOp and Call nodes are looked up in a table
+    keyed by their type, fields and (already shared) children, so every
+    repeated subexpression becomes one node. Each function body gets a
+    table of its own, because the Resolver gives the same name different
+    slots in different functions; statements, defuns and lambdas are never
+    shared. Run it after the Optimizer, which rewrites nodes in place.
+    Each intern() call starts with empty tables, so interning a stream one
+    statement at a time keeps no statement alive. nodes counts the nodes
+    seen and unique the ones left after sharing.
+    """
+
+    def __init__(self):
+        self.scopes = [{}]
+        self.nodes = 0
+        self.unique = 0
+
+    def intern(self, node):
+        self.scopes = [{}]
+        results = []
+        stack = [(node, False)]
+        while stack:
+            node, expanded = stack.pop()
+            node_type = type(node)
+            if not expanded:
+                self.nodes += 1
+                stack.append((node, True))
+                if node_type is Function or node_type is Lambda:
+                    self.scopes.append({})
+                stack += [(child, False) for child in reversed(self.children(node))]
+                continue
+            results.append(self.share(node, node_type, results))
+        return results[0]
+
+    def children(self, node):
+        node_type = type(node)
+        if node_type is BinOp:
+            return (node.left, node.right)
+        if node_type is UnaryOp:
+            return (node.expr,)
+        if node_type is Return:
+            return (node.value,)
+        if node_type is Call:
+            return (node.func, *node.args)
+        if node_type is If:
+            if node.else_branch is None:
+                return (node.condition, node.then_branch)
+            return (node.condition, node.then_branch, node.else_branch)
+        if node_type is Sequence or node_type is Program:
+            return node.statements
+        if node_type is Function or node_type is Lambda:
+            return (node.body,)
+        return ()
+
+    def share(self, node, node_type, results):
+        """Put node's shared children back into it and return the node to use in its place."""
+        count = len(self.children(node))
+        children = results[len(results) - count:]
+        del results[len(results) - count:]
+        if node_type is Num or node_type is Bool:
+            key = (node_type, type(node.value), node.value)
+        elif node_type is Var:
+            key = (Var, node.value)
+        elif node_type is BinOp:
+            node.left, node.right = children
+            key = (BinOp, node.op, node.left, node.right)
+        elif node_type is UnaryOp:
+            node.expr = children[0]
+            key = (UnaryOp, node.op, node.expr)
+        elif node_type is Call:
+            node.func = children[0]
+            node.args = children[1:]
+            key = (Call, node.func, *node.args)
+        else:
+            if node_type is Return:
+                node.value = children[0]
+            elif node_type is If:
+                node.condition, node.then_branch = children[0], children[1]
+                if count == 3:
+                    node.else_branch = children[2]
+            elif node_type is Sequence or node_type is Program:
+                node.statements = children
+            elif node_type is Function or node_type is Lambda:
+                node.body = children[0]
+                self.scopes.pop()
+            self.unique += 1
+            return node
+        table = self.scopes[-1]
+        shared = table.get(key)
+        if shared is None:
+            table[key] = shared = node
+            self.unique += 1
+        return shared
+
+    def stats(self):
+        return {'nodes': self.nodes, 'unique': self.unique,
+                'unique_ratio': round(self.unique / self.nodes, 4) if self.nodes else 1.0}
+
 class Parser:
     def __init__(self, lexer):
         self.lexer = lexer
@@ -70,124 +236,140 @@ class Parser:
         else:
             self.error()
 
+    def identifier(self):
+        name = intern(self.current_token.value)
+        self.eat(TokenType.IDENTIFIER)
+        return name
+
+    def expression(self, min_power=LOGIC):
+        """Parse an expression whose binary operators bind at least as tightly as min_power.
+
+        Precedence climbing driven by BINDING_POWER, with an explicit stack of
+        pending work in place of recursion: an operator waiting for its right
+        operand, an open parenthesis, a call collecting arguments, a lambda
+        waiting for its body or a prefix operator. Neither long chains nor
+        deep nesting use Python stack. Comparisons do not chain: one can only
+        follow an operand that is not itself a comparison or a && or ||.
+        """
+        stack = []
+        # The token type is always checked before it is consumed, so skip eat().
+        next_token = self.lexer.get_next_token
+        while True:
+            # Operand: prefix operators and a primary, or a frame for a nested expression.
+            token = self.current_token
+            token_type = token.type
+            if token_type in PREFIX_OPERATORS:
+                self.current_token = next_token()
+                stack.append((PREFIX, token_type))
+                continue
+            if token_type == TokenType.LPAREN:
+                self.current_token = next_token()
+                stack.append((GROUP, min_power))
+                min_power = LOGIC
+                continue
+            if token_type == TokenType.IDENTIFIER:
+                self.current_token = next_token()
+                if self.current_token.type != TokenType.LPAREN:
+                    node = Var(token.value)
+                else:
+                    self.current_token = next_token()
+                    if self.current_token.type != TokenType.RPAREN:
+                        stack.append((CALL, token.value, [], min_power))
+                        min_power = SUM
+                        continue
+                    self.eat(TokenType.RPAREN)
+                    node = Call(Var(token.value), [])
+            elif token_type == TokenType.INTEGER:
+                self.current_token = next_token()
+                node = Num(token.value)
+            elif token_type == TokenType.BOOLEAN:
+                self.current_token = next_token()
+                node = Bool(token.value)
+            elif token_type == TokenType.LAMBDA:
+                stack.append((LAMBDA_BODY, self.lambda_params(), min_power))
+                min_power = SUM
+                continue
+            else:
+                self.error()
+            power = ATOM
+            # Operators: extend node while they bind, else finish the innermost frame.
+            while True:
+                while stack and stack[-1][0] == PREFIX:
+                    node = UnaryOp(stack.pop()[1], node)
+                token_type = self.current_token.type
+                operator_power = BINDING_POWER.get(token_type)
+                if operator_power is not None and operator_power >= min_power \
+                        and (operator_power != COMPARE or power > COMPARE):
+                    self.current_token = next_token()
+                    stack.append((BINARY, node, token_type, min_power))
+                    # Left associative: the right operand only takes tighter operators.
+                    min_power = operator_power + 1
+                    break
+                if not stack:
+                    return node
+                frame = stack.pop()
+                kind = frame[0]
+                if kind == BINARY:
+                    node = BinOp(frame[1], frame[2], node)
+                    power = BINDING_POWER[frame[2]]
+                    min_power = frame[3]
+                    continue
+                power = ATOM
+                if kind == GROUP:
+                    self.eat(TokenType.RPAREN)
+                    min_power = frame[1]
+                elif kind == CALL:
+                    frame[2].append(node)
+                    if token_type == TokenType.COMMA:
+                        self.current_token = next_token()
+                        stack.append(frame)
+                        min_power = SUM
+                        break
+                    self.eat(TokenType.RPAREN)
+                    node = Call(Var(frame[1]), frame[2])
+                    min_power = frame[3]
+                else:
+                    node = Lambda(frame[1], node)
+                    min_power = frame[2]
+
     def factor(self):
-        token = self.current_token
-        if token.type == TokenType.PLUS:
-            self.eat(TokenType.PLUS)
-            node = UnaryOp(token, self.factor())
-            return node
-        elif token.type == TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            node = UnaryOp(token, self.factor())
-            return node
-        elif token.type == TokenType.INTEGER:
-            self.eat(TokenType.INTEGER)
-            return Num(token)
-        elif token.type == TokenType.BOOLEAN:
-            self.eat(TokenType.BOOLEAN)
-            return Bool(token)
-        elif token.type == TokenType.LPAREN:
-            self.eat(TokenType.LPAREN)
-            node = self.expr()
-            self.eat(TokenType.RPAREN)
-            return node
-        elif token.type == TokenType.IDENTIFIER:
-            var_token = token
-            self.eat(TokenType.IDENTIFIER)
-            if self.current_token.type == TokenType.LPAREN:
-                self.eat(TokenType.LPAREN)
-                args = []
-                if self.current_token.type != TokenType.RPAREN:
-                    args.append(self.expr())
-                    while self.current_token.type == TokenType.COMMA:
-                        self.eat(TokenType.COMMA)
-                        args.append(self.expr())
-                self.eat(TokenType.RPAREN)
-                return Call(var_token, args)
-            return Var(var_token)
-        elif token.type == TokenType.LAMBDA:
-            return self.lambda_expr()
-        else:
-            self.error()
+        return self.expression(ATOM)
 
     def term(self):
-        node = self.factor()
-        while self.current_token.type in (TokenType.MULTIPLY, TokenType.DIVIDE, TokenType.MODULO):
-            token = self.current_token
-            if token.type == TokenType.MULTIPLY:
-                self.eat(TokenType.MULTIPLY)
-            elif token.type == TokenType.DIVIDE:
-                self.eat(TokenType.DIVIDE)
-            elif token.type == TokenType.MODULO:
-                self.eat(TokenType.MODULO)
-            node = BinOp(left=node, op=token, right=self.factor())
-        return node
+        return self.expression(PRODUCT)
 
     def expr(self):
-        node = self.term()
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            token = self.current_token
-            if token.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-            elif token.type == TokenType.MINUS:
-                self.eat(TokenType.MINUS)
-            node = BinOp(left=node, op=token, right=self.term())
-        return node
+        return self.expression(SUM)
 
     def comparison(self):
-        node = self.expr()
-        if self.current_token.type in (TokenType.EQUAL, TokenType.NOT_EQUAL, TokenType.GREATER, TokenType.LESS, TokenType.GREATER_EQUAL, TokenType.LESS_EQUAL):
-            token = self.current_token
-            if token.type == TokenType.EQUAL:
-                self.eat(TokenType.EQUAL)
-            elif token.type == TokenType.NOT_EQUAL:
-                self.eat(TokenType.NOT_EQUAL)
-            elif token.type == TokenType.GREATER:
-                self.eat(TokenType.GREATER)
-            elif token.type == TokenType.LESS:
-                self.eat(TokenType.LESS)
-            elif token.type == TokenType.GREATER_EQUAL:
-                self.eat(TokenType.GREATER_EQUAL)
-            elif token.type == TokenType.LESS_EQUAL:
-                self.eat(TokenType.LESS_EQUAL)
-            node = BinOp(left=node, op=token, right=self.expr())
-        return node
+        return self.expression(COMPARE)
 
     def boolean_expr(self):
-        node = self.comparison()
-        while self.current_token.type in (TokenType.AND, TokenType.OR):
-            token = self.current_token
-            if token.type == TokenType.AND:
-                self.eat(TokenType.AND)
-            elif token.type == TokenType.OR:
-                self.eat(TokenType.OR)
-            node = BinOp(left=node, op=token, right=self.comparison())
-        return node
+        return self.expression(LOGIC)
 
     def block(self):
         self.eat(TokenType.LBRACE)
         statements = []
         while self.current_token.type != TokenType.RBRACE:
             statements.append(self.statement())
+            if self.current_token.type == TokenType.SEMICOLON:
+                self.eat(TokenType.SEMICOLON)
         self.eat(TokenType.RBRACE)
         if len(statements) == 1:
             return statements[0]
-        return statements
+        return Sequence(statements)
 
     def statement(self):
         if self.current_token.type == TokenType.DEFUN:
             self.eat(TokenType.DEFUN)
-            func_name = self.current_token.value
-            self.eat(TokenType.IDENTIFIER)
+            func_name = self.identifier()
             self.eat(TokenType.LPAREN)
             params = []
             if self.current_token.type == TokenType.IDENTIFIER:
-                params.append(self.current_token.value)
-                self.eat(TokenType.IDENTIFIER)
+                params.append(self.identifier())
                 while self.current_token.type == TokenType.COMMA:
                     self.eat(TokenType.COMMA)
-                    params.append(self.current_token.value)
-                    self.eat(TokenType.IDENTIFIER)
+                    params.append(self.identifier())
             self.eat(TokenType.RPAREN)
             body = self.block()
             return Function(func_name, params, body)
@@ -207,19 +389,30 @@ class Parser:
         else:
             return self.boolean_expr()
 
-    def lambda_expr(self):
+    def lambda_params(self):
         self.eat(TokenType.LAMBDA)
         params = []
         if self.current_token.type == TokenType.IDENTIFIER:
-            params.append(self.current_token.value)
-            self.eat(TokenType.IDENTIFIER)
+            params.append(self.identifier())
             while self.current_token.type == TokenType.COMMA:
                 self.eat(TokenType.COMMA)
-                params.append(self.current_token.value)
-                self.eat(TokenType.IDENTIFIER)
+                params.append(self.identifier())
         self.eat(TokenType.ARROW)
-        body = self.expr()
-        return Lambda(params, body)
+        return params
+
+    def lambda_expr(self):
+        return Lambda(self.lambda_params(), self.expr())
+
+    def statements(self):
+        """Yield top-level statements one at a time, parsing each only when asked for it."""
+        while self.current_token.type != TokenType.EOF:
+            node = self.statement()
+            if self.current_token.type == TokenType.SEMICOLON:
+                self.eat(TokenType.SEMICOLON)
+            yield node
 
     def parse(self):
-        return self.statement()
+        statements = list(self.statements())
+        if len(statements) == 1:
+            return statements[0]
+        return Program(statements)
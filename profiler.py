@@ -0,0 +1,212 @@
+import json
+import time
+from interpreter import Interpreter
+from sequences import Builtin
+
+ROOT = '<program>'
+
+class Stat:
+    __slots__ = ('calls', 'inclusive', 'exclusive', 'active', 'max_depth', 'allocations')
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0
+        self.exclusive = 0
+        self.active = 0
+        self.max_depth = 0
+        self.allocations = 0
+
+    def enter(self):
+        self.calls += 1
+        self.active += 1
+        if self.active > self.max_depth:
+            self.max_depth = self.active
+
+    def leave(self, elapsed, exclusive):
+        self.active -= 1
+        # Only the outermost activation adds inclusive time, so recursion
+        # does not count the same nanoseconds twice.
+        if not self.active:
+            self.inclusive += elapsed
+        self.exclusive += exclusive
+
+class Profiler:
+    """Per node type and per function counters for the tree-walking Interpreter.
+
+    attach() shadows the interpreter's visit, call, make_frame, visit_tail
+    and eval with instrumented versions as instance attributes; detach()
+    deletes them again. Each version delegates to whatever was installed
+    before, so a Budget attached first keeps its limits. An interpreter that
+    was never attached runs the plain class methods, so there is no cost at
+    all when profiling is off.
+
+    A function activation, including each tail call the trampoline runs,
+    starts when make_frame returns its frame and lasts while visit_tail
+    runs the body in it. Builtins are counted when called directly; one in
+    tail position is counted as part of its caller.
+
+    Times are in nanoseconds. Exclusive time of a node type leaves out its
+    child nodes; exclusive time of a function leaves out the functions it
+    calls. Allocations count the Environment or Frame made for each call;
+    a frame the interpreter recycles from its pool is not one.
+    """
+
+    def __init__(self, clock=time.perf_counter_ns, trace_limit=100000):
+        self.clock = clock
+        self.trace_limit = trace_limit
+        self.nodes = {}
+        self.functions = {}
+        self.stacks = {}
+        self.events = []
+        self.dropped_events = 0
+        self.node_stack = []
+        self.function_stack = []
+        self.activation = None
+        self.origin = None
+
+    def attach(self, interpreter):
+        if not isinstance(interpreter, Interpreter) or interpreter.backend != 'tree':
+            raise Exception('Profiling needs the tree backend')
+        interpreter.visit = self.wrap_visit(interpreter.visit)
+        interpreter.call = self.wrap_call(interpreter.call)
+        interpreter.make_frame = self.wrap_make_frame(interpreter.make_frame, interpreter.frame_pool)
+        interpreter.visit_tail = self.wrap_visit_tail(interpreter.visit_tail)
+        interpreter.eval = self.wrap_eval(interpreter.eval)
+        return interpreter
+
+    def detach(self, interpreter):
+        for name in ('visit', 'call', 'make_frame', 'visit_tail', 'eval'):
+            interpreter.__dict__.pop(name, None)
+
+    def stat(self, table, name):
+        stat = table.get(name)
+        if stat is None:
+            stat = table[name] = Stat()
+        return stat
+
+    def wrap_visit(self, visit):
+        clock = self.clock
+        stack = self.node_stack
+        nodes = self.nodes
+
+        def profiled_visit(node, env):
+            name = type(node).__name__
+            stat = nodes.get(name) or self.stat(nodes, name)
+            stat.enter()
+            entry = [0]
+            stack.append(entry)
+            start = clock()
+            try:
+                return visit(node, env)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                if stack:
+                    stack[-1][0] += elapsed
+                stat.leave(elapsed, elapsed - entry[0])
+        return profiled_visit
+
+    def enter_function(self, name):
+        stat = self.stat(self.functions, name)
+        stat.enter()
+        self.function_stack.append((name, stat, self.clock(), [0]))
+        return stat
+
+    def leave_function(self):
+        name, stat, start, children = self.function_stack.pop()
+        end = self.clock()
+        elapsed = end - start
+        if self.function_stack:
+            self.function_stack[-1][3][0] += elapsed
+        exclusive = elapsed - children[0]
+        stat.leave(elapsed, exclusive)
+        path = tuple(entry[0] for entry in self.function_stack) + (name,)
+        self.stacks[path] = self.stacks.get(path, 0) + exclusive
+        if len(self.events) < self.trace_limit:
+            self.events.append((name, start, elapsed, len(self.function_stack)))
+        else:
+            self.dropped_events += 1
+
+    def wrap_call(self, call):
+        def profiled_call(func, args):
+            if type(func) is not Builtin:
+                return call(func, args)
+            self.enter_function(func.name)
+            try:
+                return call(func, args)
+            finally:
+                self.leave_function()
+        return profiled_call
+
+    def wrap_make_frame(self, make_frame, pool):
+        def profiled_make_frame(func, args):
+            pooled = len(pool)
+            frame = make_frame(func, args)
+            # The trampoline runs func.body in this frame next. The frame is
+            # new unless make_frame took it from the pool.
+            self.activation = (frame, func, len(pool) == pooled)
+            return frame
+        return profiled_make_frame
+
+    def wrap_visit_tail(self, visit_tail):
+        def profiled_visit_tail(node, env):
+            activation = self.activation
+            # Nested visit_tail calls for the Return, If and Sequence in a
+            # body belong to the activation that is already recorded.
+            if activation is None or activation[0] is not env:
+                return visit_tail(node, env)
+            self.activation = None
+            stat = self.enter_function(activation[1].name or '<lambda>')
+            if activation[2]:
+                stat.allocations += 1
+            try:
+                return visit_tail(node, env)
+            finally:
+                self.leave_function()
+        return profiled_visit_tail
+
+    def wrap_eval(self, evaluate):
+        def profiled_eval(node, env=None):
+            if self.origin is None:
+                self.origin = self.clock()
+            self.enter_function(ROOT)
+            try:
+                return evaluate(node, env)
+            finally:
+                self.leave_function()
+        return profiled_eval
+
+    def report(self, limit=20):
+        lines = ['node type            calls    incl ms    excl ms  max depth']
+        for name, stat in sorted(self.nodes.items(), key=lambda item: -item[1].exclusive)[:limit]:
+            lines.append(f'{name:<16} {stat.calls:>9} {stat.inclusive / 1e6:>10.3f} {stat.exclusive / 1e6:>10.3f}'
+                         f' {stat.max_depth:>10}')
+        lines.append('')
+        lines.append('function             calls    incl ms    excl ms  max depth  allocations')
+        for name, stat in sorted(self.functions.items(), key=lambda item: -item[1].exclusive)[:limit]:
+            lines.append(f'{name:<16} {stat.calls:>9} {stat.inclusive / 1e6:>10.3f} {stat.exclusive / 1e6:>10.3f}'
+                         f' {stat.max_depth:>10} {stat.allocations:>12}')
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        """Folded stacks, one 'outer;inner microseconds' line per call path, for flamegraph.pl and speedscope."""
+        return '\n'.join(f'{";".join(path)} {exclusive // 1000}'
+                         for path, exclusive in sorted(self.stacks.items()))
+
+    def chrome_trace(self):
+        """Chrome trace event JSON for chrome://tracing and Perfetto, one complete event per call."""
+        origin = self.origin or 0
+        events = [{'name': name, 'cat': 'function', 'ph': 'X', 'pid': 0, 'tid': 0,
+                   'ts': (start - origin) / 1000, 'dur': elapsed / 1000, 'args': {'depth': depth}}
+                  for name, start, elapsed, depth in self.events]
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms',
+                           'otherData': {'dropped_events': self.dropped_events}})
+
+    def export(self, format='text'):
+        if format == 'text':
+            return self.report()
+        if format == 'collapsed':
+            return self.collapsed()
+        if format == 'chrome':
+            return self.chrome_trace()
+        raise Exception(f'Unknown profile format: {format}')
@@ -0,0 +1,136 @@
+from parser import BinOp, Call, Function, If, Lambda, Return, Sequence, UnaryOp
+
+def captures_frame(body):
+    """True when running body may let its Frame outlive the call.
+
+    Only a closure keeps a frame alive: every defun and lambda evaluated in
+    the body holds the frame as its env, whether or not it reads from it.
+    The other values a body produces are ints, bools, sequences and
+    functions made elsewhere, so a body without Function or Lambda nodes
+    leaves its frame unreachable once it returns.
+    """
+    stack = [body]
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+        if node_type is Function or node_type is Lambda:
+            return True
+        if node_type is BinOp:
+            stack += (node.left, node.right)
+        elif node_type is UnaryOp:
+            stack.append(node.expr)
+        elif node_type is Call:
+            stack.append(node.func)
+            stack += node.args
+        elif node_type is If:
+            stack += (node.condition, node.then_branch)
+            if node.else_branch is not None:
+                stack.append(node.else_branch)
+        elif node_type is Return:
+            stack.append(node.value)
+        elif node_type is Sequence:
+            stack += node.statements
+    return False
+
+class Resolver:
+    """Annotate every Var with its lexical address.
+
+    Inside a function body each parameter and each local defun gets a slot in
+    the function's Frame; a Var bound there is given (depth, slot), where depth
+    counts the enclosing functions to walk out through. Names not bound by any
+    enclosing function keep depth None and are looked up by name in the
+    dynamic global Environment.
+    """
+
+    def __init__(self):
+        self.scopes = []
+
+    def resolve(self, node):
+        self.visit(node)
+        return node
+
+    def visit(self, node):
+        method_name = f'resolve_{type(node).__name__}'
+        resolver = getattr(self, method_name, self.generic_resolve)
+        resolver(node)
+
+    def generic_resolve(self, node):
+        raise Exception(f'No resolve_{type(node).__name__} method')
+
+    def resolve_Sequence(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def resolve_Program(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def resolve_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def resolve_UnaryOp(self, node):
+        self.visit(node.expr)
+
+    def resolve_Num(self, node):
+        pass
+
+    def resolve_Bool(self, node):
+        pass
+
+    def resolve_Var(self, node):
+        node.depth = node.slot = None
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if node.value in scope:
+                node.depth = depth
+                node.slot = scope[node.value]
+                return
+
+    def resolve_Function(self, node):
+        node.slot = self.scopes[-1][node.name] if self.scopes else None
+        self.resolve_function(node)
+
+    def resolve_Lambda(self, node):
+        self.resolve_function(node)
+
+    def resolve_Call(self, node):
+        self.visit(node.func)
+        for arg in node.args:
+            self.visit(arg)
+
+    def resolve_If(self, node):
+        self.visit(node.condition)
+        self.visit(node.then_branch)
+        if node.else_branch:
+            self.visit(node.else_branch)
+
+    def resolve_Return(self, node):
+        self.visit(node.value)
+
+    def resolve_function(self, node):
+        scope = {param: slot for slot, param in enumerate(node.params)}
+        size = len(node.params)
+        # Local defuns are hoisted so that calls between them, and calls made
+        # before the defun runs, still resolve to the right slot.
+        for local in self.local_functions(node.body):
+            if local.name not in scope:
+                scope[local.name] = size
+                size += 1
+        node.frame_size = size
+        node.captures = captures_frame(node.body)
+        self.scopes.append(scope)
+        try:
+            self.visit(node.body)
+        finally:
+            self.scopes.pop()
+
+    def local_functions(self, node):
+        if isinstance(node, Function):
+            yield node
+        elif isinstance(node, If):
+            yield from self.local_functions(node.then_branch)
+            if node.else_branch:
+                yield from self.local_functions(node.else_branch)
+        elif isinstance(node, Sequence):
+            for statement in node.statements:
+                yield from self.local_functions(statement)
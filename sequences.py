@@ -0,0 +1,155 @@
+import functools
+import itertools
+from environment import Frame, UNDEFINED
+from parser import BinOp, Bool, Function, Num, Return, Sequence, UnaryOp, Var
+
+class Seq:
+    """A lazy sequence value.
+
+    source returns a fresh iterator each time, so a Seq can be walked any
+    number of times and a pipeline of map and filter runs element by element
+    with no list in between. list() materializes one when it is worth
+    keeping the elements.
+    """
+    __slots__ = ('source',)
+    # Elements shown by repr(); a range can be far too long to print whole.
+    REPR_LIMIT = 20
+
+    def __init__(self, source):
+        self.source = source
+
+    def __iter__(self):
+        return self.source()
+
+    def __repr__(self):
+        values = [str(value) for value in itertools.islice(self, self.REPR_LIMIT + 1)]
+        if len(values) > self.REPR_LIMIT:
+            values[-1] = '...'
+        return '[' + ', '.join(values) + ']'
+
+class Builtin:
+    """A primitive function implemented in Python.
+
+    function is called with the runtime that made the call followed by the
+    arguments. The runtime has call(func, args) and compile(node), which is
+    what an Interpreter and a ClosureCompiler both provide.
+    """
+    __slots__ = ('name', 'arity', 'function')
+
+    def __init__(self, name, arity, function):
+        self.name = name
+        self.arity = arity
+        self.function = function
+
+    def apply(self, runtime, args):
+        if len(args) != self.arity:
+            raise Exception('Argument count mismatch')
+        return self.function(runtime, *args)
+
+    def __repr__(self):
+        return f'<builtin {self.name}>'
+
+def simple_body(func):
+    """The expression func computes if it only combines its parameters and constants, else None."""
+    if func.frame_size is None or func.frame_size != len(func.params):
+        return None
+    body = func.body
+    if isinstance(body, Sequence) and len(body.statements) == 1:
+        body = body.statements[0]
+    if isinstance(body, Return):
+        body = body.value
+    stack = [body]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BinOp):
+            stack += (node.left, node.right)
+        elif isinstance(node, UnaryOp):
+            stack.append(node.expr)
+        elif isinstance(node, Var):
+            if node.depth != 0:
+                return None
+        elif not isinstance(node, (Num, Bool)):
+            return None
+    return body
+
+def callback(runtime, func, arity):
+    """A Python function of arity arguments that applies the language function func.
+
+    A simple body (see simple_body) is compiled to a closure and run in one
+    Frame that is refilled for every element, which is safe because such a
+    body makes no calls and captures nothing. Everything else, and every
+    callback while a budget or profiler is attached to the interpreter, goes
+    through runtime.call.
+    """
+    if isinstance(func, Builtin):
+        if func.arity != arity:
+            raise Exception('Argument count mismatch')
+        return lambda *args: func.function(runtime, *args)
+    if not isinstance(func, Function):
+        if callable(func):
+            # A Python function, as the python backend passes.
+            return func
+        raise Exception(f'{func} is not a function')
+    if len(func.params) != arity:
+        raise Exception('Argument count mismatch')
+    expr = simple_body(func)
+    if expr is not None and runtime is not None and 'call' not in vars(runtime):
+        code = runtime.compile(expr)
+        frame = Frame(func.env, [UNDEFINED] * arity)
+        slots = frame.slots
+        if arity == 1:
+            def apply_one(value):
+                slots[0] = value
+                return code(frame)
+            return apply_one
+
+        def apply_two(first, second):
+            slots[0] = first
+            slots[1] = second
+            return code(frame)
+        return apply_two
+    call = runtime.call
+    return lambda *args: call(func, list(args))
+
+def sequence(value):
+    if not isinstance(value, Seq):
+        raise Exception(f'{value} is not a sequence')
+    return value
+
+def builtin_range(runtime, start, stop):
+    return Seq(lambda: iter(range(start, stop)))
+
+def builtin_map(runtime, func, seq):
+    apply = callback(runtime, func, 1)
+    seq = sequence(seq)
+    return Seq(lambda: map(apply, seq))
+
+def builtin_filter(runtime, func, seq):
+    apply = callback(runtime, func, 1)
+    seq = sequence(seq)
+    return Seq(lambda: filter(apply, seq))
+
+def builtin_reduce(runtime, func, seq, initial):
+    return functools.reduce(callback(runtime, func, 2), sequence(seq), initial)
+
+def builtin_list(runtime, seq):
+    values = list(sequence(seq))
+    return Seq(values.__iter__)
+
+def builtin_length(runtime, seq):
+    return sum(1 for _ in sequence(seq))
+
+BUILTINS = {
+    'range': Builtin('range', 2, builtin_range),
+    'map': Builtin('map', 2, builtin_map),
+    'filter': Builtin('filter', 2, builtin_filter),
+    'reduce': Builtin('reduce', 3, builtin_reduce),
+    'list': Builtin('list', 1, builtin_list),
+    'length': Builtin('length', 1, builtin_length),
+}
+
+def install(env):
+    """Bind every builtin in env, an Environment, and return it."""
+    for name, builtin in BUILTINS.items():
+        env.set(name, builtin)
+    return env
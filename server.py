@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lexer import Lexer
+from parser import Parser, Return
+from resolver import Resolver
+from interpreter import Interpreter
+from memo import LRUCache
+from batch_runner import json_value
+import budget
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class ASTCache:
+    """Parsed and resolved ASTs shared by every session, keyed by source text.
+
+    Resolving only annotates the tree, so one tree can be run by several
+    sessions at once. The tree interpreter would also write its inline
+    caches into the Call nodes; sessions turn that off (see Session.callee).
+
+    compiler is the ClosureCompiler the sessions share. Its closures are
+    keyed by node, so all of them are dropped whenever a tree is evicted;
+    trees still in use just compile again.
+    """
+
+    def __init__(self, maxsize=1024, compiler=None):
+        self.entries = LRUCache(maxsize)
+        self.compiler = compiler
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source):
+        with self.lock:
+            ast = self.entries.get(source)
+            if ast is not None:
+                self.hits += 1
+                return ast
+            self.misses += 1
+        ast = Resolver().resolve(Parser(Lexer(source)).parse())
+        with self.lock:
+            evictions = self.entries.evictions
+            self.entries.put(source, ast)
+            if self.compiler is not None and self.entries.evictions != evictions:
+                self.compiler.codes.clear()
+        return ast
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+class Session:
+    """One client connection: its own interpreter and globals, like a repl()."""
+
+    def __init__(self, server):
+        from main import make_interpreter
+        self.server = server
+        self.interpreter = make_interpreter(server.backend)
+        if server.compiler is not None:
+            self.interpreter.compiler = server.compiler
+        if isinstance(self.interpreter, Interpreter):
+            self.interpreter.callee = self.callee
+        self.budget = None
+        if server.limits:
+            self.budget = budget.Budget(**server.limits)
+            self.budget.attach(self.interpreter)
+
+    def callee(self, node, env):
+        """Interpreter.callee without the inline cache on the shared Call node.
+
+        Sessions would keep overwriting each other's entries, and every entry
+        would keep the globals of a finished session alive.
+        """
+        return self.interpreter.visit(node.func, env)
+
+    def evaluate(self, source):
+        if self.budget is not None:
+            # Limits apply to each request, so one runaway program cannot hold a worker thread.
+            self.budget.reset()
+        result = self.interpreter.eval(self.server.asts.get(source))
+        if isinstance(result, Return):
+            result = result.value
+        return result
+
+    def reset(self):
+        self.interpreter.global_env = self.interpreter.new_globals()
+
+class Server:
+    """Newline-delimited JSON evaluation service.
+
+    Each request is an object with an "op" of "eval" (with "source"),
+    "reset" or "stats", and an optional "id" that is echoed back. Replies
+    carry "ok" plus either "result" and "ms" or "error". Requests on one
+    connection are answered in order. Evaluation runs on a thread pool so the
+    event loop keeps accepting connections and moving bytes while a program
+    runs; the GIL still lets only one evaluation execute Python code at a
+    time, so use several server processes to spread CPU over cores.
+    """
+
+    def __init__(self, backend='tree', workers=4, cache_size=1024, window=10000, limits=None):
+        if limits and backend != 'tree':
+            # Checked here, since a Session is only made once a client has connected.
+            raise Exception('Budgets need the tree backend')
+        self.backend = backend
+        self.limits = limits
+        self.compiler = None
+        if backend != 'python':
+            # Compiled closures depend only on the AST, so sessions can share
+            # them; tree sessions use them for the callbacks of map and filter.
+            from closure_compiler import ClosureCompiler
+            self.compiler = ClosureCompiler()
+        self.asts = ASTCache(cache_size, self.compiler)
+        self.executor = ThreadPoolExecutor(workers)
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.sessions = 0
+
+    def metrics(self):
+        latencies = list(self.latencies)
+        p50 = percentile(latencies, 0.50)
+        p99 = percentile(latencies, 0.99)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'sessions': self.sessions,
+            'p50_ms': None if p50 is None else round(p50 * 1e3, 3),
+            'p99_ms': None if p99 is None else round(p99 * 1e3, 3),
+            'ast_cache': self.asts.stats(),
+        }
+
+    async def handle(self, session, request):
+        op = request.get('op', 'eval')
+        if op == 'eval':
+            source = request.get('source')
+            if not isinstance(source, str):
+                raise Exception('eval needs a "source" string')
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self.executor, session.evaluate, source)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+            return {'result': json_value(result), 'ms': round((time.perf_counter() - start) * 1e3, 3)}
+        if op == 'reset':
+            session.reset()
+            return {}
+        if op == 'stats':
+            return {'result': self.metrics()}
+        raise Exception(f'Unknown op: {op}')
+
+    async def serve_client(self, reader, writer):
+        session = Session(self)
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                self.requests += 1
+                request = {}
+                try:
+                    request = json.loads(line)
+                    reply = {'ok': True}
+                    reply.update(await self.handle(session, request))
+                except RecursionError:
+                    self.errors += 1
+                    reply = {'ok': False, 'error': 'maximum recursion depth exceeded'}
+                except Exception as e:
+                    self.errors += 1
+                    reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+                if isinstance(request, dict) and 'id' in request:
+                    reply['id'] = request['id']
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self.serve_client, path)
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.metrics()), file=sys.stderr, flush=True)
+
+async def serve(host, port, path, backend, workers, report_interval, limits=None):
+    server = Server(backend, workers, limits=limits)
+    listener = await server.start(host, port, path)
+    where = path or f'{host}:{port}'
+    print(f'serving {backend} backend on {where}', file=sys.stderr, flush=True)
+    if report_interval:
+        asyncio.ensure_future(server.report(report_interval))
+    async with listener:
+        await listener.serve_forever()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Serve the interpreter over newline-delimited JSON.')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    arg_parser.add_argument('--backend', choices=('tree', 'closure', 'python'), default='tree')
+    arg_parser.add_argument('--workers', type=int, default=4, help='evaluation threads (default: 4)')
+    arg_parser.add_argument('--report-interval', type=float, default=0,
+                            help='print metrics to stderr every this many seconds')
+    budget.add_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.backend, args.workers, args.report_interval,
+                          budget.limits(args)))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
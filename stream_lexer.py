@@ -0,0 +1,130 @@
+import mmap
+import re
+from lexer import Token, TokenType
+
+KEYWORDS = {
+    'defun': TokenType.DEFUN,
+    'lambda': TokenType.LAMBDA,
+    'return': TokenType.RETURN,
+    'if': TokenType.IF,
+    'else': TokenType.ELSE,
+}
+
+PUNCTUATION = {
+    '->': TokenType.ARROW,
+    '&&': TokenType.AND,
+    '||': TokenType.OR,
+    '==': TokenType.EQUAL,
+    '!=': TokenType.NOT_EQUAL,
+    '>=': TokenType.GREATER_EQUAL,
+    '<=': TokenType.LESS_EQUAL,
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.MULTIPLY,
+    '/': TokenType.DIVIDE,
+    '%': TokenType.MODULO,
+    '!': TokenType.NOT,
+    '>': TokenType.GREATER,
+    '<': TokenType.LESS,
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN,
+    '{': TokenType.LBRACE,
+    '}': TokenType.RBRACE,
+    ',': TokenType.COMMA,
+    ';': TokenType.SEMICOLON,
+}
+
+# Each match swallows the whitespace and comments in front of its token, so
+# the regex engine, rather than the Python loop, steps over the blanks. Two
+# character operators are listed before their one character prefixes.
+TOKEN_PATTERN = r"""
+    (?:\s+|\#[^\n]*(?:\n|\Z))*
+    (?:
+        (?P<INTEGER>\d+)
+      | (?P<NAME>[^\W\d_]\w*)
+      | (?P<PUNCTUATION>->|&&|\|\||==|!=|>=|<=|[-+*/%!<>(){},;])
+      | (?P<END>\Z)
+      | (?P<MISMATCH>.)
+    )
+"""
+
+TEXT_PATTERN = re.compile(TOKEN_PATTERN, re.VERBOSE | re.DOTALL)
+BYTES_PATTERN = re.compile(TOKEN_PATTERN.encode(), re.VERBOSE | re.DOTALL)
+
+INTEGER = TEXT_PATTERN.groupindex['INTEGER']
+NAME = TEXT_PATTERN.groupindex['NAME']
+END = TEXT_PATTERN.groupindex['END']
+MISMATCH = TEXT_PATTERN.groupindex['MISMATCH']
+
+# Punctuation tokens carry no value, so one shared instance per operator is
+# handed out for every occurrence instead of allocating a Token each time.
+TEXT_TOKENS = {text: Token(token_type) for text, token_type in PUNCTUATION.items()}
+BYTES_TOKENS = {text.encode(): token for text, token in TEXT_TOKENS.items()}
+
+CHUNK_SIZE = 1 << 16
+
+def scan(text):
+    """Yield the tokens of one complete str or bytes-like buffer, without EOF."""
+    if isinstance(text, str):
+        pattern, punctuation, decode = TEXT_PATTERN, TEXT_TOKENS, False
+    else:
+        pattern, punctuation, decode = BYTES_PATTERN, BYTES_TOKENS, True
+    keywords = KEYWORDS
+    for match in pattern.finditer(text):
+        kind = match.lastindex
+        if kind == NAME:
+            value = match.group(NAME)
+            if decode:
+                value = value.decode()
+            if value == 'true' or value == 'false':
+                yield Token(TokenType.BOOLEAN, value == 'true')
+            elif value in keywords:
+                yield Token(keywords[value], value)
+            else:
+                yield Token(TokenType.IDENTIFIER, value)
+        elif kind == INTEGER:
+            yield Token(TokenType.INTEGER, int(match.group(INTEGER)))
+        elif kind == END:
+            return
+        elif kind == MISMATCH:
+            char = match.group(MISMATCH)
+            if decode:
+                char = char.decode(errors='replace')
+            raise Exception(f'Invalid character: {char}')
+        else:
+            yield punctuation[match.group(kind)]
+
+def tokenize(source, chunk_size=CHUNK_SIZE):
+    """Lazily yield the tokens of a str, bytes, mmap or file object, ending with EOF."""
+    if isinstance(source, (str, bytes, bytearray, memoryview, mmap.mmap)):
+        yield from scan(source)
+    else:
+        # No token or comment spans a newline, so everything up to the last
+        # newline read so far can be scanned while the rest waits for the
+        # next chunk.
+        buffer = source.read(chunk_size)
+        newline = '\n' if isinstance(buffer, str) else b'\n'
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            cut = buffer.rfind(newline) + 1
+            if cut:
+                yield from scan(buffer[:cut])
+                buffer = buffer[cut:]
+        yield from scan(buffer)
+    yield Token(TokenType.EOF)
+
+class StreamLexer:
+    """Drop-in replacement for Lexer built on a single compiled master pattern."""
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE):
+        self.tokens = tokenize(source, chunk_size)
+        self.eof = Token(TokenType.EOF)
+
+    def __iter__(self):
+        return self.tokens
+
+    def get_next_token(self):
+        return next(self.tokens, self.eof)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from lexer import Lexer
+from parser import Parser, BinOp, Function, If, Return
+from interpreter import Interpreter
+import ast_cache
+
+class TestAstCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, 'program.lambda')
+
+    def write(self, source):
+        with open(self.filename, 'w') as file:
+            file.write(source)
+
+    def test_round_trip(self):
+        source = "defun f(a, b) { if (!(a > b) && true) { return lambda x -> x * -a; } else { return g(b, 1); } }"
+        ast = Parser(Lexer(source)).parse()
+        decoded = ast_cache.decode(ast_cache.encode(ast))
+        self.assertIsInstance(decoded, Function)
+        self.assertEqual(decoded.params, ['a', 'b'])
+        self.assertIsInstance(decoded.body, If)
+        self.assertIsInstance(decoded.body.else_branch, Return)
+        self.assertEqual(ast_cache.encode(decoded), ast_cache.encode(ast))
+
+    def test_deep_chain(self):
+        ast = Parser(Lexer(' + '.join(['1'] * 20000))).parse()
+        decoded = ast_cache.decode(ast_cache.encode(ast))
+        self.assertIsInstance(decoded, BinOp)
+        self.assertEqual(ast_cache.encode(decoded), ast_cache.encode(ast))
+
+    def test_entry_is_reused_and_invalidated(self):
+        self.write("(3 + 4) * (2 - 1)")
+        first = ast_cache.load_or_parse(self.filename)
+        path = ast_cache.cache_path(self.filename)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Interpreter().eval(first), 7)
+        with open(path, 'rb') as file:
+            cached = file.read()
+        self.assertEqual(Interpreter().eval(ast_cache.load_or_parse(self.filename)), 7)
+        self.write("6 * 7")
+        self.assertEqual(Interpreter().eval(ast_cache.load_or_parse(self.filename)), 42)
+        with open(path, 'rb') as file:
+            self.assertNotEqual(file.read(), cached)
+
+    def test_corrupt_entry_is_a_miss(self):
+        self.write("1 + 1")
+        path = ast_cache.cache_path(self.filename)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write(b'garbage')
+        self.assertEqual(Interpreter().eval(ast_cache.load_or_parse(self.filename)), 2)
+
+    def test_shared_cache_dir(self):
+        self.write("2 + 2")
+        cache_dir = os.path.join(self.directory.name, 'cache')
+        self.assertEqual(Interpreter().eval(ast_cache.load_or_parse(self.filename, cache_dir)), 4)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
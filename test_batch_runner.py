@@ -0,0 +1,79 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from batch_runner import Worker, collect_paths, run_batch
+from interpreter import Interpreter
+import image
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = self.tempdir.name
+        os.mkdir(os.path.join(self.root, 'sub'))
+        self.write('sub/square.lambda', 'defun g(x) { return x * x; } g(7)')
+        self.write('sub/uses_g.lambda', 'g(2)')
+        self.write('sub/loop.lambda', 'defun loop(n) { return loop(n + 1); } loop(0)')
+        self.write('div.lambda', '1 / 0')
+        self.write('manifest.txt', '# nightly\n\nsub/square.lambda\ndiv.lambda\nsub/square.lambda\n')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), 'w') as file:
+            file.write(text)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_collect_paths(self):
+        self.assertEqual(collect_paths([self.path('sub')]),
+                         [self.path('sub/loop.lambda'), self.path('sub/square.lambda'), self.path('sub/uses_g.lambda')])
+        self.assertEqual(collect_paths([self.path('*.lambda')]), [self.path('div.lambda')])
+        self.assertEqual(collect_paths([self.path('manifest.txt')]),
+                         [self.path('sub/square.lambda'), self.path('div.lambda'), self.path('sub/square.lambda')])
+
+    def test_run_batch(self):
+        paths = collect_paths([self.path('sub'), self.path('manifest.txt')])
+        report = io.StringIO()
+        records = list(run_batch(paths, jobs=2, report=report, timeout=0.5, cache_dir=self.path('cache')))
+        self.assertEqual(sorted(record['file'] for record in records), sorted(paths))
+        by_file = {record['file']: record for record in records}
+        self.assertEqual(by_file[self.path('sub/square.lambda')]['result'], 49)
+        self.assertEqual(by_file[self.path('sub/loop.lambda')]['status'], 'timeout')
+        self.assertIn('ZeroDivisionError', by_file[self.path('div.lambda')]['error'])
+        # Each file starts from empty globals even though the worker is reused.
+        self.assertIn('Undefined variable: g', by_file[self.path('sub/uses_g.lambda')]['error'])
+        lines = report.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], records)
+
+    def test_worker_budget(self):
+        worker = Worker(limits={'steps': 1000}, use_cache=False)
+        record = worker.run(self.path('sub/loop.lambda'))
+        self.assertEqual(record['status'], 'error')
+        self.assertIn('BudgetExceeded: steps limit of 1000', record['error'])
+        # Every file gets the whole budget again.
+        self.assertEqual(worker.run(self.path('sub/square.lambda'))['result'], 49)
+
+    def test_worker_typecheck(self):
+        self.write('mixed.lambda', '1 + true')
+        worker = Worker('closure', check_types=True, use_cache=False)
+        self.assertEqual(worker.run(self.path('sub/square.lambda'))['result'], 49)
+        record = worker.run(self.path('mixed.lambda'))
+        self.assertEqual(record['status'], 'error')
+        self.assertIn('TypeCheckError', record['error'])
+
+    def test_worker_image(self):
+        interpreter = Interpreter()
+        interpreter.eval(Worker(use_cache=False).parse(self.path('sub/square.lambda')))
+        image.save(interpreter.global_env, self.path('g.image'))
+        worker = Worker(use_cache=False, image_path=self.path('g.image'), check_types=True, backend='closure')
+        self.assertEqual(worker.run(self.path('sub/uses_g.lambda'))['result'], 4)
+        # The square file redefines g in its own copy of the image's globals.
+        self.assertEqual(worker.run(self.path('sub/square.lambda'))['result'], 49)
+        self.assertEqual(worker.run(self.path('sub/uses_g.lambda'))['result'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import os
+import tempfile
+import unittest
+from bench_suite import BENCHMARKS, compare, load, run, save
+
+class TestBenchSuite(unittest.TestCase):
+    def test_compare(self):
+        baseline = {'benchmarks': {'a': 1.0, 'b': 1.0, 'gone': 1.0}}
+        results = {'benchmarks': {'a': 1.1, 'b': 1.3, 'new': 5.0}}
+        self.assertEqual(compare(results, baseline, 0.15), [('b', 1.0, 1.3)])
+        self.assertEqual(compare(results, baseline, 0.5), [])
+
+    def test_workloads_run_and_round_trip(self):
+        for setup in BENCHMARKS.values():
+            setup()()
+        results = run(['python.product'], repeat=1, min_time=0.001)
+        self.assertEqual(list(results['benchmarks']), ['python.product_reduce'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            save(path, results)
+            self.assertEqual(load(path), results)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import itertools
+import unittest
+from lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from budget import Budget, BudgetExceeded
+
+LOOP = "defun loop(n) { return loop(n + 1); } "
+DEEP = "defun deep(n) { return 1 + deep(n + 1); } "
+
+def run(interpreter, source):
+    return interpreter.eval(Resolver().resolve(Parser(Lexer(source)).parse()))
+
+class TestBudget(unittest.TestCase):
+    def budgeted(self, **limits):
+        interpreter = Interpreter()
+        self.budget = Budget(**limits)
+        self.budget.attach(interpreter)
+        return interpreter
+
+    def test_within_budget(self):
+        interpreter = self.budgeted(steps=6, depth=6, environments=6)
+        source = "defun fact(n) { if (n == 0) { return 1; } else { return n * fact(n - 1); } } fact(5)"
+        self.assertEqual(run(interpreter, source), 120)
+        self.assertEqual(self.budget.usage(), {'steps': 6, 'environments': 6, 'depth': 0})
+
+    def test_step_limit_counts_tail_calls(self):
+        interpreter = self.budgeted(steps=1000)
+        with self.assertRaises(BudgetExceeded) as caught:
+            run(interpreter, LOOP + "loop(0)")
+        self.assertEqual((caught.exception.limit, caught.exception.stack), ('steps', ['loop']))
+        self.assertEqual(str(caught.exception), 'steps limit of 1000 exceeded in loop <- <program>')
+
+    def test_depth_limit(self):
+        interpreter = self.budgeted(depth=50)
+        with self.assertRaises(BudgetExceeded) as caught:
+            run(interpreter, DEEP + "deep(0)")
+        self.assertEqual(caught.exception.limit, 'depth')
+        self.assertEqual(len(caught.exception.stack), 51)
+        self.assertIn('deep <- deep', str(caught.exception))
+
+    def test_environment_limit(self):
+        interpreter = self.budgeted(environments=10)
+        with self.assertRaises(BudgetExceeded) as caught:
+            run(interpreter, LOOP + "loop(0)")
+        self.assertEqual(caught.exception.limit, 'environments')
+
+    def test_time_limit(self):
+        interpreter = Interpreter()
+        # Every clock reading advances by one second.
+        budget = Budget(seconds=3, clock=itertools.count().__next__)
+        budget.attach(interpreter)
+        with self.assertRaises(BudgetExceeded) as caught:
+            run(interpreter, LOOP + "loop(0)")
+        self.assertEqual(caught.exception.limit, 'seconds')
+        # The clock is read once per CHECK_INTERVAL calls.
+        self.assertEqual(budget.steps, 4 * Budget.CHECK_INTERVAL)
+
+    def test_recursion_error_becomes_budget_exceeded(self):
+        interpreter = self.budgeted()
+        with self.assertRaises(BudgetExceeded) as caught:
+            run(interpreter, DEEP + "deep(0)")
+        self.assertEqual(caught.exception.limit, 'python stack')
+
+    def test_reset_and_detach(self):
+        interpreter = self.budgeted(steps=1000)
+        run(interpreter, "defun count(n) { if (n == 0) { return 0; } else { return count(n - 1); } } count(900)")
+        with self.assertRaises(BudgetExceeded):
+            run(interpreter, "count(900)")
+        self.budget.reset()
+        self.assertEqual(run(interpreter, "count(900)"), 0)
+        self.budget.detach(interpreter)
+        self.assertEqual(run(interpreter, "count(5000)"), 0)
+        self.assertNotIn('call', vars(interpreter))
+
+    def test_needs_tree_backend(self):
+        with self.assertRaises(Exception):
+            Budget(steps=1).attach(Interpreter('closure'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from lexer import Lexer, TokenType
+from parser import Parser
+from interpreter import Interpreter
+
+FACTORIAL_SOURCE = """
+defun factorial(n) {
+  if (n == 0) {
+    return 1;
+  } else {
+    return n * factorial(n - 1);
+  }
+}
+factorial(5)
+"""
+
+def run(source, backend):
+    parser = Parser(Lexer(source))
+    interpreter = Interpreter(backend)
+    result = None
+    while parser.current_token.type != TokenType.EOF:
+        result = interpreter.eval(parser.parse())
+    return result
+
+class TestClosureCompiler(unittest.TestCase):
+    def assertSameResult(self, source):
+        self.assertEqual(run(source, 'closure'), run(source, 'tree'))
+
+    def test_arithmetic(self):
+        self.assertEqual(run("(3 + 4) * (2 - 1)", 'closure'), 7)
+        self.assertSameResult("-7 / 2 + 7 % -3")
+
+    def test_comparison_and_logic(self):
+        self.assertSameResult("(1 < 2) && (3 >= 3) || false")
+
+    def test_lambda_call(self):
+        self.assertSameResult("defun apply(f, x) { return f(x); } apply(lambda y -> y * y, 9)")
+
+    def test_factorial(self):
+        self.assertEqual(run(FACTORIAL_SOURCE, 'closure'), 120)
+        self.assertSameResult(FACTORIAL_SOURCE)
+
+    def test_compiled_form_is_reusable(self):
+        interpreter = Interpreter('closure')
+        code = interpreter.compile(Parser(Lexer("2 * 21")).parse())
+        self.assertEqual(interpreter.eval(code), 42)
+        self.assertEqual(interpreter.eval(code), 42)
+
+if __name__ == '__main__':
+    unittest.main()
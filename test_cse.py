@@ -0,0 +1,69 @@
+import unittest
+from lexer import Lexer
+from parser import HashConser, Parser
+from resolver import Resolver
+from interpreter import Interpreter
+from cse import SubexpressionCache, pure_inputs
+
+def parse(source, hash_cons=True):
+    ast = Parser(Lexer(source)).parse()
+    return Resolver().resolve(HashConser().intern(ast) if hash_cons else ast)
+
+class TestSubexpressionCache(unittest.TestCase):
+    def run_cached(self, source, hash_cons=True, **options):
+        interpreter = Interpreter()
+        cache = SubexpressionCache(**options)
+        cache.attach(interpreter)
+        return interpreter.eval(parse(source, hash_cons)), cache
+
+    def test_shared_subexpressions_are_evaluated_once(self):
+        source = """
+        defun f(x, y) { return (x * x + y * y) * (x * x + y * y) - (x * x + y * y); }
+        defun loop(i, acc) { if (i == 0) { return acc; } else { return loop(i - 1, acc + f(i % 2, 3)); } }
+        loop(10, 0)
+        """
+        expected = Interpreter().eval(parse(source, hash_cons=False))
+        result, cache = self.run_cached(source)
+        self.assertEqual(result, expected)
+        # For each of the two argument pairs the body, the product and the sum
+        # miss once and the sum is then found twice; the other 8 calls find the body.
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (6, 12))
+        self.assertEqual(stats['evaluations_saved'], 4 * 7 + 8 * 23)
+        result, unshared = self.run_cached(source, hash_cons=False)
+        self.assertEqual(result, expected)
+        self.assertGreater(unshared.stats()['misses'], stats['misses'])
+        # Evicted decisions are simply made again.
+        result, small = self.run_cached(source, max_candidates=2)
+        self.assertEqual(result, expected)
+        self.assertEqual(len(small.candidates), 2)
+
+    def test_pure_inputs(self):
+        body = parse("defun f(a, b) { return a * b + a * 2; }").body.value
+        inputs, size = pure_inputs(body)
+        self.assertEqual(sorted(var.value for var in inputs), ['a', 'b'])
+        self.assertEqual(size, 7)
+        self.assertIsNone(pure_inputs(parse("defun f(a) { return a + f(a); }").body.value))
+        self.assertIsNone(pure_inputs(parse("defun f(a, b) { return (a && b + 1 > 2); }").body.value))
+
+    def test_entries_are_per_node(self):
+        # The same text in another function reads other slots, so it must not reuse f's results.
+        source = """
+        defun f(x, y) { return x * 2 + y * 3; }
+        defun g(y, x) { return x * 2 + y * 3; }
+        f(1, 2) * 10 + g(1, 2)
+        """
+        result, cache = self.run_cached(source)
+        self.assertEqual(result, 87)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_errors_are_not_cached(self):
+        source = "defun f(a, b) { return a / b + a / b; } f(4, 2) + f(6, 3)"
+        self.assertEqual(self.run_cached(source, min_nodes=3)[0], 8)
+        with self.assertRaises(ZeroDivisionError):
+            self.run_cached("defun f(a, b) { return a / b + a / b; } f(4, 0)", min_nodes=3)
+        with self.assertRaisesRegex(Exception, 'Undefined variable: c'):
+            self.run_cached("defun f(a) { return a + 1 + c * 2; } f(1)")
+
+if __name__ == '__main__':
+    unittest.main()
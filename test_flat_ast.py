@@ -0,0 +1,43 @@
+import unittest
+from lexer import Lexer, TokenType
+from parser import Parser, BinOp, Num
+from interpreter import Interpreter
+from resolver import Resolver
+import ast_cache
+from optimizer import count_nodes
+from flat_ast import flatten
+
+SOURCE = """
+defun f(a, b) { if (a >= b && !(a == 0)) { return a * 31 + b % 7; } else { 1; return f(b, a - 1); } }
+f(12, 5) + -f(1, 2) * (f(3, 4) <= 10 || false)
+"""
+
+class TestFlatAST(unittest.TestCase):
+    def test_round_trip(self):
+        ast = Parser(Lexer(SOURCE)).parse()
+        flat = flatten(ast)
+        self.assertEqual(len(flat), count_nodes(ast))
+        expanded = flat.expand()
+        self.assertEqual(ast_cache.encode(expanded), ast_cache.encode(ast))
+        self.assertEqual(Interpreter().eval(Resolver().resolve(expanded)),
+                         Interpreter().eval(Resolver().resolve(Parser(Lexer(SOURCE)).parse())))
+
+    def test_statements_expand_one_at_a_time(self):
+        ast = Parser(Lexer("defun g(x) { return x + 1; } g(1); true; 7")).parse()
+        flat = flatten(ast)
+        statements = list(flat.statements())
+        self.assertEqual([ast_cache.encode(statement) for statement in statements],
+                         [ast_cache.encode(statement) for statement in ast.statements])
+
+    def test_deep_trees_do_not_recurse(self):
+        ast = Num(0)
+        for value in range(1, 50000):
+            ast = BinOp(ast, TokenType.PLUS, Num(value))
+        flat = flatten(ast)
+        self.assertEqual(len(flat), 99999)
+        self.assertEqual(flat.constants[flat.a[flat.root - 1]], 49999)
+        rebuilt = flat.expand()
+        self.assertEqual(rebuilt.right.value, 49999)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from lexer import Lexer
+from parser import Parser
+from resolver import Resolver
+from interpreter import Interpreter
+from lazy import LazyInterpreter
+from vm import VM
+from closure_compiler import ClosureCompiler
+import image
+import typecheck
+
+PRELUDE = """
+defun square(x) { return x * x; }
+defun even(n) { if (n == 0) { return true; } return odd(n - 1); }
+defun odd(n) { if (n == 0) { return false; } return even(n - 1); }
+defun adder(n) {
+    defun add(x) { return x + n; }
+    return add;
+}
+defun counter(start) { return lambda step -> start + step; }
+"""
+
+def run(interpreter, source):
+    return interpreter.eval(Resolver().resolve(Parser(Lexer(source)).parse()))
+
+def prelude(interpreter):
+    run(interpreter, PRELUDE)
+    # Closures over frames only reach the globals through an embedding program.
+    env = interpreter.global_env
+    for name, source in (('add3', 'adder(3)'), ('add5', 'adder(5)'), ('squares', 'list(map(square, range(0, 4)))')):
+        env.set(name, run(interpreter, source))
+    return interpreter
+
+class TestImage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'prelude.image')
+
+    def test_round_trip(self):
+        interpreter = prelude(Interpreter())
+        image.save(interpreter.global_env, self.path)
+        data = image.read(self.path)
+        for backend in ('tree', 'closure'):
+            loaded = Interpreter(backend)
+            image.preload(loaded, data)
+            self.assertEqual(run(loaded, "square(add3(1)) + add5(0)"), 21)
+            self.assertEqual(run(loaded, "even(10) && odd(7)"), True)
+            self.assertEqual(run(loaded, "defun call(f, x) { return f(x); } call(counter(10), 5)"), 15)
+            self.assertEqual(run(loaded, "reduce(lambda a, b -> a + b, squares, 0)"), 14)
+
+    def test_typed_calls_check_image_functions(self):
+        interpreter = Interpreter()
+        run(interpreter, "defun f(a, b) { return a + b; }")
+        data = image.snapshot(interpreter.global_env)
+        for source in ("f(1, 2, 3)", "f(1)", "defun call(g) { return g(1, 2, 3); } call(f)"):
+            loaded = Interpreter('closure')
+            image.preload(loaded, data)
+            ast = Resolver().resolve(Parser(Lexer(source)).parse())
+            loaded.compiler = ClosureCompiler(typecheck.check(ast, loaded.global_env.variables))
+            with self.assertRaisesRegex(Exception, 'Argument count mismatch'):
+                loaded.eval(ast)
+
+    def test_sharing_is_preserved(self):
+        interpreter = prelude(Interpreter())
+        env = image.restore(image.snapshot(interpreter.global_env))
+        add3, add5 = env.get('add3'), env.get('add5')
+        # Both closures still run one body, and the recursive defuns see each other.
+        self.assertIs(add3.body, add5.body)
+        self.assertIsNot(add3.env, add5.env)
+        self.assertIs(env.get('even').env, env)
+        self.assertIs(env.get('range'), interpreter.global_env.get('range'))
+
+    def test_restored_copies_are_independent(self):
+        interpreter = Interpreter()
+        run(interpreter, "defun f() { return 1; }")
+        data = image.snapshot(interpreter.global_env)
+        first = Interpreter()
+        image.preload(first, data)
+        run(first, "defun f() { return 2; }")
+        self.assertEqual(run(first, "f()"), 2)
+        second = Interpreter()
+        image.preload(second, data)
+        self.assertEqual(run(second, "f()"), 1)
+
+    def test_lazy_thunks(self):
+        interpreter = LazyInterpreter()
+        run(interpreter, "defun first(a, b) { return lambda -> a; }")
+        interpreter.global_env.set('f', run(interpreter, "first(1 + 2, 1 / 0)"))
+        loaded = LazyInterpreter()
+        image.preload(loaded, image.snapshot(interpreter.global_env))
+        self.assertEqual(run(loaded, "f()"), 3)
+
+    def test_errors(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not an image')
+        with self.assertRaisesRegex(Exception, 'is not an image'):
+            image.read(self.path)
+        with self.assertRaisesRegex(Exception, 'tree or closure backend'):
+            image.preload(VM(), image.snapshot(Interpreter().global_env))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
-from lexer import Lexer
+from lexer import Lexer, TokenType
 from parser import Parser
 from interpreter import Interpreter
+from resolver import Resolver
+from environment import Environment
 
 class TestInterpreter(unittest.TestCase):
     def test_simple_addition(self):
@@ -31,5 +33,51 @@ class TestInterpreter(unittest.TestCase):
         result = interpreter.eval(ast)
         self.assertEqual(result, 120)
 
+    def test_tail_call_countdown(self):
+        source_code = """
+        defun countdown(n) {
+          if (n == 0) {
+            return 0;
+          } else {
+            return countdown(n - 1);
+          }
+        }
+        countdown(1000000)
+        """
+        lexer = Lexer(source_code)
+        parser = Parser(lexer)
+        interpreter = Interpreter()
+        while parser.current_token.type != TokenType.EOF:
+            result = interpreter.eval(parser.parse())
+        self.assertEqual(result, 0)
+
+    def test_mutual_tail_calls(self):
+        source_code = """
+        defun is_even(n) { if (n == 0) { return true; } else { return is_odd(n - 1); } }
+        defun is_odd(n) { if (n == 0) { return false; } else { return is_even(n - 1); } }
+        is_even(5001)
+        """
+        lexer = Lexer(source_code)
+        parser = Parser(lexer)
+        interpreter = Interpreter()
+        while parser.current_token.type != TokenType.EOF:
+            result = interpreter.eval(parser.parse())
+        self.assertEqual(result, False)
+
+    def test_inline_cache(self):
+        interpreter = Interpreter()
+        fact = Resolver().resolve(Parser(Lexer(
+            "defun fact(n) { if (n == 0) { return 1; } else { return n * fact(n - 1); } } fact(5)")).parse())
+        self.assertEqual(interpreter.eval(fact), 120)
+        self.assertEqual(interpreter.stats()['inline_cache'], {'hits': 4, 'misses': 2, 'hit_rate': 0.6667})
+        # Rebinding the name changes the environment version, so the cached callee is dropped.
+        interpreter.eval(Resolver().resolve(Parser(Lexer("defun fact(n) { return 0 - n; }")).parse()))
+        call = fact.statements[1]
+        self.assertEqual(interpreter.eval(call, interpreter.global_env), -5)
+        # The same tree run against other globals does not reuse the cache either.
+        other = Environment()
+        with self.assertRaises(Exception):
+            interpreter.eval(call, other)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from lexer import Lexer
+from parser import Parser
+from resolver import Resolver
+from lazy import LazyInterpreter, strict_parameters
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = LazyInterpreter()
+
+    def run_source(self, source):
+        return self.interpreter.eval(parse(source))
+
+    def test_unused_arguments_are_never_evaluated(self):
+        source = """
+        defun pick(first, a, b) { if (first) { return a; } else { return b; } }
+        defun loop(n) { return loop(n); }
+        pick(true, 1, 1 / 0) + pick(false, loop(0), 2)
+        """
+        self.assertEqual(self.run_source(source), 3)
+        self.assertEqual(self.interpreter.stats()['lazy'], {'thunks': 2, 'forced': 0})
+
+    def test_thunks_are_forced_once(self):
+        source = """
+        defun square(x) { return x * x; }
+        defun twice(v) { return square(v) + square(v); }
+        defun ignore(c, v) { if (c) { return twice(v); } else { return 0; } }
+        ignore(true, 3 + 4)
+        """
+        self.assertEqual(self.run_source(source), 98)
+        self.assertEqual(self.interpreter.stats()['lazy'], {'thunks': 1, 'forced': 1})
+
+    def test_closures_capture_thunks(self):
+        source = """
+        defun make(a) { return lambda y -> a + y; }
+        defun apply(g) { return g(1); }
+        apply(make(2 + 3))
+        """
+        self.assertEqual(self.run_source(source), 6)
+
+    def test_accumulators_stay_strict(self):
+        source = "defun count(n, acc) { if (n == 0) { return acc; } else { return count(n - 1, acc + n); } } count(20000, 0)"
+        self.assertEqual(self.run_source(source), 200010000)
+        self.assertEqual(self.interpreter.stats()['lazy']['thunks'], 0)
+
+    def test_strict_parameters(self):
+        def strictness(source):
+            func = Parser(Lexer(source)).parse()
+            return strict_parameters(func.name, func.params, func.body)
+        self.assertEqual(strictness("defun pick(c, a, b) { if (c) { return a; } else { return b; } }"), {0})
+        self.assertEqual(strictness("defun both(c, a) { if (c) { return a; } else { return a + 1; } }"), {0, 1})
+        self.assertEqual(strictness("defun guard(a, b) { return (a && b); }"), {0})
+        self.assertEqual(strictness("defun early(a, b) { if (a) { return 1; } b }"), {0})
+        self.assertEqual(strictness("defun closure(a) { return lambda x -> a; }"), set())
+
+if __name__ == '__main__':
+    unittest.main()
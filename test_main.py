@@ -0,0 +1,39 @@
+import io
+import unittest
+from interpreter import Interpreter
+from main import make_interpreter, run_stream
+from parser import HashConser
+
+class TestMain(unittest.TestCase):
+    def test_run_stream(self):
+        source = io.StringIO("defun sq(x) { return x * x; }\nsq(3)\nsq(4) + 1;\n")
+        self.assertEqual(list(run_stream(source, Interpreter())), [9, 17])
+
+    def test_caches_do_not_grow_with_the_stream(self):
+        def cached_nodes(statements):
+            closure, memoized = Interpreter('closure'), Interpreter(memoize=True)
+            lines = ["defun apply(f, x) { return f(x) + 0; }", "defun sq(x) { return x * x; }"]
+            lines += [f"apply(lambda y -> sq(y) + {n}, {n})" for n in range(statements)]
+            for interpreter in (closure, memoized):
+                results = run_stream(io.StringIO("\n".join(lines)), interpreter, conser=HashConser())
+                self.assertEqual(list(results)[-1], (statements - 1) ** 2 + statements - 1)
+            return len(closure.compiler.codes), len(memoized.memo.purity)
+        # Only the defuns keep entries.
+        self.assertEqual(cached_nodes(10), cached_nodes(100))
+
+    def test_memoize_needs_the_tree_backend(self):
+        self.assertIsNotNone(make_interpreter('tree', memoize=True).memo)
+        for backend in ('closure', 'vm', 'python'):
+            with self.assertRaisesRegex(Exception, 'Memoization needs the tree backend'):
+                make_interpreter(backend, memoize=True)
+
+    def test_results_arrive_before_the_rest_is_parsed(self):
+        source = io.StringIO("1 + 1\n2 * 3\n) this does not parse")
+        results = run_stream(source, Interpreter())
+        self.assertEqual(next(results), 2)
+        self.assertEqual(next(results), 6)
+        with self.assertRaises(Exception):
+            next(results)
+
+if __name__ == '__main__':
+    unittest.main()
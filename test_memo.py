@@ -0,0 +1,73 @@
+import time
+import unittest
+from lexer import Lexer, TokenType
+from parser import Parser
+from interpreter import Interpreter
+from memo import LRUCache, memo_key
+
+FIB_SOURCE = """
+defun fib(n) {
+  if (n < 2) {
+    return n;
+  } else {
+    return fib(n - 1) + fib(n - 2);
+  }
+}
+"""
+
+def run(interpreter, source):
+    parser = Parser(Lexer(source))
+    result = None
+    while parser.current_token.type != TokenType.EOF:
+        result = interpreter.eval(parser.parse())
+    return result
+
+class TestMemo(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = LRUCache(2)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.get(1)
+        cache.put(3, 'c')
+        self.assertEqual(cache.get(2), None)
+        self.assertEqual(cache.get(1), 'a')
+        self.assertEqual(cache.evictions, 1)
+
+    def test_fifo_eviction(self):
+        cache = LRUCache(2, 'fifo')
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.get(1)
+        cache.put(3, 'c')
+        self.assertEqual(cache.get(1), None)
+
+    def test_keys(self):
+        self.assertNotEqual(memo_key([True]), memo_key([1]))
+        self.assertIsNone(memo_key([lambda: 0]))
+
+    def test_fib_30(self):
+        interpreter = Interpreter(memoize=True)
+        run(interpreter, FIB_SOURCE)
+        start = time.perf_counter()
+        self.assertEqual(run(interpreter, "fib(30)"), 832040)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        stats = interpreter.stats()['memo']
+        self.assertEqual(stats['misses'], 31)
+        self.assertEqual(stats['hits'], 28)
+
+    def test_rebinding_invalidates(self):
+        interpreter = Interpreter(memoize=True)
+        run(interpreter, "defun g(x) { return x + 1; } defun f(x) { return g(x) * 2; }")
+        self.assertEqual(run(interpreter, "f(1)"), 4)
+        run(interpreter, "defun g(x) { return x + 2; }")
+        self.assertEqual(run(interpreter, "f(1)"), 6)
+
+    def test_bool_and_int_arguments_stay_apart(self):
+        interpreter = Interpreter(memoize=True)
+        run(interpreter, "defun id(x) { return x; }")
+        self.assertIs(run(interpreter, "id(true)"), True)
+        self.assertEqual(run(interpreter, "id(1)"), 1)
+        self.assertIsNot(run(interpreter, "id(1)"), True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from lexer import Lexer
+from parser import Parser, Num, Bool, Var, BinOp, UnaryOp, If, Return
+from interpreter import Interpreter
+from optimizer import Optimizer
+
+def parse(source):
+    return Parser(Lexer(source)).parse()
+
+class TestOptimizer(unittest.TestCase):
+    def test_constant_folding(self):
+        optimizer = Optimizer()
+        ast = optimizer.optimize(parse("(3 + 4) * (2 - 1)"))
+        self.assertIsInstance(ast, Num)
+        self.assertEqual(ast.value, 7)
+        self.assertEqual(optimizer.stats['fold_constants'], 3)
+        self.assertEqual(optimizer.stats['nodes_removed'], 6)
+
+    def test_folding_keeps_division_semantics(self):
+        for source in ("-7 / 2", "-7 % 3", "7 % -3", "!(1 > 2)", "1 == 1"):
+            expected = Interpreter().eval(parse(source))
+            ast = Optimizer().optimize(parse(source))
+            self.assertIsInstance(ast, (Num, Bool))
+            self.assertEqual(ast.value, expected)
+            self.assertIs(type(ast.value), type(expected))
+
+    def test_division_by_zero_is_left_for_runtime(self):
+        self.assertIsInstance(Optimizer().optimize(parse("1 / 0")), BinOp)
+
+    def test_identities(self):
+        ast = Optimizer().optimize(parse("(x * 2) * 1 + 0"))
+        self.assertIsInstance(ast, BinOp)
+        self.assertIsInstance(ast.left, Var)
+        self.assertEqual(ast.right.value, 2)
+
+    def test_identities_keep_unknown_operands(self):
+        # x might be a bool, and true * 1 is 1, not true.
+        self.assertIsInstance(Optimizer().optimize(parse("x * 1")), BinOp)
+        self.assertIsInstance(Optimizer().optimize(parse("!!x")), UnaryOp)
+        self.assertIsInstance(Optimizer().optimize(parse("!!(x > 1)")), BinOp)
+
+    def test_double_negation_in_condition(self):
+        ast = Optimizer().optimize(parse("if (!!x) { return 1; } else { return 2; }"))
+        self.assertIsInstance(ast.condition, Var)
+
+    def test_dead_branch_elimination(self):
+        optimizer = Optimizer()
+        ast = optimizer.optimize(parse("if (1 > 2) { return 1; } else { return x; }"))
+        self.assertIsInstance(ast, Return)
+        self.assertIsInstance(ast.value, Var)
+        self.assertEqual(optimizer.stats['prune_branches'], 1)
+
+    def test_short_circuit(self):
+        self.assertEqual(Optimizer().optimize(parse("false && x")).value, False)
+        self.assertIsInstance(Optimizer().optimize(parse("true && x")), Var)
+        self.assertEqual(Optimizer().optimize(parse("3 || x")).value, 3)
+        self.assertIsInstance(Optimizer().optimize(parse("0 || x")), Var)
+
+    def test_rules_can_be_disabled(self):
+        optimizer = Optimizer(fold_constants=False, prune_branches=False)
+        ast = optimizer.optimize(parse("if (true) { return 1 + 2; }"))
+        self.assertIsInstance(ast, If)
+        self.assertIsInstance(ast.then_branch.value, BinOp)
+        self.assertEqual(optimizer.stats['nodes_removed'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
-from lexer import Lexer
-from parser import Parser, Num, BinOp, Lambda, Var
+from lexer import Lexer, TokenType
+from parser import HashConser, Parser, Num, BinOp, Lambda, Var, Function, Program, Sequence
+from resolver import Resolver
 
 
 class TestParser(unittest.TestCase):
@@ -26,5 +27,82 @@ class TestParser(unittest.TestCase):
         self.assertIsInstance(ast.body.right, Var)
         self.assertEqual(ast.body.right.value, 'y')
 
+    def test_program(self):
+        lexer = Lexer("defun f(x) { 1; return x; } f(2)")
+        parser = Parser(lexer)
+        ast = parser.parse()
+        self.assertIsInstance(ast, Program)
+        self.assertEqual(len(ast.statements), 2)
+        self.assertIsInstance(ast.statements[0], Function)
+        self.assertIsInstance(ast.statements[0].body, Sequence)
+
+    def test_statements_are_parsed_lazily(self):
+        lexer = Lexer("1 + 2; 3 )")
+        parser = Parser(lexer)
+        statements = parser.statements()
+        self.assertIsInstance(next(statements), BinOp)
+        self.assertIsInstance(next(statements), Num)
+        with self.assertRaises(Exception):
+            next(statements)
+
+    def test_compact_nodes(self):
+        name = ''.join(['count', 'er'])
+        source = f"defun {name}(n) {{ return -n * {name}(n - 1); }}"
+        ast = Parser(Lexer(source)).parse()
+        call = ast.body.value.right
+        self.assertEqual(ast.body.value.op, TokenType.MULTIPLY)
+        self.assertEqual(ast.body.value.left.op, TokenType.MINUS)
+        self.assertIs(call.func.value, ast.name)
+        self.assertIs(call.args[0].left.value, ast.params[0])
+        self.assertFalse(hasattr(call, '__dict__'))
+
+    def test_precedence(self):
+        ast = Parser(Lexer("1 + 2 * -3 < 4 && !b || c")).parse()
+        self.assertEqual(ast.op, TokenType.OR)
+        self.assertEqual(ast.left.op, TokenType.AND)
+        comparison = ast.left.left
+        self.assertEqual(comparison.op, TokenType.LESS)
+        self.assertEqual(comparison.left.op, TokenType.PLUS)
+        self.assertEqual(comparison.left.right.op, TokenType.MULTIPLY)
+        self.assertEqual(comparison.left.right.right.op, TokenType.MINUS)
+        self.assertEqual(ast.left.right.op, TokenType.NOT)
+
+    def test_comparisons_do_not_chain(self):
+        for source in ("1 < 2 < 3", "1 == 2 != 3", "f(1 < 2)"):
+            with self.assertRaises(Exception):
+                Parser(Lexer(source)).parse()
+        self.assertEqual(Parser(Lexer("(1 < 2) == true")).parse().op, TokenType.EQUAL)
+
+    def test_long_chain(self):
+        ast = Parser(Lexer(' - '.join(str(index) for index in range(100000)))).parse()
+        # Left-associative: the last operand is on the right of the root.
+        self.assertEqual(ast.right.value, 99999)
+        self.assertEqual(ast.left.right.value, 99998)
+
+    def test_deep_nesting(self):
+        depth = 50000
+        ast = Parser(Lexer('(' * depth + '-x' + ' * f(1))' * depth)).parse()
+        for _ in range(depth):
+            self.assertEqual(ast.op, TokenType.MULTIPLY)
+            ast = ast.left
+        self.assertEqual(ast.op, TokenType.MINUS)
+
+    def test_hash_consing(self):
+        source = """
+        defun f(a, b) { return (a * b + 1) * (a * b + 1) - f(a * b + 1, b); }
+        defun g(b, a) { return (a * b + 1) + 2; }
+        (1 + 2) * (1 + 2)
+        """
+        conser = HashConser()
+        f, g, top = Resolver().resolve(conser.intern(Parser(Lexer(source)).parse())).statements
+        product = f.body.value.left
+        self.assertIs(product.left, product.right)
+        self.assertIs(f.body.value.right.args[0], product.left)
+        self.assertIs(top.left, top.right)
+        # Same text, different function: the Vars have other slots, so nothing is shared.
+        self.assertIsNot(g.body.value.left, product.left)
+        self.assertEqual((g.body.value.left.left.left.slot, product.left.left.left.slot), (1, 0))
+        self.assertEqual(conser.stats(), {'nodes': 39, 'unique': 25, 'unique_ratio': 0.641})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import itertools
+import json
+import unittest
+from lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from profiler import Profiler
+from budget import Budget, BudgetExceeded
+
+def run(interpreter, source):
+    return interpreter.eval(Resolver().resolve(Parser(Lexer(source)).parse()))
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = Interpreter()
+        # Every clock reading advances by one, so all times are exact counts.
+        self.profiler = Profiler(clock=itertools.count().__next__)
+        self.profiler.attach(self.interpreter)
+
+    def test_function_counters(self):
+        source = """
+        defun fact(n) { if (n == 0) { return 1; } else { return n * fact(n - 1); } }
+        defun count(n) { if (n == 0) { return 0; } else { return count(n - 1); } }
+        fact(5) + count(100)
+        """
+        self.assertEqual(run(self.interpreter, source), 120)
+        fact = self.profiler.functions['fact']
+        self.assertEqual((fact.calls, fact.max_depth, fact.allocations), (6, 6, 6))
+        count = self.profiler.functions['count']
+        # Tail calls reuse the Python stack, so they never nest.
+        self.assertEqual((count.calls, count.max_depth), (101, 1))
+        # fact's six frames were recycled for every one of count's calls.
+        self.assertEqual(count.allocations, 0)
+        self.assertEqual(self.profiler.nodes['Function'].calls, 2)
+
+    def test_exclusive_times_add_up(self):
+        run(self.interpreter, "defun f(x) { return x + 1; } f(f(1)) * 2")
+        root = self.profiler.functions['<program>']
+        self.assertEqual(sum(stat.exclusive for stat in self.profiler.functions.values()), root.inclusive)
+        self.assertEqual(sum(self.profiler.stacks.values()), root.inclusive)
+        self.assertEqual(sum(stat.exclusive for stat in self.profiler.nodes.values()),
+                         self.profiler.nodes['Program'].inclusive)
+
+    def test_exports(self):
+        run(self.interpreter, "defun f(x) { return x + 1; } defun g(x) { return f(x) * 2; } g(1)")
+        paths = [line.rsplit(' ', 1)[0] for line in self.profiler.collapsed().splitlines()]
+        self.assertEqual(paths, ['<program>', '<program>;g', '<program>;g;f'])
+        trace = json.loads(self.profiler.chrome_trace())
+        self.assertEqual(sorted(event['name'] for event in trace['traceEvents']), ['<program>', 'f', 'g'])
+        self.assertIn('function', self.profiler.report())
+
+    def test_wraps_an_attached_budget(self):
+        interpreter = Budget(depth=50).attach(Interpreter())
+        profiler = Profiler(clock=itertools.count().__next__)
+        profiler.attach(interpreter)
+        with self.assertRaisesRegex(BudgetExceeded, 'depth limit of 50'):
+            run(interpreter, "defun f(n) { return 1 + f(n + 1); } f(0)")
+        self.assertEqual(profiler.functions['f'].calls, 50)
+        self.assertEqual(run(interpreter, "defun g(n) { return length(range(0, n)) + 1; } g(3)"), 4)
+        self.assertEqual((profiler.functions['g'].calls, profiler.functions['length'].calls), (1, 1))
+
+    def test_detach_restores_plain_dispatch(self):
+        self.assertIn('visit', vars(self.interpreter))
+        self.profiler.detach(self.interpreter)
+        self.assertNotIn('visit', vars(self.interpreter))
+        self.assertNotIn('visit', vars(Interpreter()))
+        self.assertEqual(run(self.interpreter, "2 * 3"), 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from lexer import Lexer
+from parser import Parser
+from environment import Frame
+from interpreter import Interpreter
+from resolver import Resolver, captures_frame
+
+def parse_program(source):
+    parser = Parser(Lexer(source))
+    return [Resolver().resolve(statement) for statement in parser.statements()]
+
+def run(source, backend='tree'):
+    interpreter = Interpreter(backend)
+    result = None
+    for statement in parse_program(source):
+        result = interpreter.eval(statement)
+    return result
+
+class TestResolver(unittest.TestCase):
+    def test_lexical_addresses(self):
+        ast = parse_program("lambda x, y -> lambda z -> x + z")[0]
+        self.assertEqual(ast.frame_size, 2)
+        inner = ast.body
+        self.assertEqual(inner.frame_size, 1)
+        self.assertEqual((inner.body.left.depth, inner.body.left.slot), (1, 0))
+        self.assertEqual((inner.body.right.depth, inner.body.right.slot), (0, 0))
+
+    def test_globals_stay_dynamic(self):
+        ast = parse_program("defun f(n) { return n + g; }")[0]
+        self.assertEqual((ast.body.value.left.depth, ast.body.value.left.slot), (0, 0))
+        self.assertIsNone(ast.body.value.right.depth)
+        self.assertIsNone(ast.slot)
+
+    def test_closures(self):
+        source = """
+        defun adder(n) { return lambda x -> x + n; }
+        defun apply(f, x) { return f(x); }
+        apply(adder(10), 32)
+        """
+        self.assertEqual(run(source), 42)
+        self.assertEqual(run(source, 'closure'), 42)
+
+    def test_local_defun_gets_a_slot(self):
+        source = """
+        defun outer(n) {
+          defun twice(x) { return x * 2; }
+          return twice(n) + 1;
+        }
+        outer(20)
+        """
+        ast = parse_program(source)[0]
+        self.assertEqual(ast.frame_size, 2)
+        self.assertEqual(ast.body.statements[0].slot, 1)
+        call = ast.body.statements[1].value.left
+        self.assertEqual((call.func.depth, call.func.slot), (0, 1))
+        self.assertEqual(run(source), 41)
+        self.assertEqual(run(source, 'closure'), 41)
+
+    def test_calls_use_frames(self):
+        interpreter = Interpreter()
+        for statement in parse_program("defun f(a, b) { return a - b; }"):
+            interpreter.eval(statement)
+        self.assertEqual(interpreter.global_env.get('f').frame_size, 2)
+        frame = Frame(interpreter.global_env, [7, 3])
+        self.assertEqual(frame.lookup(0, 1, 'b'), 3)
+        self.assertIs(frame.get('f'), interpreter.global_env.get('f'))
+
+    def test_frame_pool(self):
+        adder, apply, fib, _ = parse_program("""
+        defun adder(n) { if (n > 0) { return lambda x -> x + n; } return 0; }
+        defun apply(f, x) { return f(x); }
+        defun fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+        0
+        """)
+        self.assertTrue(captures_frame(adder.body))
+        self.assertFalse(captures_frame(apply.body))
+        # The resolver records the answer on the node; closures made from it copy it.
+        self.assertEqual([func.captures for func in (adder, apply, fib)], [True, False, False])
+        interpreter = Interpreter()
+        for statement in (adder, apply, fib):
+            interpreter.eval(statement)
+        add = [interpreter.call(interpreter.global_env.get('adder'), [n]) for n in (10, 20)]
+        self.assertEqual(interpreter.frame_pool, [])
+        self.assertEqual(interpreter.call(interpreter.global_env.get('fib'), [15]), 610)
+        # 1219 calls needed only as many frames as the recursion is deep.
+        self.assertEqual(len(interpreter.frame_pool), 15)
+        # The adders kept their own frames while fib's were recycled.
+        self.assertEqual([interpreter.call(func, [1]) for func in add], [11, 21])
+        self.assertEqual(run("defun f(n) { return n * 2; } defun g(n) { return f(n + 1) + f(n); } g(5)"), 22)
+
+if __name__ == '__main__':
+    unittest.main()
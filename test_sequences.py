@@ -0,0 +1,71 @@
+import unittest
+from lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from transpiler import PythonBackend
+from budget import Budget
+from typecheck import check, show
+
+PIPELINE = """
+defun square(x) { return x * x; }
+defun even(x) { return (x % 2 == 0); }
+reduce(lambda a, b -> a + b, map(square, filter(even, range(1, 7))), 0)
+"""
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+class TestSequences(unittest.TestCase):
+    def test_pipeline_on_every_backend(self):
+        for interpreter in (Interpreter(), Interpreter('closure'), PythonBackend()):
+            self.assertEqual(interpreter.eval(parse(PIPELINE)), 56)
+
+    def test_closures_and_builtins_as_callbacks(self):
+        source = """
+        defun scale(n, seq) { return map(lambda x -> x * n, seq); }
+        reduce(lambda a, b -> a + b, map(length, list(map(lambda n -> range(0, n), range(0, 4)))), 0) * 100
+          + reduce(lambda a, b -> a + b, scale(10, range(1, 4)), 0)
+        """
+        for interpreter in (Interpreter(), Interpreter('closure')):
+            self.assertEqual(interpreter.eval(parse(source)), 660)
+
+    def test_lazy_and_reiterable(self):
+        interpreter = Interpreter()
+        seq = interpreter.eval(parse("map(lambda x -> 12 / x, range(0, 3))"))
+        with self.assertRaises(ZeroDivisionError):
+            list(seq)
+        seq = interpreter.eval(parse("filter(lambda x -> (x > 2), range(0, 6))"))
+        self.assertEqual((repr(seq), list(seq)), ('[3, 4, 5]', [3, 4, 5]))
+        huge = interpreter.eval(parse("range(0, 1000000000000)"))
+        self.assertEqual(repr(huge), '[' + ', '.join(map(str, range(20))) + ', ...]')
+
+    def test_errors(self):
+        interpreter = Interpreter()
+        with self.assertRaisesRegex(Exception, 'not a sequence'):
+            interpreter.eval(parse("map(lambda x -> x, 5)"))
+        with self.assertRaisesRegex(Exception, 'Argument count mismatch'):
+            interpreter.eval(parse("reduce(lambda x -> x, range(0, 3), 0)"))
+
+    def test_callbacks_count_against_budget(self):
+        interpreter = Interpreter()
+        budget = Budget()
+        budget.attach(interpreter)
+        self.assertEqual(interpreter.eval(parse(PIPELINE)), 56)
+        # square for each of the 3 even numbers, even for all 6, the adder 3 times.
+        self.assertEqual(budget.steps, 12)
+
+    def test_builtin_types(self):
+        ast = parse(PIPELINE + "defun evens(n) { return filter(even, range(0, n)); }")
+        types = check(ast)
+        self.assertEqual(types[ast.statements[2]], 'int')
+        self.assertEqual(show(types[ast.statements[3]]), '(int) -> [int]')
+
+    def test_fresh_globals_keep_builtins(self):
+        interpreter = Interpreter()
+        interpreter.eval(parse("defun range(a, b) { return 0; }"))
+        interpreter.global_env = interpreter.new_globals()
+        self.assertEqual(interpreter.eval(parse("length(range(0, 4))")), 4)
+
+if __name__ == '__main__':
+    unittest.main()
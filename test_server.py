@@ -0,0 +1,78 @@
+import asyncio
+import json
+import unittest
+from server import Server, Session
+import loadgen
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = Server('closure', workers=2)
+        self.listener = await self.server.start('127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.executor.shutdown()
+
+    def open_connection(self):
+        return asyncio.open_connection('127.0.0.1', self.port)
+
+    async def exchange(self, connection, request):
+        reader, writer = connection
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def test_sessions_keep_their_own_globals(self):
+        first = await self.open_connection()
+        second = await self.open_connection()
+        source = "defun sq(x) { return x * x; }"
+        self.assertTrue((await self.exchange(first, {'source': source}))['ok'])
+        reply = await self.exchange(first, {'id': 7, 'source': 'sq(7)'})
+        self.assertEqual((reply['id'], reply['result']), (7, 49))
+        reply = await self.exchange(second, {'source': 'sq(7)'})
+        self.assertFalse(reply['ok'])
+        self.assertIn('Undefined variable: sq', reply['error'])
+        await self.exchange(second, {'source': source})
+        await self.exchange(first, {'op': 'reset'})
+        self.assertFalse((await self.exchange(first, {'source': 'sq(2)'}))['ok'])
+        self.assertEqual((await self.exchange(second, {'source': 'sq(2)'}))['result'], 4)
+        stats = (await self.exchange(second, {'op': 'stats'}))['result']
+        self.assertEqual(stats['ast_cache'], {'hits': 3, 'misses': 3, 'entries': 3})
+        self.assertEqual(stats['errors'], 2)
+        for _, writer in (first, second):
+            writer.close()
+
+    def test_sessions_share_trees_without_state(self):
+        server = Server('tree', workers=1)
+        self.addCleanup(server.executor.shutdown)
+        first, second = Session(server), Session(server)
+        first.evaluate("defun sq(x) { return x * x; }")
+        second.evaluate("defun sq(x) { return x + x; }")
+        program = "sq(3) + sq(4)"
+        self.assertEqual([first.evaluate(program), second.evaluate(program), first.evaluate(program)], [25, 14, 25])
+        self.assertEqual(server.asts.stats()['hits'], 2)
+        call = server.asts.get(program).left
+        self.assertIsNone(call.cache)
+
+    def test_compiled_closures_go_with_evicted_trees(self):
+        server = Server('tree', workers=1, cache_size=1)
+        self.addCleanup(server.executor.shutdown)
+        session = Session(server)
+        self.assertIs(session.interpreter.compiler, server.compiler)
+        self.assertEqual(session.evaluate("reduce(lambda a, b -> a + b, map(lambda x -> x * x, range(0, 4)), 0)"), 14)
+        self.assertGreater(len(server.compiler.codes), 0)
+        self.assertEqual(session.evaluate("1 + 2"), 3)
+        self.assertEqual(len(server.compiler.codes), 0)
+        with self.assertRaisesRegex(Exception, 'tree backend'):
+            Server('python', limits={'steps': 100})
+
+    async def test_load_generator(self):
+        summary = await loadgen.run(self.open_connection, '6 * 7', connections=4, requests=10)
+        self.assertEqual((summary['requests'], summary['errors']), (40, 0))
+        self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+        self.assertEqual(summary['server']['requests'], 41)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import io
+import mmap
+import tempfile
+import unittest
+from lexer import Lexer, TokenType
+from parser import Parser, BinOp
+from stream_lexer import StreamLexer, tokenize
+
+SOURCE = """
+# factorial, with every operator the lexer knows
+defun factorial(n) {
+  if (n == 0 || n <= 0 && !(n != 0)) {
+    return 1;
+  } else {
+    return n * factorial(n - 1) / 1 % 7 + (n >= 1) - (n > 2) + (n < 3);
+  }
+}
+apply(lambda x_1, y -> x_1, true, false)
+"""
+
+def lexer_tokens(source):
+    lexer = Lexer(source)
+    tokens = []
+    while True:
+        token = lexer.get_next_token()
+        tokens.append((token.type, token.value))
+        if token.type == TokenType.EOF:
+            return tokens
+
+def stream_tokens(source, **kwargs):
+    return [(token.type, token.value) for token in tokenize(source, **kwargs)]
+
+class TestStreamLexer(unittest.TestCase):
+    def test_matches_lexer(self):
+        self.assertEqual(stream_tokens(SOURCE), lexer_tokens(SOURCE))
+
+    def test_file_objects_across_chunk_boundaries(self):
+        expected = lexer_tokens(SOURCE)
+        for chunk_size in (1, 2, 3, 7, 64):
+            self.assertEqual(stream_tokens(io.StringIO(SOURCE), chunk_size=chunk_size), expected)
+            self.assertEqual(stream_tokens(io.BytesIO(SOURCE.encode()), chunk_size=chunk_size), expected)
+
+    def test_mmap(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(SOURCE.encode())
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(stream_tokens(mapped), lexer_tokens(SOURCE))
+
+    def test_invalid_character(self):
+        with self.assertRaises(Exception):
+            list(tokenize("1 $ 2"))
+
+    def test_parser_accepts_stream_lexer(self):
+        ast = Parser(StreamLexer("3 + 4")).parse()
+        self.assertIsInstance(ast, BinOp)
+        self.assertEqual(ast.right.value, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from lexer import Lexer
+from parser import Parser, Return
+from interpreter import Interpreter
+from resolver import Resolver
+from transpiler import PythonBackend, mangle
+
+PROGRAMS = [
+    "defun fact(n) { if (n == 0) { return 1; } else { return n * fact(n - 1); } } fact(20)",
+    "defun make_adder(n) { return lambda x -> x + n; } defun apply(f, x) { return f(x); } apply(make_adder(3), 4)",
+    "(1 < 2) == true",
+    "!true == false",
+    "true || false && false",
+    "(1 || 0) && 0",
+    "-7 / 2 + -7 % 3 - 7 / -2",
+    "defun f(x) { defun g(y) { return y * x; } if (x > 2) { return g(x); } 5 } f(3) + f(1)",
+    "defun print(list) { return list + 1; } print(2)",
+    "if (1 > 2) { 3 } else { 4 }",
+    "defun f() { if (false) { return 1; } } f()",
+]
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+class TestTranspiler(unittest.TestCase):
+    def test_matches_interpreter(self):
+        for source in PROGRAMS:
+            expected = Interpreter().eval(parse(source))
+            result = PythonBackend().eval(parse(source))
+            self.assertEqual((type(result), result), (type(expected), expected), source)
+
+    def test_self_tail_calls_become_loops(self):
+        source = "defun count(n, acc) { if (n == 0) { return acc; } else { return count(n - 1, acc + n); } } count(100000, 0)"
+        backend = PythonBackend()
+        self.assertIn('while True:', backend.source(parse(source)))
+        self.assertEqual(backend.eval(parse(source)), 5000050000)
+
+    def test_long_chains_compile(self):
+        source = ' + '.join(str(index) for index in range(3000))
+        self.assertEqual(PythonBackend().eval(Parser(Lexer(source)).parse()), sum(range(3000)))
+
+    def test_code_objects_are_cached_by_structure(self):
+        backend = PythonBackend()
+        source = "defun sq(x) { return x * x; } sq(9)"
+        self.assertEqual(backend.eval(parse(source)), 81)
+        self.assertEqual(backend.eval(parse(source)), 81)
+        self.assertEqual(backend.stats()['code_cache'], {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_statements_share_globals(self):
+        backend = PythonBackend()
+        backend.eval(parse("defun double(x) { return x * 2; }"))
+        self.assertEqual(backend.eval(parse("double(21)")), 42)
+        result = backend.eval(parse("return double(2)"))
+        self.assertIsInstance(result, Return)
+        self.assertEqual(result.value, 4)
+
+    def test_mangle(self):
+        self.assertEqual([mangle(name) for name in ('x', 'list', 'class', 'x_', '__t1')],
+                         ['x', 'list_', 'class_', 'x__', '__t1_'])
+
+if __name__ == '__main__':
+    unittest.main()
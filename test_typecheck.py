@@ -0,0 +1,96 @@
+import unittest
+from lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from resolver import Resolver
+from closure_compiler import ClosureCompiler
+from typecheck import TypeCheckError, check, show
+
+def parse(source):
+    return Resolver().resolve(Parser(Lexer(source)).parse())
+
+class TestTypeCheck(unittest.TestCase):
+    def test_infers_function_types(self):
+        ast = parse("""
+        defun fib(n) { if (n < 2) { return n; } else { return fib(n - 1) + fib(n - 2); } }
+        defun even(n) { return (n % 2 == 0); }
+        defun compose(f, g) { return lambda x -> f(g(x)); }
+        defun unused(a, b) { return a; }
+        defun apply(f, x) { return f(x); }
+        apply(compose(lambda x -> x + 1, fib), 10)
+        """)
+        types = check(ast)
+        fib, even, compose, unused = ast.statements[:4]
+        self.assertEqual(show(types[fib]), '(int) -> int')
+        self.assertEqual(show(types[even]), '(int) -> bool')
+        self.assertEqual(show(types[compose]), '((int) -> int, (int) -> int) -> (int) -> int')
+        self.assertEqual(show(types[unused]), '(a, b) -> a')
+        self.assertEqual(types[ast.statements[5]], 'int')
+
+    def test_mutual_recursion_and_local_defuns(self):
+        ast = parse("""
+        defun is_even(n) { if (n == 0) { return true; } else { return is_odd(n - 1); } }
+        defun is_odd(n) { if (n == 0) { return false; } else { return is_even(n - 1); } }
+        defun outer(n) { defun inner(m) { return m * n; } return inner(2); }
+        is_even(outer(3))
+        """)
+        types = check(ast)
+        self.assertEqual(show(types[ast.statements[1]]), '(int) -> bool')
+        self.assertEqual(types[ast.statements[3]], 'bool')
+
+    def test_reports_every_error(self):
+        ast = parse("""
+        defun f(x) { return x + 1; }
+        defun g(n) { if (n + 1) { return 1; } else { return false; } }
+        f(true) + h(1)
+        """)
+        with self.assertRaises(TypeCheckError) as caught:
+            check(ast)
+        self.assertEqual(caught.exception.errors, [
+            'in g: (n + 1) is int, expected bool',
+            'in g: return false is bool, but g returns int',
+            'f(true): f is (int) -> int, expected (bool) -> int',
+            'Undefined variable: h',
+        ])
+
+    def test_if_without_else(self):
+        for source, error in (
+                ("defun g(x) { if (x > 0) { return lambda y -> y; } } defun app(f, x) { return f(x); } app(g(0), 1)",
+                 'in g: if (x > 0) has no else, but its value is used'),
+                ("defun g(x) { if (x > 0) { return 1; } } g(0) + 1",
+                 'in g: if (x > 0) has no else, but its value is used')):
+            with self.assertRaises(TypeCheckError) as caught:
+                check(parse(source))
+            self.assertEqual(caught.exception.errors, [error])
+        # Falling through to the next statement is fine.
+        ast = parse("defun g(x) { if (x > 0) { return 1; } return 0; } g(0) + 1")
+        interpreter = Interpreter('closure')
+        interpreter.compiler = ClosureCompiler(check(ast))
+        self.assertEqual(interpreter.eval(ast), 1)
+
+    def test_arity_and_occurs_check(self):
+        with self.assertRaises(TypeCheckError):
+            check(parse("defun f(x, y) { return x; } f(1)"))
+        with self.assertRaises(TypeCheckError):
+            check(parse("defun f(x) { return x(x); } 1"))
+
+    def test_specialized_closures(self):
+        source = """
+        defun fib(n) { if (n < 2) { return n; } else { return fib(n - 1) + fib(n - 2); } }
+        defun apply(f, x) { return f(x); }
+        defun flag(a, b, n) { return (!(a || b) && (1 - n * 0 >= 1 || b)); }
+        if (flag(false, false, 3)) { apply(fib, 15) + apply(lambda n -> n * 2, 4) } else { 0 }
+        """
+        ast = parse(source)
+        interpreter = Interpreter('closure')
+        interpreter.compiler = ClosureCompiler(check(ast))
+        self.assertEqual(interpreter.eval(ast), 618)
+        self.assertEqual(interpreter.eval(parse(source)), Interpreter('closure').eval(parse(source)))
+        # Without the resolver functions have no frame size and run in an Environment.
+        unresolved = Parser(Lexer(source)).parse()
+        interpreter = Interpreter('closure')
+        interpreter.compiler = ClosureCompiler(check(unresolved))
+        self.assertEqual(interpreter.eval(unresolved), 618)
+
+if __name__ == '__main__':
+    unittest.main()
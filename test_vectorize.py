@@ -0,0 +1,80 @@
+import gc
+import unittest
+import weakref
+from lexer import Lexer
+from parser import Parser
+from interpreter import Interpreter
+from vectorize import np
+
+def define(interpreter, source):
+    return interpreter.eval(Parser(Lexer(source)).parse())
+
+def rows(interpreter, func, *columns):
+    return [interpreter.call(func, list(args)) for args in zip(*columns)]
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestVectorize(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = Interpreter()
+        self.xs = np.arange(-20, 21)
+        self.ys = np.array([7, -3, 2, -5, 11] * 8 + [1])
+
+    def assertMatchesRows(self, func, *columns):
+        result = self.interpreter.map_batch(func, *columns)
+        expected = rows(self.interpreter, func, *[column.tolist() for column in columns])
+        self.assertEqual(result.tolist(), expected)
+        return result
+
+    def test_floor_division_and_modulo_on_negatives(self):
+        func = define(self.interpreter, "lambda x, y -> x / y * 3 + x % y - -x")
+        result = self.assertMatchesRows(func, self.xs, self.ys)
+        self.assertEqual(result.dtype, np.int64)
+        self.assertEqual(self.interpreter.stats()['batch']['vectorized'], 1)
+
+    def test_if_and_logic(self):
+        define(self.interpreter, "defun clamp(x, y) { if (x > y && !(x == 0) || y < -4) { return y; } else { return x; } }")
+        func = self.interpreter.global_env.get('clamp')
+        self.assertMatchesRows(func, self.xs, self.ys)
+
+    def test_kernels_do_not_keep_functions_alive(self):
+        func = define(self.interpreter, "lambda x -> x * 2 + 1")
+        self.assertMatchesRows(func, self.xs)
+        self.assertMatchesRows(func, self.xs)
+        self.assertEqual(self.interpreter.stats()['batch']['vectorized'], 2)
+        ref = weakref.ref(func)
+        del func
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(len(self.interpreter.batch.kernels), 0)
+
+    def test_untaken_branch_does_not_divide_by_zero(self):
+        define(self.interpreter, "defun safe(x) { if (x == 0) { return 0; } else { return 100 / x; } }")
+        func = self.interpreter.global_env.get('safe')
+        self.assertMatchesRows(func, self.xs)
+        self.assertEqual(self.interpreter.stats()['batch']['fallbacks'], 0)
+
+    def test_division_by_zero_still_raises(self):
+        func = define(self.interpreter, "lambda x -> 1 / x")
+        with self.assertRaises(ZeroDivisionError):
+            self.interpreter.map_batch(func, self.xs)
+
+    def test_bool_columns(self):
+        func = define(self.interpreter, "lambda a, b -> a + b")
+        flags = np.array([True, False, True])
+        result = self.interpreter.map_batch(func, flags, flags)
+        self.assertEqual(result.tolist(), [2, 0, 2])
+
+    def test_overflow_falls_back_to_python_ints(self):
+        func = define(self.interpreter, "lambda x -> x * x * x")
+        result = self.interpreter.map_batch(func, np.array([2 ** 40, 3]))
+        self.assertEqual(result.tolist(), [2 ** 120, 27])
+        self.assertEqual(self.interpreter.stats()['batch']['fallbacks'], 1)
+
+    def test_calls_fall_back_per_row(self):
+        define(self.interpreter, "defun double(x) { return x * 2; }")
+        func = define(self.interpreter, "lambda x -> double(x) + 1")
+        self.assertMatchesRows(func, self.xs)
+        self.assertEqual(self.interpreter.stats()['batch']['fallback_rows'], len(self.xs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from lexer import Lexer
+from parser import Parser
+from bytecode import BytecodeCompiler, disassemble
+from vm import VM
+
+def compile_source(source):
+    return BytecodeCompiler().compile(Parser(Lexer(source)).parse())
+
+def run(source):
+    return VM().run(compile_source(source))
+
+class TestVM(unittest.TestCase):
+    def test_arithmetic(self):
+        self.assertEqual(run("(3 + 4) * (2 - 1)"), 7)
+        self.assertEqual(run("-7 / 2"), -4)
+        self.assertEqual(run("-7 % 3"), 2)
+
+    def test_short_circuit(self):
+        self.assertEqual(run("0 && undefined_name"), 0)
+        self.assertEqual(run("5 || undefined_name"), 5)
+        self.assertEqual(run("(1 > 2) || (2 > 1)"), True)
+
+    def test_factorial(self):
+        source = """
+        defun factorial(n) {
+          if (n == 0) {
+            return 1;
+          } else {
+            return n * factorial(n - 1);
+          }
+        }
+        factorial(5)
+        """
+        self.assertEqual(run(source), 120)
+
+    def test_closures(self):
+        source = """
+        defun adder(n) { return lambda x -> x + n; }
+        defun apply(f, x) { return f(x); }
+        apply(adder(10), 32)
+        """
+        self.assertEqual(run(source), 42)
+
+    def test_deep_recursion(self):
+        source = """
+        defun depth(n) { if (n == 0) { return 0; } else { return 1 + depth(n - 1); } }
+        depth(20000)
+        """
+        self.assertEqual(run(source), 20000)
+
+    def test_disassemble(self):
+        listing = disassemble(compile_source("defun inc(x) { return x + 1; } inc(1)"))
+        self.assertIn('DEFINE_FUNCTION', listing)
+        self.assertIn('Disassembly of inc(x):', listing)
+        self.assertIn('BINARY_ADD', listing)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,342 @@
+import builtins
+import hashlib
+import keyword
+import marshal
+from types import FunctionType
+from lexer import TokenType
+from parser import AST, BinOp, Call, Function, If, Lambda, Program, Return, Sequence, Var
+from memo import LRUCache
+from sequences import BUILTINS
+import ast_cache
+
+# Python precedence levels, lowest first; a Num, Var or call is an atom.
+OR, AND, NOT, COMPARE, SUM, PRODUCT, UNARY, ATOM = range(8)
+
+BINARY = {
+    TokenType.OR: ('or', OR),
+    TokenType.AND: ('and', AND),
+    TokenType.EQUAL: ('==', COMPARE),
+    TokenType.NOT_EQUAL: ('!=', COMPARE),
+    TokenType.GREATER: ('>', COMPARE),
+    TokenType.LESS: ('<', COMPARE),
+    TokenType.GREATER_EQUAL: ('>=', COMPARE),
+    TokenType.LESS_EQUAL: ('<=', COMPARE),
+    TokenType.PLUS: ('+', SUM),
+    TokenType.MINUS: ('-', SUM),
+    TokenType.MULTIPLY: ('*', PRODUCT),
+    TokenType.DIVIDE: ('//', PRODUCT),
+    TokenType.MODULO: ('%', PRODUCT),
+}
+
+UNARY_OPS = {
+    TokenType.PLUS: ('+', UNARY),
+    TokenType.MINUS: ('-', UNARY),
+    TokenType.NOT: ('not ', NOT),
+}
+
+PROGRAM_NAME = '__program__'
+# CPython's compiler recurses on expression depth, so longer left-nested
+# chains (1 + 2 + ... + n) are cut into temporaries of at most this depth.
+CHUNK = 100
+
+def mangle(name):
+    """Map a lambda identifier to a Python one that cannot hit a keyword, a builtin or a helper.
+
+    Mangled names end in '_' and no name is left alone that does, so the
+    mapping is one to one.
+    """
+    if keyword.iskeyword(name) or keyword.issoftkeyword(name) or hasattr(builtins, name) \
+            or name.endswith('_') or name.startswith('__'):
+        return name + '_'
+    return name
+
+def spine_length(node):
+    length = 0
+    while isinstance(node, BinOp):
+        node = node.left
+        length += 1
+    return length
+
+def contains_closures(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (Function, Lambda)):
+            return True
+        stack.extend(ast_cache.children(node))
+    return False
+
+def local_functions(node):
+    if isinstance(node, Function):
+        yield node
+    elif isinstance(node, If):
+        yield from local_functions(node.then_branch)
+        if node.else_branch is not None:
+            yield from local_functions(node.else_branch)
+    elif isinstance(node, Sequence):
+        for statement in node.statements:
+            yield from local_functions(statement)
+
+class PythonTranspiler:
+    """Translate an AST into the source of one Python function, __program__.
+
+    defun becomes def, lambda becomes lambda, && and || become and and or,
+    / becomes // and % stays %, so values and errors follow Python's own
+    int semantics just like the interpreter's. Top-level defuns are declared
+    global, so they land in the namespace the program runs in. A defun whose
+    body makes direct tail calls to itself, and creates no closures that
+    could capture its parameters, is turned into a while loop so that tail
+    recursion does not grow the Python stack. Other calls are plain Python
+    calls and errors are Python's own (TypeError for a bad call, NameError
+    for an unknown name).
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.temporaries = 0
+        self.hoisted = {}
+        self.depth = 0
+        self.statement_mode = False
+
+    def transpile(self, node):
+        # A lone statement reports whether it ended in a return, since
+        # Interpreter.eval hands that back as a Return for run_stream.
+        self.statement_mode = not isinstance(node, Program)
+        self.emit(0, f'def {PROGRAM_NAME}():')
+        names = sorted({mangle(func.name) for func in self.top_level_functions(node)})
+        if names:
+            self.emit(1, f'global {", ".join(names)}')
+        if isinstance(node, Program):
+            statements = node.statements
+        else:
+            statements = [node]
+        self.block(statements, 1, tail=True, loop=None)
+        return '\n'.join(self.lines) + '\n'
+
+    def top_level_functions(self, node):
+        if isinstance(node, Program):
+            for statement in node.statements:
+                yield from local_functions(statement)
+        else:
+            yield from local_functions(node)
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def block(self, statements, indent, tail, loop):
+        if isinstance(statements, Sequence):
+            statements = statements.statements
+        elif not isinstance(statements, list):
+            statements = [statements]
+        for index, statement in enumerate(statements):
+            self.statement(statement, indent, tail and index == len(statements) - 1, loop)
+        if not statements:
+            if tail:
+                self.emit_return(indent, 'None')
+            else:
+                self.emit(indent, 'pass')
+
+    def emit_return(self, indent, text, explicit=False):
+        if self.statement_mode and self.depth == 0:
+            text = f'({text}, {explicit})'
+        self.emit(indent, f'return {text}')
+
+    def statement(self, node, indent, tail, loop):
+        """Emit one statement; in tail position its value is returned."""
+        if isinstance(node, Return):
+            self.returned(node.value, indent, loop, True)
+        elif isinstance(node, Function):
+            self.function(node, indent)
+            if tail:
+                self.emit_return(indent, mangle(node.name))
+        elif isinstance(node, If):
+            if tail and loop is None and self.is_simple_branch(node.then_branch) \
+                    and self.is_simple_branch(node.else_branch) \
+                    and isinstance(node.then_branch, Return) == isinstance(node.else_branch, Return):
+                condition = self.expression(node.condition, indent)
+                then_value = self.operand(self.branch_value(node.then_branch), NOT)
+                else_value = self.operand(self.branch_value(node.else_branch), NOT)
+                self.emit_return(indent, f'{then_value} if {condition} else {else_value}',
+                                 isinstance(node.then_branch, Return))
+                return
+            self.emit(indent, f'if {self.expression(node.condition, indent)}:')
+            self.block(node.then_branch, indent + 1, tail, loop)
+            if node.else_branch is not None:
+                self.emit(indent, 'else:')
+                self.block(node.else_branch, indent + 1, tail, loop)
+            elif tail:
+                self.emit_return(indent, 'None')
+        elif isinstance(node, Sequence):
+            self.block(node.statements, indent, tail, loop)
+        elif tail:
+            self.returned(node, indent, loop)
+        else:
+            self.emit(indent, self.expression(node, indent))
+
+    def is_simple_branch(self, node):
+        # Branches of a conditional expression cannot be hoisted from, so
+        # only short ones qualify.
+        if isinstance(node, Return):
+            node = node.value
+        return isinstance(node, AST) and not isinstance(node, (If, Function, Sequence, Return)) \
+            and spine_length(node) < CHUNK
+
+    def branch_value(self, node):
+        return node.value if isinstance(node, Return) else node
+
+    def returned(self, node, indent, loop, explicit=False):
+        if loop is not None and self.is_self_call(node, loop):
+            # A tail call to the enclosing defun: rebind the parameters and go round again.
+            name, params = loop
+            args = [self.operand(arg, OR) for arg in node.args]
+            if params:
+                self.emit(indent, f'{", ".join(params)} = {", ".join(args)}')
+            self.emit(indent, 'continue')
+            return
+        self.emit_return(indent, self.expression(node, indent), explicit)
+
+    def is_self_call(self, node, loop):
+        name, params = loop
+        return (isinstance(node, Call) and isinstance(node.func, Var) and mangle(node.func.value) == name
+                and len(node.args) == len(params))
+
+    def function(self, node, indent):
+        name = mangle(node.name)
+        params = [mangle(param) for param in node.params]
+        self.emit(indent, f'def {name}({", ".join(params)}):')
+        self.depth += 1
+        if name not in params and self.has_self_tail_call(node.body, (name, params)) \
+                and not contains_closures(node.body):
+            self.emit(indent + 1, 'while True:')
+            self.block(node.body, indent + 2, True, (name, params))
+        else:
+            self.block(node.body, indent + 1, True, None)
+        self.depth -= 1
+
+    def has_self_tail_call(self, node, loop):
+        if isinstance(node, Return):
+            return self.has_self_tail_call(node.value, loop)
+        if isinstance(node, If):
+            return self.has_self_tail_call(node.then_branch, loop) or \
+                (node.else_branch is not None and self.has_self_tail_call(node.else_branch, loop))
+        if isinstance(node, Sequence):
+            # Every statement can return early, so any of them may hold a tail call.
+            return any(self.has_self_tail_call(statement, loop) for statement in node.statements
+                       if isinstance(statement, (Return, If)) or statement is node.statements[-1])
+        return self.is_self_call(node, loop)
+
+    def expression(self, node, indent, context=OR):
+        """Return Python source for an expression, parenthesized for the given precedence context."""
+        self.hoist(node, indent)
+        text, precedence = self.translate(node)
+        return f'({text})' if precedence < context else text
+
+    def hoist(self, node, indent):
+        # The left spine of an expression is evaluated before anything else
+        # in it, so moving its lower part into an earlier assignment keeps
+        # the order of evaluation and of any exceptions.
+        spine = []
+        while isinstance(node, BinOp) and id(node) not in self.hoisted:
+            spine.append(node)
+            node = node.left
+        for start in range(len(spine) - CHUNK, 0, -CHUNK):
+            chunk = spine[start]
+            self.temporaries += 1
+            temporary = f'__t{self.temporaries}'
+            self.emit(indent, f'{temporary} = {self.translate(chunk)[0]}')
+            self.hoisted[id(chunk)] = temporary
+
+    def translate(self, node):
+        temporary = self.hoisted.get(id(node))
+        if temporary is not None:
+            return temporary, ATOM
+        method_name = f'translate_{type(node).__name__}'
+        translator = getattr(self, method_name, None)
+        if translator is None:
+            raise Exception(f'Cannot translate {type(node).__name__} to a Python expression')
+        return translator(node)
+
+    def operand(self, node, context):
+        text, precedence = self.translate(node)
+        return f'({text})' if precedence < context else text
+
+    def translate_Num(self, node):
+        return repr(node.value), ATOM
+
+    def translate_Bool(self, node):
+        return repr(node.value), ATOM
+
+    def translate_Var(self, node):
+        return mangle(node.value), ATOM
+
+    def translate_BinOp(self, node):
+        symbol, precedence = BINARY[node.op]
+        # Python chains comparisons and binds and tighter than or; the
+        # language does neither, so parenthesize accordingly.
+        left_context = precedence + 1 if precedence == COMPARE else precedence
+        left = self.operand(node.left, left_context)
+        right = self.operand(node.right, precedence + 1)
+        return f'{left} {symbol} {right}', precedence
+
+    def translate_UnaryOp(self, node):
+        symbol, precedence = UNARY_OPS[node.op]
+        return f'{symbol}{self.operand(node.expr, precedence)}', precedence
+
+    def translate_Lambda(self, node):
+        params = ', '.join(mangle(param) for param in node.params)
+        return f'lambda {params}: {self.operand(node.body, OR)}', -1
+
+    def translate_Call(self, node):
+        args = ', '.join(self.operand(arg, OR) for arg in node.args)
+        return f'{self.operand(node.func, ATOM)}({args})', ATOM
+
+def source_key(node):
+    return hashlib.sha256(marshal.dumps(ast_cache.encode(node))).digest()
+
+class PythonBackend:
+    """Run programs as generated Python code.
+
+    Compiled code objects are kept in an LRU cache keyed by a hash of the
+    AST's structure, so parsing the same script again (a warm batch worker,
+    a REPL line typed twice) skips transpiling and compile() entirely.
+    The global environment is a plain dict that top-level defuns write to.
+    """
+
+    def __init__(self, cache_size=256):
+        self.global_env = self.new_globals()
+        self.codes = LRUCache(cache_size)
+        self.hits = 0
+        self.misses = 0
+
+    def new_globals(self):
+        # Callbacks are plain Python functions here, so builtins need no runtime.
+        return {mangle(name): (lambda builtin: lambda *args: builtin.apply(None, args))(builtin)
+                for name, builtin in BUILTINS.items()}
+
+    def source(self, node):
+        return PythonTranspiler().transpile(node)
+
+    def compile(self, node):
+        key = source_key(node)
+        code = self.codes.get(key)
+        if code is not None:
+            self.hits += 1
+            return code
+        self.misses += 1
+        namespace = {}
+        exec(compile(self.source(node), '<lambda>', 'exec'), namespace)
+        code = namespace[PROGRAM_NAME].__code__
+        self.codes.put(key, code)
+        return code
+
+    def eval(self, node, env=None):
+        if env is None:
+            env = self.global_env
+        result = FunctionType(self.compile(node), env)()
+        if isinstance(node, Program):
+            return result
+        value, returned = result
+        return Return(value) if returned else value
+
+    def stats(self):
+        return {'code_cache': {'hits': self.hits, 'misses': self.misses, 'entries': len(self.codes)}}
@@ -0,0 +1,343 @@
+from lexer import TokenType
+from parser import BinOp, Bool, Call, Function, If, Lambda, Num, Program, Return, Sequence, UnaryOp, Var
+
+INT = 'int'
+BOOL = 'bool'
+
+ARITHMETIC = (TokenType.PLUS, TokenType.MINUS, TokenType.MULTIPLY, TokenType.DIVIDE, TokenType.MODULO)
+EQUALITY = (TokenType.EQUAL, TokenType.NOT_EQUAL)
+LOGICAL = (TokenType.AND, TokenType.OR)
+
+SYMBOLS = {
+    TokenType.PLUS: '+', TokenType.MINUS: '-', TokenType.MULTIPLY: '*', TokenType.DIVIDE: '/',
+    TokenType.MODULO: '%', TokenType.AND: '&&', TokenType.OR: '||', TokenType.NOT: '!',
+    TokenType.EQUAL: '==', TokenType.NOT_EQUAL: '!=', TokenType.GREATER: '>', TokenType.LESS: '<',
+    TokenType.GREATER_EQUAL: '>=', TokenType.LESS_EQUAL: '<=',
+}
+
+class TypeCheckError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('\n'.join(errors))
+
+class TypeVar:
+    __slots__ = ('instance',)
+
+    def __init__(self):
+        self.instance = None
+
+class FunctionType:
+    __slots__ = ('params', 'result')
+
+    def __init__(self, params, result):
+        self.params = params
+        self.result = result
+
+class ListType:
+    """The type of a sequence from the builtins in sequences.py."""
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+def builtin_type(name):
+    """A fresh instance of the polymorphic type of the builtin called name, or None."""
+    a, b = TypeVar(), TypeVar()
+    if name == 'range':
+        return FunctionType([INT, INT], ListType(INT))
+    if name == 'map':
+        return FunctionType([FunctionType([a], b), ListType(a)], ListType(b))
+    if name == 'filter':
+        return FunctionType([FunctionType([a], BOOL), ListType(a)], ListType(a))
+    if name == 'reduce':
+        return FunctionType([FunctionType([a, b], a), ListType(b), a], a)
+    if name == 'list':
+        return FunctionType([ListType(a)], ListType(a))
+    if name == 'length':
+        return FunctionType([ListType(a)], INT)
+    return None
+
+def prune(t):
+    while type(t) is TypeVar and t.instance is not None:
+        t = t.instance
+    return t
+
+def resolve(t):
+    """t with every bound type variable replaced by what it stands for."""
+    t = prune(t)
+    if type(t) is FunctionType:
+        return FunctionType([resolve(param) for param in t.params], resolve(t.result))
+    if type(t) is ListType:
+        return ListType(resolve(t.element))
+    return t
+
+def occurs(var, t):
+    t = prune(t)
+    if t is var:
+        return True
+    if type(t) is ListType:
+        return occurs(var, t.element)
+    return type(t) is FunctionType and (any(occurs(var, param) for param in t.params) or occurs(var, t.result))
+
+def unify(a, b):
+    a, b = prune(a), prune(b)
+    if a is b:
+        return True
+    if type(a) is TypeVar:
+        if occurs(a, b):
+            return False
+        a.instance = b
+        return True
+    if type(b) is TypeVar:
+        return unify(b, a)
+    if type(a) is FunctionType and type(b) is FunctionType:
+        if len(a.params) != len(b.params):
+            return False
+        # Keep going after a mismatch so the other positions still get unified.
+        same = [unify(x, y) for x, y in zip(a.params, b.params)]
+        return unify(a.result, b.result) and all(same)
+    if type(a) is ListType and type(b) is ListType:
+        return unify(a.element, b.element)
+    return a == b
+
+def show(t, names=None):
+    if names is None:
+        names = {}
+    t = prune(t)
+    if type(t) is TypeVar:
+        if t not in names:
+            names[t] = chr(ord('a') + len(names) % 26) + ("'" * (len(names) // 26))
+        return names[t]
+    if type(t) is FunctionType:
+        return f'({", ".join(show(param, names) for param in t.params)}) -> {show(t.result, names)}'
+    if type(t) is ListType:
+        return f'[{show(t.element, names)}]'
+    return t
+
+def describe(node):
+    """Short source-like text for an expression, used in error messages."""
+    if isinstance(node, Num):
+        text = str(node.value)
+    elif isinstance(node, Bool):
+        text = 'true' if node.value else 'false'
+    elif isinstance(node, Var):
+        text = node.value
+    elif isinstance(node, BinOp):
+        text = f'({describe(node.left)} {SYMBOLS[node.op]} {describe(node.right)})'
+    elif isinstance(node, UnaryOp):
+        text = f'{SYMBOLS[node.op]}{describe(node.expr)}'
+    elif isinstance(node, Call):
+        text = f'{describe(node.func)}({", ".join(describe(arg) for arg in node.args)})'
+    elif isinstance(node, Lambda):
+        text = f'lambda {", ".join(node.params)} -> ...'
+    elif isinstance(node, Function):
+        text = f'defun {node.name}'
+    elif isinstance(node, Return):
+        text = f'return {describe(node.value)}'
+    elif isinstance(node, If):
+        condition = describe(node.condition)
+        text = f'if {condition}' if condition.startswith('(') else f'if ({condition})'
+    else:
+        text = type(node).__name__
+    return text if len(text) <= 60 else text[:57] + '...'
+
+def local_functions(node):
+    if isinstance(node, Function):
+        yield node
+    elif isinstance(node, If):
+        yield from local_functions(node.then_branch)
+        if node.else_branch is not None:
+            yield from local_functions(node.else_branch)
+    elif isinstance(node, Sequence):
+        for statement in node.statements:
+            yield from local_functions(statement)
+
+class TypeChecker:
+    """Infer int, bool and function types for a program before it runs.
+
+    Every expression gets a type and every defun, lambda and parameter a
+    type variable; the operators, conditions, returns and calls add
+    equations between them, which are solved by unification. Types are
+    monomorphic: a function, including its uses across calls, has a single
+    type, so one used at two different types is reported even if each call
+    would work. The checker is stricter than the interpreter in the same
+    way elsewhere: conditions and the operands of && and || must be bool,
+    and arithmetic never takes a bool. Builtins are the exception to
+    monomorphism: each use of map, reduce and the rest gets a fresh instance
+    of its type, and sequences have list types such as [int]. An if without
+    an else is reported where its value is used, since it may have none.
+
+    check() returns a dict from each expression node to its resolved type,
+    which backends can use to specialize code, or raises TypeCheckError
+    listing every error found. known holds the names of globals defined
+    outside the program, such as those of a preloaded image. Every use of
+    one gets a fresh type variable, so those uses go unchecked. The result
+    then leaves out function types: an outside function can flow to any
+    place one was inferred for, and calls there must keep their checks.
+    """
+
+    def __init__(self, known=()):
+        self.known = known
+        self.foreign = False
+        self.types = {}
+        self.errors = []
+        self.scopes = []
+        self.results = []
+        self.functions = []
+
+    def check(self, node):
+        statements = node.statements if isinstance(node, Program) else [node]
+        self.scopes.append(self.hoist(statements))
+        self.results.append(TypeVar())
+        self.statements(statements, True)
+        if self.errors:
+            raise TypeCheckError(self.errors)
+        types = {node: resolve(t) for node, t in self.types.items()}
+        if self.foreign:
+            return {node: t for node, t in types.items() if type(t) is not FunctionType}
+        return types
+
+    def hoist(self, statements):
+        scope = {}
+        for statement in statements:
+            for func in local_functions(statement):
+                if func.name not in scope:
+                    scope[func.name] = TypeVar()
+        return scope
+
+    def error(self, message):
+        where = f'in {self.functions[-1]}: ' if self.functions else ''
+        self.errors.append(where + message)
+
+    def expect(self, node, actual, expected):
+        if not unify(actual, expected):
+            names = {}
+            self.error(f'{describe(node)} is {show(actual, names)}, expected {show(expected, names)}')
+
+    def infer(self, node, used=True):
+        method_name = f'infer_{type(node).__name__}'
+        t = getattr(self, method_name, self.generic_infer)(node, used)
+        self.types[node] = t
+        return t
+
+    def generic_infer(self, node, used):
+        raise Exception(f'No infer_{type(node).__name__} method')
+
+    def statements(self, statements, used):
+        t = TypeVar()
+        for index, statement in enumerate(statements):
+            t = self.infer(statement, used and index == len(statements) - 1)
+        return t
+
+    def infer_Program(self, node, used):
+        return self.statements(node.statements, used)
+
+    def infer_Sequence(self, node, used):
+        return self.statements(node.statements, used)
+
+    def infer_Num(self, node, used):
+        return INT
+
+    def infer_Bool(self, node, used):
+        return BOOL
+
+    def infer_Var(self, node, used):
+        for scope in reversed(self.scopes):
+            if node.value in scope:
+                return scope[node.value]
+        t = builtin_type(node.value)
+        if t is not None:
+            return t
+        if node.value in self.known:
+            self.foreign = True
+            return TypeVar()
+        self.error(f'Undefined variable: {node.value}')
+        return TypeVar()
+
+    def infer_BinOp(self, node, used):
+        left = self.infer(node.left)
+        right = self.infer(node.right)
+        if node.op in EQUALITY:
+            if not unify(left, right):
+                names = {}
+                self.error(f'{describe(node)} compares {show(left, names)} with {show(right, names)}')
+            return BOOL
+        operand = BOOL if node.op in LOGICAL else INT
+        self.expect(node.left, left, operand)
+        self.expect(node.right, right, operand)
+        return INT if node.op in ARITHMETIC else BOOL
+
+    def infer_UnaryOp(self, node, used):
+        operand = BOOL if node.op == TokenType.NOT else INT
+        self.expect(node.expr, self.infer(node.expr), operand)
+        return operand
+
+    def infer_If(self, node, used):
+        self.expect(node.condition, self.infer(node.condition), BOOL)
+        then_type = self.infer(node.then_branch, used)
+        if node.else_branch is None:
+            # A false condition gives None, which no type here stands for.
+            if used:
+                self.error(f'{describe(node)} has no else, but its value is used')
+            return then_type
+        errors = len(self.errors)
+        else_type = self.infer(node.else_branch, used)
+        # Branches that return were already checked against the result; say nothing twice.
+        if used and not unify(then_type, else_type) and len(self.errors) == errors:
+            names = {}
+            self.error(f'the branches of {describe(node)} are {show(then_type, names)} and {show(else_type, names)}')
+        return then_type
+
+    def infer_Return(self, node, used):
+        t = self.infer(node.value)
+        if not unify(t, self.results[-1]):
+            names = {}
+            where = self.functions[-1] if self.functions else 'the program'
+            self.error(f'{describe(node)} is {show(t, names)}, but {where} returns {show(self.results[-1], names)}')
+        return t
+
+    def infer_Call(self, node, used):
+        func = self.infer(node.func)
+        args = [self.infer(arg) for arg in node.args]
+        result = TypeVar()
+        expected = FunctionType(args, result)
+        if not unify(func, expected):
+            names = {}
+            self.error(f'{describe(node)}: {describe(node.func)} is {show(func, names)}, '
+                       f'expected {show(expected, names)}')
+        return result
+
+    def infer_Function(self, node, used):
+        t = self.function(node, node.name)
+        for scope in reversed(self.scopes):
+            if node.name in scope:
+                self.expect(node, scope[node.name], t)
+                return scope[node.name]
+        return t
+
+    def infer_Lambda(self, node, used):
+        return self.function(node, 'lambda')
+
+    def function(self, node, name):
+        params = [TypeVar() for _ in node.params]
+        scope = dict(zip(node.params, params))
+        for local, t in self.hoist([node.body]).items():
+            # A local defun named like a parameter takes over its slot.
+            scope[local] = t
+        result = TypeVar()
+        self.scopes.append(scope)
+        self.results.append(result)
+        self.functions.append(name)
+        try:
+            if not unify(self.infer(node.body), result):
+                names = {}
+                self.error(f'the body of {name} ends in {show(self.types[node.body], names)}, '
+                           f'but it returns {show(result, names)}')
+        finally:
+            self.scopes.pop()
+            self.results.pop()
+            self.functions.pop()
+        return FunctionType(params, result)
+
+def check(node, known=()):
+    return TypeChecker(known).check(node)
@@ -0,0 +1,286 @@
+from weakref import WeakKeyDictionary
+from lexer import TokenType
+from parser import Function
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+# Products this large might not fit in an int64; checked in floating point
+# with headroom for rounding, so a false alarm only costs a per-row fallback.
+PRODUCT_LIMIT = 2.0 ** 62
+
+class NotVectorizable(Exception):
+    """The function body uses something that has no array translation."""
+
+class Overflow(Exception):
+    """An int64 operation left the range that Python ints would have kept."""
+
+def truthy(values, kind):
+    return values if kind == 'bool' else values != 0
+
+def restrict(mask, condition):
+    return condition if mask is None else mask & condition
+
+def any_active(flags, mask):
+    if mask is not None:
+        flags = flags & mask
+    return bool(np.any(flags))
+
+def as_int(values, kind):
+    """Python arithmetic on a bool gives an int, numpy's does not, so convert first."""
+    if kind == 'bool':
+        return np.asarray(values, dtype=np.int64)
+    return values
+
+class KernelCompiler:
+    """Translate a branch-free function body into closures over numpy arrays.
+
+    Each translated node is a (kernel, kind) pair: kernel(columns, mask) returns
+    an array or scalar, kind is 'int' or 'bool'. mask marks the rows whose
+    value is actually used; rows outside it belong to an If branch or a
+    short-circuited operand that Python would never have evaluated, so they
+    may not raise ZeroDivisionError or trigger an overflow fallback.
+    """
+
+    def __init__(self, func, kinds):
+        self.func = func
+        self.params = {param: index for index, param in enumerate(func.params)}
+        self.kinds = kinds
+
+    def compile(self):
+        return self.translate(self.func.body)
+
+    def translate(self, node):
+        method_name = f'translate_{type(node).__name__}'
+        translator = getattr(self, method_name, None)
+        if translator is None:
+            raise NotVectorizable(type(node).__name__)
+        return translator(node)
+
+    def translate_Num(self, node):
+        value = node.value
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise NotVectorizable('integer constant out of int64 range')
+        return (lambda columns, mask: value), 'int'
+
+    def translate_Bool(self, node):
+        value = node.value
+        return (lambda columns, mask: value), 'bool'
+
+    def translate_Var(self, node):
+        name = node.value
+        if name in self.params:
+            index = self.params[name]
+            return (lambda columns, mask: columns[index]), self.kinds[index]
+        try:
+            value = self.func.env.get(name)
+        except Exception:
+            raise NotVectorizable(f'undefined name {name}')
+        if type(value) is bool:
+            return (lambda columns, mask: value), 'bool'
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            return (lambda columns, mask: value), 'int'
+        raise NotVectorizable(f'free name {name} is not a number')
+
+    def translate_Return(self, node):
+        return self.translate(node.value)
+
+    def translate_UnaryOp(self, node):
+        expr, kind = self.translate(node.expr)
+        op = node.op
+        if op == TokenType.NOT:
+            return (lambda columns, mask: np.logical_not(truthy(expr(columns, mask), kind))), 'bool'
+        if op == TokenType.PLUS:
+            return (lambda columns, mask: as_int(expr(columns, mask), kind)), 'int'
+
+        def negate(columns, mask):
+            values = as_int(expr(columns, mask), kind)
+            if any_active(np.equal(values, INT64_MIN), mask):
+                raise Overflow()
+            return np.negative(values)
+        return negate, 'int'
+
+    def translate_If(self, node):
+        if node.else_branch is None:
+            raise NotVectorizable('If without else')
+        condition, condition_kind = self.translate(node.condition)
+        then_branch, then_kind = self.translate(node.then_branch)
+        else_branch, else_kind = self.translate(node.else_branch)
+        if then_kind != else_kind:
+            raise NotVectorizable('If branches of different types')
+
+        def select(columns, mask):
+            chosen = truthy(condition(columns, mask), condition_kind)
+            return np.where(chosen, then_branch(columns, restrict(mask, chosen)),
+                            else_branch(columns, restrict(mask, np.logical_not(chosen))))
+        return select, then_kind
+
+    def translate_BinOp(self, node):
+        op = node.op
+        left, left_kind = self.translate(node.left)
+        right, right_kind = self.translate(node.right)
+        if op in (TokenType.AND, TokenType.OR):
+            if left_kind != right_kind:
+                raise NotVectorizable('&& / || over different types')
+            is_and = op == TokenType.AND
+
+            def logical(columns, mask):
+                # Python's and/or return one of the operands, not a bool.
+                first = left(columns, mask)
+                decided = truthy(first, left_kind)
+                if is_and:
+                    return np.where(decided, right(columns, restrict(mask, decided)), first)
+                return np.where(decided, first, right(columns, restrict(mask, np.logical_not(decided))))
+            return logical, left_kind
+        if op in COMPARISONS:
+            compare = COMPARISONS[op]
+            return (lambda columns, mask: compare(left(columns, mask), right(columns, mask))), 'bool'
+        arithmetic = ARITHMETIC[op]
+
+        def apply(columns, mask):
+            a = as_int(left(columns, mask), left_kind)
+            b = as_int(right(columns, mask), right_kind)
+            return arithmetic(a, b, mask)
+        return apply, 'int'
+
+def checked_add(a, b, mask):
+    with np.errstate(over='ignore'):
+        result = np.add(a, b, dtype=np.int64)
+    if any_active(((a ^ result) & (b ^ result)) < 0, mask):
+        raise Overflow()
+    return result
+
+def checked_subtract(a, b, mask):
+    with np.errstate(over='ignore'):
+        result = np.subtract(a, b, dtype=np.int64)
+    if any_active(((a ^ b) & (a ^ result)) < 0, mask):
+        raise Overflow()
+    return result
+
+def checked_multiply(a, b, mask):
+    estimate = np.abs(np.multiply(a, b, dtype=np.float64))
+    if any_active(estimate >= PRODUCT_LIMIT, mask):
+        raise Overflow()
+    return np.multiply(a, b, dtype=np.int64)
+
+def divisor(b, mask):
+    zero = np.equal(b, 0)
+    if any_active(zero, mask):
+        raise ZeroDivisionError('integer division or modulo by zero')
+    # Rows outside the mask are thrown away; keep them from dividing by zero.
+    return np.where(zero, 1, b)
+
+def checked_floor_divide(a, b, mask):
+    b = divisor(b, mask)
+    if any_active(np.equal(a, INT64_MIN) & np.equal(b, -1), mask):
+        raise Overflow()
+    with np.errstate(over='ignore'):
+        # numpy floors like Python does, including for negative operands.
+        return np.floor_divide(a, b, dtype=np.int64)
+
+def checked_modulo(a, b, mask):
+    return np.remainder(a, divisor(b, mask), dtype=np.int64)
+
+ARITHMETIC = {
+    TokenType.PLUS: checked_add,
+    TokenType.MINUS: checked_subtract,
+    TokenType.MULTIPLY: checked_multiply,
+    TokenType.DIVIDE: checked_floor_divide,
+    TokenType.MODULO: checked_modulo,
+}
+
+COMPARISONS = {}
+if np is not None:
+    COMPARISONS = {
+        TokenType.EQUAL: np.equal,
+        TokenType.NOT_EQUAL: np.not_equal,
+        TokenType.GREATER: np.greater,
+        TokenType.LESS: np.less,
+        TokenType.GREATER_EQUAL: np.greater_equal,
+        TokenType.LESS_EQUAL: np.less_equal,
+    }
+
+def column_kind(column):
+    if column.ndim != 1:
+        return None
+    if column.dtype == np.bool_:
+        return 'bool'
+    if np.issubdtype(column.dtype, np.integer) and column.dtype != np.uint64:
+        return 'int'
+    return None
+
+def to_array(results):
+    """Pack per-row Python results, keeping ints, bools and big ints exact."""
+    if np is None:
+        return results
+    if all(type(value) is bool for value in results):
+        return np.array(results, dtype=np.bool_)
+    if all(type(value) is int and INT64_MIN <= value <= INT64_MAX for value in results):
+        return np.array(results, dtype=np.int64)
+    array = np.empty(len(results), dtype=object)
+    array[:] = results
+    return array
+
+class BatchEvaluator:
+    def __init__(self):
+        # Keyed weakly by function, like Memoizer.caches, so batching a
+        # lambda does not keep it alive; kernels close over no Function.
+        self.kernels = WeakKeyDictionary()
+        self.vectorized = 0
+        self.fallbacks = 0
+        self.fallback_rows = 0
+
+    def kernel(self, func, kinds):
+        kernels = self.kernels.get(func)
+        if kernels is None:
+            kernels = self.kernels[func] = {}
+        if kinds not in kernels:
+            try:
+                kernels[kinds] = KernelCompiler(func, kinds).compile()
+            except NotVectorizable:
+                kernels[kinds] = None
+        return kernels[kinds]
+
+    def map(self, interpreter, func, columns):
+        if not isinstance(func, Function):
+            raise Exception(f'{func} is not a function')
+        if len(func.params) != len(columns):
+            raise Exception('Argument count mismatch')
+        if np is not None and columns:
+            arrays = [np.asarray(column) for column in columns]
+            kinds = tuple(column_kind(array) for array in arrays)
+            length = len(arrays[0])
+            if None not in kinds and all(len(array) == length for array in arrays):
+                arrays = [array if kind == 'bool' else array.astype(np.int64, copy=False)
+                          for array, kind in zip(arrays, kinds)]
+                translated = self.kernel(func, kinds)
+                if translated is not None:
+                    kernel, kind = translated
+                    try:
+                        with np.errstate(over='ignore'):
+                            result = kernel(arrays, None)
+                    except Overflow:
+                        pass
+                    else:
+                        self.vectorized += 1
+                        dtype = np.bool_ if kind == 'bool' else np.int64
+                        return np.broadcast_to(np.asarray(result, dtype=dtype), (length,)).copy()
+        return self.map_rows(interpreter, func, columns)
+
+    def map_rows(self, interpreter, func, columns):
+        rows = [column.tolist() if hasattr(column, 'tolist') else list(column) for column in columns]
+        results = [interpreter.call(func, list(args)) for args in zip(*rows)]
+        self.fallbacks += 1
+        self.fallback_rows += len(results)
+        return to_array(results)
+
+    def stats(self):
+        return {
+            'vectorized': self.vectorized,
+            'fallbacks': self.fallbacks,
+            'fallback_rows': self.fallback_rows,
+        }
@@ -0,0 +1,157 @@
+from environment import Environment
+from parser import Function
+from bytecode import (
+    BytecodeCompiler, LOAD_CONST, LOAD_NAME, BINARY_ADD, BINARY_SUBTRACT, BINARY_MULTIPLY,
+    BINARY_FLOOR_DIVIDE, BINARY_MODULO, COMPARE_EQUAL, COMPARE_NOT_EQUAL, COMPARE_GREATER,
+    COMPARE_LESS, COMPARE_GREATER_EQUAL, COMPARE_LESS_EQUAL, UNARY_POSITIVE, UNARY_NEGATIVE,
+    UNARY_NOT, JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, MAKE_FUNCTION,
+    DEFINE_FUNCTION, CALL, RETURN_VALUE, POP_TOP,
+)
+
+class VM:
+    """Stack machine running bytecode in a single dispatch loop.
+
+    Calls push an explicit frame instead of recursing in Python, so the depth of
+    recursion in the program is bounded by memory rather than the Python stack.
+    """
+
+    def __init__(self):
+        self.global_env = self.new_globals()
+        self.compiler = BytecodeCompiler()
+
+    def new_globals(self):
+        # The VM has no builtins; its calls only know compiled functions.
+        return Environment()
+
+    def compile(self, node):
+        return self.compiler.compile(node)
+
+    def eval(self, node, env=None):
+        return self.run(self.compile(node), env)
+
+    def run(self, code, env=None):
+        if env is None:
+            env = self.global_env
+        instructions = code.code
+        constants = code.constants
+        pc = 0
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        frames = []
+        while True:
+            op = instructions[pc]
+            if op == LOAD_NAME:
+                push(env.get(constants[instructions[pc + 1]]))
+                pc += 2
+            elif op == LOAD_CONST:
+                push(constants[instructions[pc + 1]])
+                pc += 2
+            elif op == JUMP_IF_FALSE:
+                if pop():
+                    pc += 2
+                else:
+                    pc = instructions[pc + 1]
+            elif op == CALL:
+                argc = instructions[pc + 1]
+                func = stack[-argc - 1]
+                if not isinstance(func, Function):
+                    raise Exception(f'{func} is not a function')
+                if len(func.params) != argc:
+                    raise Exception('Argument count mismatch')
+                new_env = Environment(func.env)
+                if argc:
+                    new_env.variables.update(zip(func.params, stack[-argc:]))
+                del stack[-argc - 1:]
+                frames.append((instructions, constants, pc + 2, env))
+                code = func.body
+                instructions = code.code
+                constants = code.constants
+                env = new_env
+                pc = 0
+            elif op == RETURN_VALUE:
+                if not frames:
+                    return pop()
+                instructions, constants, pc, env = frames.pop()
+            elif op == BINARY_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+                pc += 1
+            elif op == BINARY_SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+                pc += 1
+            elif op == BINARY_MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+                pc += 1
+            elif op == COMPARE_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+                pc += 1
+            elif op == COMPARE_LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+                pc += 1
+            elif op == COMPARE_GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+                pc += 1
+            elif op == JUMP:
+                pc = instructions[pc + 1]
+            elif op == BINARY_FLOOR_DIVIDE:
+                right = pop()
+                stack[-1] = stack[-1] // right
+                pc += 1
+            elif op == BINARY_MODULO:
+                right = pop()
+                stack[-1] = stack[-1] % right
+                pc += 1
+            elif op == COMPARE_NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+                pc += 1
+            elif op == COMPARE_GREATER_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+                pc += 1
+            elif op == COMPARE_LESS_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+                pc += 1
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                    pc += 2
+                else:
+                    pc = instructions[pc + 1]
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = instructions[pc + 1]
+                else:
+                    pop()
+                    pc += 2
+            elif op == UNARY_NEGATIVE:
+                stack[-1] = -stack[-1]
+                pc += 1
+            elif op == UNARY_NOT:
+                stack[-1] = not stack[-1]
+                pc += 1
+            elif op == UNARY_POSITIVE:
+                stack[-1] = +stack[-1]
+                pc += 1
+            elif op == MAKE_FUNCTION:
+                body = constants[instructions[pc + 1]]
+                push(Function(None, body.params, body, env))
+                pc += 2
+            elif op == DEFINE_FUNCTION:
+                body = constants[instructions[pc + 1]]
+                func = Function(body.name, body.params, body, env)
+                env.set(body.name, func)
+                push(func)
+                pc += 2
+            elif op == POP_TOP:
+                pop()
+                pc += 1
+            else:
+                raise Exception(f'Unknown opcode: {op}')